@@ -0,0 +1,94 @@
+"""
+Compares decoding trades pages into packed records on the calling thread with decoding
+them in a DecodePool, and measures how long a concurrent I/O thread stalls meanwhile.
+
+    python benchmarks/decode_pool.py --pages 200 --rows 1000 --processes 4
+
+The pages are synthetic kpublic_trades bodies, served without network by a stand-in client.
+"""
+
+import argparse
+import json
+import threading
+import time
+
+from pykraken import workers
+from pykraken.endpoints import TRADES
+from pykraken.records import TRADE
+
+
+class CannedClient(object):
+
+    def __init__(self, body):
+        self.body = body
+
+    def _post_raw(self, url, params):
+        return self.body
+
+
+def body(rows):
+    trades = [['{:.1f}'.format(20000 + i % 997), '{:.8f}'.format(0.001 * (i % 89 + 1)),
+               '{:.4f}'.format(1500000000 + i * 0.25), 'bs'[i % 2], 'l', '']
+              for i in range(rows)]
+    return json.dumps({'error': [], 'result': {'XXBTZUSD': trades, 'last': '1'}}).encode()
+
+
+class StallMeter(object):
+    """Thread sleeping 1ms in a loop, recording its worst wake-up delay."""
+
+    def __init__(self):
+        self.worst = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.perf_counter()
+            time.sleep(0.001)
+            self.worst = max(self.worst, time.perf_counter() - started - 0.001)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    client = CannedClient(body(args.rows))
+    rows = args.pages * args.rows
+
+    with StallMeter() as meter:
+        started = time.perf_counter()
+        for _ in range(args.pages):
+            workers.decode_records(client._post_raw(TRADES.path, {}), TRADE.kind, 1, 8)
+        elapsed = time.perf_counter() - started
+    print('{:<16} {:9.0f} rows/s  worst stall {:6.1f}ms'.format(
+        'calling thread', rows / elapsed, meter.worst * 1e3))
+
+    for processes in sorted(set([1, args.processes])):
+        with workers.DecodePool(processes, shared_min_bytes=None) as pool:
+            # start the workers before timing
+            pool.trades(client, 'XXBTZUSD').result()
+            with StallMeter() as meter:
+                started = time.perf_counter()
+                futures = [pool.trades(client, 'XXBTZUSD', price_decimals=1)
+                           for _ in range(args.pages)]
+                for future in futures:
+                    future.result()
+                elapsed = time.perf_counter() - started
+        print('{:<16} {:9.0f} rows/s  worst stall {:6.1f}ms'.format(
+            'pool of {}'.format(processes), rows / elapsed, meter.worst * 1e3))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""
+Compares RequestsTransport (HTTP/1.1 connection pooling) with Http2Transport (one
+multiplexed HTTP/2 connection) on concurrent kpublic_time calls against local stand-ins of
+the API answering after a fixed delay.
+
+Reports the latency percentiles and the number of sockets each transport opened.
+
+    python benchmarks/http2_transport.py --threads 32 --calls 20 --delay 0.02
+
+Requires httpx[http2] (the h2 package also serves the HTTP/2 stand-in).
+"""
+
+import argparse
+import base64
+import concurrent.futures
+import json
+import socket
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import h2.config
+import h2.connection
+import h2.events
+
+from pykraken.client import Client
+from pykraken.transport import Http2Transport, RequestsTransport
+
+BODY = json.dumps({'error': [],
+                   'result': {'unixtime': 1500000000,
+                              'rfc1123': 'Fri, 14 Jul 17 02:40:00 +0000'}}).encode()
+SECRET = base64.b64encode(b'benchmark secret').decode()
+
+
+class Http1StandIn(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.connections = 0
+        HTTPServer.__init__(self, ('127.0.0.1', 0), _Http1Handler)
+
+    def get_request(self):
+        self.connections += 1
+        return HTTPServer.get_request(self)
+
+
+class _Http1Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.server.delay)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class Http2StandIn(object):
+    """Minimal h2c server: answers every stream with BODY after delay seconds."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.connections = 0
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(64)
+        self.server_address = self.sock.getsockname()
+
+    def serve_forever(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            thread = threading.Thread(target=self._serve, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _serve(self, conn):
+        h2conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        lock = threading.Lock()
+        with lock:
+            h2conn.initiate_connection()
+            conn.sendall(h2conn.data_to_send())
+
+        def respond(stream_id):
+            with lock:
+                h2conn.send_headers(stream_id, [(':status', '200'),
+                                                ('content-type', 'application/json'),
+                                                ('content-length', str(len(BODY)))])
+                h2conn.send_data(stream_id, BODY, end_stream=True)
+                conn.sendall(h2conn.data_to_send())
+
+        while True:
+            data = conn.recv(65536)
+            if not data:
+                break
+            with lock:
+                events = h2conn.receive_data(data)
+                for event in events:
+                    if isinstance(event, h2.events.DataReceived):
+                        h2conn.acknowledge_received_data(event.flow_controlled_length,
+                                                         event.stream_id)
+                    elif isinstance(event, h2.events.StreamEnded):
+                        timer = threading.Timer(self.delay, respond, (event.stream_id,))
+                        timer.daemon = True
+                        timer.start()
+                conn.sendall(h2conn.data_to_send())
+        conn.close()
+
+    def shutdown(self):
+        self.sock.close()
+
+
+def run(transport, server, threads, calls):
+    host, port = server.server_address[:2]
+    client = Client(key='benchmark', private_key=SECRET, transport=transport,
+                    base_url='http://{}:{}'.format(host, port), queries_per_second=10 ** 6)
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(_):
+        for _ in range(calls):
+            started = time.time()
+            client.kpublic_time()
+            elapsed = time.time() - started
+            with lock:
+                latencies.append(elapsed)
+
+    started = time.time()
+    with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+        list(pool.map(worker, range(threads)))
+    wall = time.time() - started
+    transport.close()
+    latencies.sort()
+    return {
+        'wall': wall,
+        'p50': latencies[len(latencies) // 2],
+        'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        'sockets': server.connections,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--calls', type=int, default=20, help='calls per thread')
+    parser.add_argument('--delay', type=float, default=0.02, help='server latency, in seconds')
+    args = parser.parse_args()
+
+    for name, server, transport in (
+            ('http/1.1 pool', Http1StandIn(args.delay), RequestsTransport()),
+            ('http/2', Http2StandIn(args.delay), Http2Transport(prior_knowledge=True))):
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        if isinstance(transport, RequestsTransport):
+            # size the pool like the concurrency, as a tuned HTTP/1.1 client would
+            adapter = transport.session.get_adapter('http://')
+            adapter.init_poolmanager(args.threads, args.threads)
+        result = run(transport, server, args.threads, args.calls)
+        server.shutdown()
+        print('{:<14} wall {wall:7.3f}s  p50 {p50:7.4f}s  p99 {p99:7.4f}s  '
+              'sockets {sockets}'.format(name, **result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Compares parsing the prices and volumes of a large kpublic_trades payload into scaled
+integers (parse_scaled), Fixed amounts, Decimals and floats, then summing the traded cost
+(price * volume) with each of them, and reports the error of the sum against Decimal.
+
+    python benchmarks/money_parsing.py --trades 200000 --repeat 5
+
+The payload is synthetic: XBTUSD-like rows with 1 price decimal and 8 lot decimals.
+"""
+
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from pykraken.convert import parse_scaled
+from pykraken.money import Fixed
+
+PRICE_DECIMALS = 1
+LOT_DECIMALS = 8
+
+
+def payload(n, seed=0):
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(n):
+        price = '{:.{}f}'.format(rnd.uniform(20000, 30000), PRICE_DECIMALS)
+        volume = '{:.{}f}'.format(rnd.expovariate(10), LOT_DECIMALS)
+        rows.append([price, volume, 1500000000.0 + i / 10.0, rnd.choice('bs'), 'l', ''])
+    return rows
+
+
+def parse_scaled_rows(rows):
+    return ([parse_scaled(r[0], PRICE_DECIMALS) for r in rows],
+            [parse_scaled(r[1], LOT_DECIMALS) for r in rows])
+
+
+def parse_fixed_rows(rows):
+    return ([Fixed.parse(r[0], PRICE_DECIMALS) for r in rows],
+            [Fixed.parse(r[1], LOT_DECIMALS) for r in rows])
+
+
+def parse_decimal_rows(rows):
+    return [Decimal(r[0]) for r in rows], [Decimal(r[1]) for r in rows]
+
+
+def parse_float_rows(rows):
+    return [float(r[0]) for r in rows], [float(r[1]) for r in rows]
+
+
+def cost(prices, volumes, zero):
+    total = zero
+    for price, volume in zip(prices, volumes):
+        total += price * volume
+    return total
+
+
+CANDIDATES = (
+    ('parse_scaled', parse_scaled_rows, 0),
+    ('Fixed', parse_fixed_rows, Fixed(0, PRICE_DECIMALS + LOT_DECIMALS)),
+    ('Decimal', parse_decimal_rows, Decimal(0)),
+    ('float', parse_float_rows, 0.0),
+)
+
+
+def best_of(repeat, func, *args):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trades', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = payload(args.trades)
+    exact = cost(*parse_decimal_rows(rows), zero=Decimal(0))
+    print('{:<14} {:>14} {:>14}  {}'.format('', 'parse ns/trade', 'cost ns/trade',
+                                            'cost error'))
+    for name, parse, zero in CANDIDATES:
+        parse_time, (prices, volumes) = best_of(args.repeat, parse, rows)
+        cost_time, total = best_of(args.repeat, cost, prices, volumes, zero)
+        if name == 'parse_scaled':
+            total = Fixed(total, PRICE_DECIMALS + LOT_DECIMALS)
+        value = Decimal(repr(total)) if name == 'float' else Decimal(str(total))
+        print('{:<14} {:14.1f} {:14.1f}  {}'.format(
+            name, parse_time / len(rows) * 1e9, cost_time / len(rows) * 1e9, abs(value - exact)))
+
+
+if __name__ == '__main__':
+    main()
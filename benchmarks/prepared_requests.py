@@ -0,0 +1,99 @@
+"""
+Compares the client side cost of kprivate_addorder and kprivate_cancelorder with their
+prepared forms, and with the orders timed by a LifecycleTracker: latency per call, and
+peak memory allocated during a call as traced by tracemalloc (Python >= 3.9).
+
+    python benchmarks/prepared_requests.py --calls 20000
+
+The requests go to a stand-in transport answering at once, so that only the encoding,
+signing and response handling are measured.
+"""
+
+import argparse
+import base64
+import time
+import tracemalloc
+
+from pykraken.client import Client
+from pykraken.lifecycle import LifecycleTracker
+
+SECRET = base64.b64encode(b'benchmark secret' * 4).decode()
+BODY = b'{"error":[],"result":{"descr":{"order":"buy 0.01 XBTUSD @ limit 9990.1"},' \
+       b'"txid":["OABCDE-FGHIJ-KLMNOP"]}}'
+
+
+class _Response(object):
+    status_code = 200
+    headers = {}
+
+    def close(self):
+        pass
+
+
+class InstantTransport(object):
+
+    def post(self, url, data, headers, **kwargs):
+        return _Response()
+
+    def iter_raw(self, response, chunk_size):
+        yield BODY
+
+
+def _peak_bytes(call, calls):
+    """Returns the average peak of the memory traced by tracemalloc during one call."""
+    call()
+    total = 0
+    tracemalloc.start()
+    try:
+        for _ in range(calls):
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            call()
+            total += tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return total // calls
+
+
+def _latency(call, calls):
+    samples = []
+    for _ in range(calls):
+        started = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.99)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    client = Client(key='key', private_key=SECRET, transport=InstantTransport(),
+                    queries_per_second=10 ** 9)
+    order = client.prepare_addorder(pair='XXBTZUSD', typeo='buy', ordertype='limit',
+                                    oflags=['post'])
+    cancel = client.prepare_cancelorder()
+    tracked = Client(key='key', private_key=SECRET, transport=InstantTransport(),
+                     queries_per_second=10 ** 9, lifecycle=LifecycleTracker(max_pending=100))
+    tracked_order = tracked.prepare_addorder(pair='XXBTZUSD', typeo='buy', ordertype='limit',
+                                             oflags=['post'])
+    candidates = (
+        ('addorder', lambda: client.kprivate_addorder(pair='XXBTZUSD', typeo='buy',
+                                                      ordertype='limit', price='9990.1',
+                                                      volume='0.01', oflags=['post'])),
+        ('prepared add', lambda: order.send(price='9990.1', volume='0.01')),
+        ('tracked add', lambda: tracked_order.send(price='9990.1', volume='0.01')),
+        ('cancelorder', lambda: client.kprivate_cancelorder(txid='OABCDE-FGHIJ-KLMNOP')),
+        ('prepared cancel', lambda: cancel.send(txid='OABCDE-FGHIJ-KLMNOP')),
+    )
+    print('{:<16} {:>9} {:>9} {:>14}'.format('', 'p50 us', 'p99 us', 'peak bytes/call'))
+    for name, call in candidates:
+        p50, p99 = _latency(call, args.calls)
+        peak = _peak_bytes(call, min(args.calls, 2000))
+        print('{:<16} {:9.1f} {:9.1f} {:14d}'.format(name, p50 * 1e6, p99 * 1e6, peak))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+"""
+Stand-ins for the Python 3 functions the package uses, on Python 2.
+"""
+
+import os
+import sys
+
+try:
+    replace = os.replace
+except AttributeError:  # Python 2
+    def replace(src, dst):
+        """
+        Renames src to dst, replacing dst. Atomic on POSIX, where rename replaces; Windows'
+        rename refuses an existing dst, which is removed first
+        """
+        if sys.platform == 'win32' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
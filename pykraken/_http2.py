@@ -0,0 +1,123 @@
+"""
+HTTP/2 transport, kept apart from pykraken.transport for its async code: Python 2 cannot
+compile it, and pykraken.transport imports it only where it can.
+"""
+
+import asyncio
+import threading
+
+from .exceptions import Timeout
+
+try:
+    import httpx
+except ImportError:  # optional dependency
+    httpx = None
+
+
+class _Http2Response(object):
+    """Adapts an httpx response to the interface of requests' responses used by Client."""
+
+    def __init__(self, transport, response):
+        self._transport = transport
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.http_version = response.http_version
+
+    def json(self):
+        return self._response.json()
+
+    def iter_content(self, chunk_size=None):
+        return self._iter(self._response.aiter_bytes(chunk_size))
+
+    def iter_raw(self, chunk_size=None):
+        return self._iter(self._response.aiter_raw(chunk_size))
+
+    def _iter(self, chunks):
+        try:
+            while True:
+                try:
+                    yield self._transport._run(chunks.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.close()
+
+    def close(self):
+        self._transport._run(self._response.aclose())
+
+
+def _timeout(timeout):
+    """Maps the connect/read timeout semantics of requests onto an httpx.Timeout."""
+    if isinstance(timeout, tuple):
+        connect, read = timeout
+    else:
+        connect = read = timeout
+    # a stream waiting for a connection slot counts as connecting; write applies to the
+    # request body like read does to the response of each stream
+    return httpx.Timeout(connect=connect, read=read, write=read, pool=connect)
+
+
+class Http2Transport(object):
+    """
+    Multiplexes concurrent requests over one HTTP/2 connection per host, opening another
+    one only when the server's limit of concurrent streams is reached.
+
+    The connections are driven by an httpx.AsyncClient on an event loop of their own, in a
+    daemon thread: the calling threads only wait for their response, while stream ids are
+    allocated and frames written in order by the loop.
+    """
+
+    def __init__(self, max_connections=4, prior_knowledge=False, **client_kwargs):
+        """
+        :param max_connections: maximum number of connections per host
+        :type max_connections: int
+
+        :param prior_knowledge: speak HTTP/2 without negotiation, e.g. to a plain http://
+            stand-in (h2c); over https HTTP/2 is negotiated through ALPN
+        :type prior_knowledge: bool
+
+        :param client_kwargs: extra keyword arguments of httpx.AsyncClient, e.g. proxy or
+            verify
+        """
+        if httpx is None:
+            raise NotImplementedError('the HTTP/2 transport requires httpx[http2]')
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='pykraken-http2')
+        self._thread.daemon = True
+        self._thread.start()
+        limits = httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=max_connections)
+
+        async def open_client():
+            return httpx.AsyncClient(http2=True, http1=not prior_knowledge, limits=limits,
+                                     **client_kwargs)
+        self.client = self._run(open_client())
+
+    def _run(self, coroutine):
+        """Runs coroutine on the transport's loop and waits for its result."""
+        try:
+            return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+        except httpx.TimeoutException:
+            raise Timeout()
+
+    def post(self, url, data, headers, timeout=None, stream=False, **kwargs):
+        """
+        :param timeout: None, seconds or a (connect, read) tuple of seconds, applied to each
+            stream
+        :param kwargs: ignored, connection level options (verify, proxy...) are given to
+            the transport itself
+        :rtype: a response exposing status_code, json(), iter_content() and close()
+        """
+        request = self.client.build_request('POST', url, content=data, headers=headers,
+                                            timeout=_timeout(timeout))
+        return _Http2Response(self, self._run(self.client.send(request, stream=stream)))
+
+    def iter_raw(self, response, chunk_size):
+        return response.iter_raw(chunk_size)
+
+    def close(self):
+        self._run(self.client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
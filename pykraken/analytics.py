@@ -0,0 +1,347 @@
+"""
+Analytics over the account history: realised PnL, fees and VWAP.
+
+The entries of kprivate_tradeshistory and kprivate_ledgers (dicts keyed by txid or ledger
+id) are parsed once into columns (array('d') for amounts, array('i') indices for pairs,
+assets and types), kept sorted by time. Each computation is then a single pass over the
+columns instead of a walk over the dicts.
+
+New entries are added with add() or fetched with sync(). Fills newer than the ones known
+are appended and the PnL books carry on from where they stopped; an older fill (a late
+page) re-sorts the columns and replays the books.
+"""
+
+import array
+import bisect
+import collections
+
+from .pagination import iter_ledgers, iter_tradeshistory
+
+FIFO = 'fifo'
+AVERAGE = 'average'
+
+# Kraken volumes have at most 8 decimals: what is left of a lot below this is the rounding
+# of the float subtractions (0.1 + 0.2 - 0.3), and the lot is closed
+VOLUME_EPSILON = 1e-10
+
+# volume: signed volume held (negative when short), average_price: average price of the
+# open position, realized: realised PnL in quote currency, fees not deducted
+Position = collections.namedtuple('Position', ('volume', 'average_price', 'realized', 'fees'))
+
+# one period of a per-period VWAP
+Period = collections.namedtuple('Period', ('start', 'vwap', 'volume', 'cost'))
+
+
+class _Labels(object):
+    """Small integer codes of repeated strings (pairs, assets, types)."""
+
+    def __init__(self):
+        self.names = []
+        self._codes = {}
+
+    def code(self, name):
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def get(self, name):
+        return self._codes.get(name)
+
+
+class _History(object):
+    """
+    Time sorted columns of entries keyed by id, without duplicates.
+
+    Subclasses name their columns in amounts (floats) and labels (repeated strings) and,
+    for sync(), define _pages(client, start), yielding the (entries, ofs, count) pages of
+    the entries newer than start the way iter_ledgers does.
+    """
+
+    amounts = ()
+    labels = ()
+
+    def __init__(self):
+        self.ids = []
+        self._known = set()
+        self.time = array.array('d')
+        for name in self.amounts:
+            setattr(self, name, array.array('d'))
+        for name in self.labels:
+            setattr(self, name, array.array('i'))
+            setattr(self, name + '_labels', _Labels())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _columns(self):
+        return ([self.time] + [getattr(self, n) for n in self.amounts] +
+                [getattr(self, n) for n in self.labels])
+
+    def add(self, entries):
+        """
+        Adds entries, ignoring the known ones
+        :param entries: dict of id -> entry, as in the result of the history endpoints
+        :return: number of entries added
+        """
+        new = sorted((float(e['time']), key) for key, e in entries.items()
+                     if key not in self._known)
+        rows = []
+        for t, key in new:
+            entry = entries[key]
+            values = [t] + [float(entry.get(n) or 0) for n in self.amounts]
+            values += [getattr(self, n + '_labels').code(entry.get(n)) for n in self.labels]
+            rows.append((key, values))
+        return self._extend(rows)
+
+    def merge(self, other):
+        """
+        Adds the entries of another history of the same kind, e.g. parsed in a worker process
+        :return: number of entries added
+        """
+        codes = [[getattr(self, n + '_labels').code(name)
+                  for name in getattr(other, n + '_labels').names] for n in self.labels]
+        columns = other._columns()
+        width = 1 + len(self.amounts)
+        rows = []
+        for i, key in enumerate(other.ids):
+            if key in self._known:
+                continue
+            values = [c[i] for c in columns]
+            values[width:] = [code[v] for code, v in zip(codes, values[width:])]
+            rows.append((key, values))
+        return self._extend(rows)
+
+    def _extend(self, rows):
+        # rows: (id, column values), sorted by time
+        if not rows:
+            return 0
+        in_order = not self.time or rows[0][1][0] >= self.time[-1]
+        appends = [c.append for c in self._columns()]
+        for key, values in rows:
+            self.ids.append(key)
+            self._known.add(key)
+            for append, value in zip(appends, values):
+                append(value)
+        if not in_order:
+            self._sort()
+        return len(rows)
+
+    def _sort(self):
+        time = self.time
+        order = sorted(range(len(time)), key=time.__getitem__)
+        self.ids = [self.ids[i] for i in order]
+        for column in self._columns():
+            column[:] = array.array(column.typecode, [column[i] for i in order])
+        self._reset()
+
+    def _reset(self):
+        pass
+
+    def sync(self, client):
+        """
+        Fetches the entries newer than the known ones, all of them the first time
+        :return: number of entries added
+        """
+        # start is exclusive: step back one second so same-second entries are not missed,
+        # the already known ones being ignored
+        start = int(self.time[-1]) - 1 if self.time else None
+        # the pages come newest first: adding them one by one would re-sort the columns, and
+        # replay the books, for every page older than the previous one
+        entries = {}
+        for page, _, _ in self._pages(client, start):
+            entries.update(page)
+        return self.add(entries)
+
+
+class _Fifo(object):
+    """Open lots of one pair, matched first in, first out."""
+
+    def __init__(self):
+        self.lots = collections.deque()  # [signed volume, price]
+        self.realized = 0.0
+
+    def fill(self, volume, price):
+        while volume and self.lots and (self.lots[0][0] > 0) != (volume > 0):
+            lot = self.lots[0]
+            matched = min(abs(volume), abs(lot[0]))
+            sign = 1.0 if lot[0] > 0 else -1.0
+            self.realized += sign * matched * (price - lot[1])
+            lot[0] -= sign * matched
+            volume += sign * matched
+            if abs(volume) < VOLUME_EPSILON:
+                volume = 0.0
+            if abs(lot[0]) < VOLUME_EPSILON:
+                self.lots.popleft()
+        if volume:
+            self.lots.append([volume, price])
+
+    def position(self):
+        volume = sum(lot[0] for lot in self.lots)
+        cost = sum(lot[0] * lot[1] for lot in self.lots)
+        return volume, cost / volume if volume else 0.0
+
+
+class _Average(object):
+    """Open position of one pair at its average cost."""
+
+    def __init__(self):
+        self.volume = 0.0
+        self.price = 0.0
+        self.realized = 0.0
+
+    def fill(self, volume, price):
+        if self.volume and (self.volume > 0) != (volume > 0):
+            matched = min(abs(volume), abs(self.volume))
+            sign = 1.0 if self.volume > 0 else -1.0
+            self.realized += sign * matched * (price - self.price)
+            self.volume -= sign * matched
+            volume += sign * matched
+            if abs(volume) < VOLUME_EPSILON:
+                volume = 0.0
+            if abs(self.volume) < VOLUME_EPSILON:
+                self.volume = self.price = 0.0
+        if volume:
+            total = self.volume + volume
+            self.price = (self.volume * self.price + volume * price) / total
+            self.volume = total
+
+    def position(self):
+        return self.volume, self.price
+
+
+_BOOKS = {FIFO: _Fifo, AVERAGE: _Average}
+
+
+class TradeHistory(_History):
+    """Columns of the fills of kprivate_tradeshistory."""
+
+    amounts = ('price', 'vol', 'cost', 'fee')
+    labels = ('pair', 'type')
+
+    def __init__(self):
+        super(TradeHistory, self).__init__()
+        # method -> (number of fills replayed, pair code -> book)
+        self._books = {}
+
+    def _reset(self):
+        self._books.clear()
+
+    def _pages(self, client, start):
+        return iter_tradeshistory(client, start=start)
+
+    def pnl(self, method=FIFO):
+        """
+        Realised PnL of each pair, replaying only the fills added since the last call
+        :param method: FIFO or AVERAGE (average cost)
+        :return: dict of pair -> Position, amounts in the quote currency of the pair
+        """
+        if method not in _BOOKS:
+            raise ValueError('method should be {} or {}'.format(FIFO, AVERAGE))
+        done, books = self._books.get(method, (0, {}))
+        book_class = _BOOKS[method]
+        buy = self.type_labels.get('buy')
+        price, vol, pair, kind = self.price, self.vol, self.pair, self.type
+        for i in range(done, len(price)):
+            book = books.get(pair[i])
+            if book is None:
+                book = books[pair[i]] = book_class()
+            book.fill(vol[i] if kind[i] == buy else -vol[i], price[i])
+        self._books[method] = (len(price), books)
+
+        fees = self.fees()
+        result = {}
+        for code, book in books.items():
+            name = self.pair_labels.names[code]
+            volume, average = book.position()
+            result[name] = Position(volume, average, book.realized, fees.get(name, 0.0))
+        return result
+
+    def fees(self):
+        """
+        :return: dict of pair -> total fees, in the quote currency of the pair
+        """
+        totals = [0.0] * len(self.pair_labels.names)
+        for code, fee in zip(self.pair, self.fee):
+            totals[code] += fee
+        return dict(zip(self.pair_labels.names, totals))
+
+    def vwap(self, period=86400, pair=None, start=None):
+        """
+        Volume weighted average price of the fills, per period
+        :param period: length of the periods in seconds, aligned on the unix epoch
+        :param pair: pair, all the pairs by default
+        :param start: unix timestamp of the first fill considered (optional.  inclusive)
+        :return: dict of pair -> list of Period, oldest first, empty periods omitted
+        """
+        code = None if pair is None else self.pair_labels.get(pair)
+        if pair is not None and code is None:
+            return {}
+        current = {}
+        result = collections.defaultdict(list)
+        time, cost, vol, pairs = self.time, self.cost, self.vol, self.pair
+        first = 0
+        if start is not None:
+            # the columns are time sorted
+            first = bisect.bisect_left(time, start)
+        for i in range(first, len(time)):
+            if code is not None and pairs[i] != code:
+                continue
+            bucket = time[i] // period * period
+            acc = current.get(pairs[i])
+            if acc is None or acc[0] != bucket:
+                if acc is not None and acc[1]:
+                    result[pairs[i]].append(Period(acc[0], acc[2] / acc[1], acc[1], acc[2]))
+                acc = current[pairs[i]] = [bucket, 0.0, 0.0]
+            acc[1] += vol[i]
+            acc[2] += cost[i]
+        for key, acc in current.items():
+            if acc[1]:
+                result[key].append(Period(acc[0], acc[2] / acc[1], acc[1], acc[2]))
+        return dict((self.pair_labels.names[key], periods) for key, periods in result.items())
+
+
+class LedgerHistory(_History):
+    """Columns of the entries of kprivate_ledgers."""
+
+    amounts = ('amount', 'fee', 'balance')
+    labels = ('asset', 'type')
+
+    def __init__(self, asset='all'):
+        """
+        :param asset: asset synced, 'all' by default
+        """
+        super(LedgerHistory, self).__init__()
+        self.sync_asset = asset
+
+    def _pages(self, client, start):
+        return iter_ledgers(client, asset=self.sync_asset, start=start)
+
+    def fees(self):
+        """
+        :return: dict of asset -> total fees paid in that asset, trading and funding fees
+        """
+        totals = [0.0] * len(self.asset_labels.names)
+        for code, fee in zip(self.asset, self.fee):
+            totals[code] += fee
+        return dict(zip(self.asset_labels.names, totals))
+
+    def flows(self):
+        """
+        :return: dict of (asset, type) -> net amount, e.g. ('ZEUR', 'deposit')
+        """
+        totals = collections.defaultdict(float)
+        for asset, kind, amount in zip(self.asset, self.type, self.amount):
+            totals[asset, kind] += amount
+        assets, types = self.asset_labels.names, self.type_labels.names
+        return dict(((assets[a], types[k]), v) for (a, k), v in totals.items())
+
+    def balances(self):
+        """
+        :return: dict of asset -> balance after its latest entry
+        """
+        latest = {}
+        for code, balance in zip(self.asset, self.balance):
+            latest[code] = balance
+        return dict((self.asset_labels.names[code], b) for code, b in latest.items())
@@ -0,0 +1,205 @@
+"""
+Parallel backfill of historical trades.
+
+The since cursor of /0/public/Trades makes a single pair's history inherently serial, but a
+cursor can be built from any timestamp. A [start, end) range is therefore split in time
+shards, each one walked from its own starting cursor by a worker, under one shared rate
+budget. Every shard appends to its own part file in the pykraken.records format and saves
+its cursor after each page, so that an interrupted run resumes where it stopped. Parts are
+finally stitched, in order, into a single record file.
+"""
+
+import concurrent.futures
+import json
+import os
+
+from ._compat import replace
+from .client import Client
+from .pagination import split_pair_result, TRADES_PAGE_SIZE
+from .ratelimit import RateLimiter
+from .records import RecordWriter, HEADER, TRADE, TIME_DECIMALS
+from .convert import parse_scaled
+
+_NANOSECONDS = 10 ** 9
+
+# limiter of the worker processes, set by the pool initializer
+_worker_limiter = None
+
+
+def _init_worker(limiter):
+    global _worker_limiter
+    _worker_limiter = limiter
+
+
+def plan_shards(start, end, shards):
+    """
+    Splits [start, end) in contiguous time shards
+    :param start: unix timestamp, inclusive
+    :param end: unix timestamp, exclusive
+    :param shards: number of shards
+    :return: list of (start, end) tuples
+    """
+    if end <= start:
+        raise ValueError('end must be after start')
+    step = float(end - start) / shards
+    bounds = [start + int(round(step * i)) for i in range(shards)] + [end]
+    return [(lo, hi) for lo, hi in zip(bounds, bounds[1:]) if hi > lo]
+
+
+def _save_json(path, data):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    replace(tmp, path)
+
+
+def _load_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def fetch_shard(job, limiter=None):
+    """
+    Fetches the trades of one shard into its part file, resuming from its saved state
+    :param job: dict with client_kwargs, pair, start, end, part, price_decimals and
+        volume_decimals
+    :param limiter: rate limiter, the one set by the pool initializer by default
+    :return: the final shard state, a dict with since, records and done
+    """
+    state_path = job['part'] + '.json'
+    # since is exclusive: start one nanosecond early so that a trade right on the boundary
+    # belongs to this shard and not to none
+    state = _load_json(state_path) or {'since': str(job['start'] * _NANOSECONDS - 1),
+                                       'records': 0, 'done': False}
+    if state['done']:
+        return state
+
+    writer = RecordWriter(job['part'], TRADE, job['price_decimals'], job['volume_decimals'])
+    # forget whatever was written after the last saved page
+    writer.truncate(state['records'])
+
+    client = Client(rate_limiter=limiter or _worker_limiter, **job['client_kwargs'])
+    since = state['since']
+    with writer:
+        while True:
+            rows, last = split_pair_result(client.kpublic_trades(pair=[job['pair']], since=since))
+            keep = [r for r in rows if job['start'] <= float(r[2]) < job['end']]
+            writer.append(keep)
+            writer.sync()
+            past_end = rows and float(rows[-1][2]) >= job['end']
+            state = {'since': last, 'records': state['records'] + len(keep),
+                     'done': bool(past_end or len(rows) < TRADES_PAGE_SIZE or last == since)}
+            _save_json(state_path, state)
+            if state['done']:
+                return state
+            since = last
+
+
+class Backfill(object):
+    """Time-sharded, resumable, parallel download of the trades of a pair."""
+
+    def __init__(self, client_kwargs, pair, start, end, path, shards=8, workers=4,
+                 processes=True, queries_per_second=1, price_decimals=8, volume_decimals=8):
+        """
+        :param client_kwargs: keyword arguments used to build each worker's Client (key,
+            private_key...)
+        :type client_kwargs: dict
+
+        :param pair: asset pair to backfill
+        :param start: unix timestamp of the first trade, inclusive
+        :param end: unix timestamp to stop at, exclusive
+
+        :param path: record file to create (replaced if it exists); the checkpoint is
+            path + '.checkpoint' and the shard parts path + '.part<n>'
+        :type path: string
+
+        :param shards: number of time shards
+        :param workers: number of shards fetched concurrently
+        :param processes: fetch in a process pool rather than a thread pool
+        :param queries_per_second: global request budget shared by all the workers
+
+        An interrupted run is resumed from its checkpoint, which must have been made with the
+        same pair, start, end and shards.
+        :raises ValueError: if the checkpoint at path was made with other arguments
+        """
+        self.client_kwargs = client_kwargs
+        self.pair = pair
+        self.path = path
+        self.checkpoint = path + '.checkpoint'
+        self.workers = workers
+        self.processes = processes
+        self.limiter = RateLimiter(queries_per_second, shared=processes)
+        self.price_decimals = price_decimals
+        self.volume_decimals = volume_decimals
+
+        self.shards = plan_shards(start, end, shards)
+        plan = _load_json(self.checkpoint)
+        if plan:
+            # the parts and their cursors were made for the saved plan: resuming them with
+            # another range would leave holes or overlaps
+            if plan['pair'] != pair:
+                raise ValueError('{} is a checkpoint for {}'.format(self.checkpoint, plan['pair']))
+            if [tuple(s) for s in plan['shards']] != self.shards:
+                raise ValueError('{} was planned with other start, end or shards; remove it to '
+                                 'start over'.format(self.checkpoint))
+        else:
+            _save_json(self.checkpoint, {'pair': pair, 'shards': self.shards})
+
+    def _jobs(self):
+        return [{'client_kwargs': self.client_kwargs, 'pair': self.pair, 'start': lo, 'end': hi,
+                 'part': '{}.part{}'.format(self.path, i),
+                 'price_decimals': self.price_decimals, 'volume_decimals': self.volume_decimals}
+                for i, (lo, hi) in enumerate(self.shards)]
+
+    def run(self):
+        """
+        Fetches all the shards then stitches them into path
+        :return: number of trades written
+        """
+        jobs = self._jobs()
+        if self.processes:
+            pool = concurrent.futures.ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                                          initargs=(self.limiter,))
+            with pool:
+                list(pool.map(fetch_shard, jobs))
+        else:
+            with concurrent.futures.ThreadPoolExecutor(self.workers) as pool:
+                list(pool.map(lambda job: fetch_shard(job, self.limiter), jobs))
+        return self.stitch(jobs)
+
+    def stitch(self, jobs):
+        """
+        Concatenates the shard parts in time order into path, then removes the parts and the
+        checkpoint. Records outside their shard's range are dropped, so that a page crossing
+        a boundary is never written twice
+        """
+        total = 0
+        size = TRADE.struct.size
+        tmp = self.path + '.tmp'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        with RecordWriter(tmp, TRADE, self.price_decimals, self.volume_decimals) as writer:
+            for job in jobs:
+                lo = parse_scaled(job['start'], TIME_DECIMALS)
+                hi = parse_scaled(job['end'], TIME_DECIMALS)
+                with open(job['part'], 'rb') as part:
+                    part.seek(HEADER.size)
+                    while True:
+                        chunk = part.read(size * 4096)
+                        if not chunk:
+                            break
+                        chunk = chunk[:len(chunk) - len(chunk) % size]
+                        records = [r for r in TRADE.struct.iter_unpack(chunk) if lo <= r[0] < hi]
+                        writer.append_records(records)
+                        total += len(records)
+            writer.sync()
+        replace(tmp, self.path)
+        for job in jobs:
+            os.remove(job['part'])
+            os.remove(job['part'] + '.json')
+        os.remove(self.checkpoint)
+        return total
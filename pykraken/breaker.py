@@ -0,0 +1,181 @@
+"""
+Circuit breaker failing requests fast while the exchange is degraded.
+
+Each endpoint group (public market data, private account data, trading) has its own
+circuit, fed with the outcome of its recent requests: errors (transport errors, timeouts,
+5xx statuses, EService API errors) and calls slower than slow_seconds count as failures.
+
+- closed: requests are sent. Above shed_rate failures, requests of priority shed_priority
+  or lower (market data, history) are dropped; above failure_rate the circuit opens.
+- open: requests fail at once with CircuitOpenError, except those of priority
+  bypass_priority or more urgent (order cancels), for open_seconds.
+- half-open: probes requests are let through; the circuit closes if they all succeed and
+  opens again on the first failure.
+"""
+
+import collections
+import threading
+import time
+
+from .endpoints import PRIORITY_CANCEL, PRIORITY_MARKET_DATA
+from .exceptions import ApiError, CircuitOpenError, LoadShedError
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# API errors reporting an unavailable or overloaded exchange
+_SERVICE_ERRORS = ('EService:', 'EGeneral:Temporary')
+
+
+def is_service_error(error):
+    """
+    Whether an ApiError reports the exchange as unavailable, rather than a bad request
+    :rtype: bool
+    """
+    messages = error.message if isinstance(error, ApiError) else None
+    if not messages:
+        return False
+    if not isinstance(messages, (list, tuple)):
+        messages = [messages]
+    return any(str(m).startswith(_SERVICE_ERRORS) for m in messages)
+
+
+class _Circuit(object):
+
+    def __init__(self, window):
+        self.state = CLOSED
+        self.outcomes = collections.deque(maxlen=window)
+        self.opened_at = None
+        self.probes = 0
+        self.successes = 0
+
+    def failure_rate(self):
+        return float(sum(self.outcomes)) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class CircuitBreaker(object):
+    """One circuit per endpoint group, shared by all the clients it is given to."""
+
+    def __init__(self, window=20, min_calls=5, failure_rate=0.5, slow_seconds=10.0,
+                 open_seconds=30.0, probes=1, shed_rate=0.25, shed_priority=PRIORITY_MARKET_DATA,
+                 bypass_priority=PRIORITY_CANCEL, local_time=time.time):
+        """
+        :param window: number of recent requests the failure rate is computed on
+        :param min_calls: requests needed in the window before the circuit may open
+        :param failure_rate: share of failed or slow requests opening the circuit
+        :param slow_seconds: duration above which a successful request counts as failed
+        :param open_seconds: seconds the circuit stays open before probing
+        :param probes: successful requests in a row closing a half-open circuit
+        :param shed_rate: share of failed or slow requests above which requests of
+            shed_priority or lower are dropped, None to never shed
+        :param shed_priority: most urgent priority shed, PRIORITY_MARKET_DATA by default
+        :param bypass_priority: requests of this priority or more urgent are always sent,
+            PRIORITY_CANCEL by default, None to fail all requests while open
+        :param local_time: local clock, time.time by default
+        """
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_seconds = slow_seconds
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.shed_rate = shed_rate
+        self.shed_priority = shed_priority
+        self.bypass_priority = bypass_priority
+        self.local_time = local_time
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def _circuit(self, group):
+        circuit = self._circuits.get(group)
+        if circuit is None:
+            circuit = self._circuits[group] = _Circuit(self.window)
+        return circuit
+
+    def _open(self, circuit, now):
+        circuit.state = OPEN
+        circuit.opened_at = now
+        circuit.probes = circuit.successes = 0
+
+    def allow(self, group, priority):
+        """
+        Lets a request through, or rejects it
+        :raises CircuitOpenError: if the circuit of group is open
+        :raises LoadShedError: if the request is shed
+        """
+        bypass = self.bypass_priority is not None and priority <= self.bypass_priority
+        with self._lock:
+            circuit = self._circuit(group)
+            now = self.local_time()
+            if circuit.state == OPEN and now - circuit.opened_at >= self.open_seconds:
+                circuit.state = HALF_OPEN
+            if bypass:
+                return
+            if circuit.state == OPEN:
+                raise CircuitOpenError(group, circuit.opened_at + self.open_seconds - now)
+            if circuit.state == HALF_OPEN:
+                if circuit.probes >= self.probes:
+                    # wait for the outcome of the probes in flight
+                    raise CircuitOpenError(group)
+                circuit.probes += 1
+                return
+            if (self.shed_rate is not None and priority >= self.shed_priority and
+                    len(circuit.outcomes) >= self.min_calls and
+                    circuit.failure_rate() >= self.shed_rate):
+                raise LoadShedError(group)
+
+    def record(self, group, ok, seconds):
+        """
+        Records the outcome of a request let through
+        :param ok: whether the request succeeded
+        :param seconds: duration of the request
+        """
+        failed = not ok or seconds >= self.slow_seconds
+        with self._lock:
+            circuit = self._circuit(group)
+            now = self.local_time()
+            if circuit.state == HALF_OPEN:
+                if failed:
+                    self._open(circuit, now)
+                else:
+                    circuit.successes += 1
+                    if circuit.successes >= self.probes:
+                        circuit.state = CLOSED
+                        circuit.outcomes.clear()
+                        circuit.probes = circuit.successes = 0
+            elif circuit.state == CLOSED:
+                circuit.outcomes.append(failed)
+                if (len(circuit.outcomes) >= self.min_calls and
+                        circuit.failure_rate() >= self.failure_rate):
+                    self._open(circuit, now)
+
+    def cancel(self, group):
+        """Records that a request let through was finally not sent."""
+        with self._lock:
+            circuit = self._circuit(group)
+            if circuit.state == HALF_OPEN and circuit.probes > circuit.successes:
+                circuit.probes -= 1
+
+    def state(self, group):
+        """Returns CLOSED, OPEN or HALF_OPEN."""
+        with self._lock:
+            circuit = self._circuit(group)
+            if circuit.state == OPEN and self.local_time() - circuit.opened_at >= self.open_seconds:
+                return HALF_OPEN
+            return circuit.state
+
+    def report(self):
+        """
+        :return: dict of group -> dict of state, requests in the window and failure rate
+        """
+        with self._lock:
+            groups = list(self._circuits)
+        report = {}
+        for group in groups:
+            state = self.state(group)
+            with self._lock:
+                circuit = self._circuits[group]
+                report[group] = {'state': state, 'requests': len(circuit.outcomes),
+                                 'failure_rate': circuit.failure_rate()}
+        return report
@@ -0,0 +1,335 @@
+"""
+pykraken command line tool: bulk exports of market data and account history.
+
+Rows are written as soon as each page arrives, in time order, cursors are saved after every
+page, with the size of the file then, so that an interrupted export can be resumed with
+--resume without writing a page twice, and pairs are exported concurrently. The number of
+rows written is printed on completion.
+"""
+
+import argparse
+import concurrent.futures
+import csv
+import json
+import os
+import sys
+import threading
+import time
+
+from ._compat import replace
+from .client import Client
+from .pagination import iter_trades, iter_ohlc, iter_spread, iter_ledgers, iter_tradeshistory
+from .ratelimit import RateLimiter
+from .records import RecordWriter, TRADE, OHLC, SPREAD
+from .transport import Http2Transport
+
+TICKER_COLUMNS = ('pair', 'ask', 'bid', 'last', 'volume_24h', 'vwap_24h', 'trades_24h',
+                  'low_24h', 'high_24h', 'open')
+OHLC_COLUMNS = ('time', 'open', 'high', 'low', 'close', 'vwap', 'volume', 'count')
+TRADES_COLUMNS = ('price', 'volume', 'time', 'side', 'ordertype', 'misc')
+SPREAD_COLUMNS = ('time', 'bid', 'ask')
+LEDGERS_COLUMNS = ('id', 'refid', 'time', 'type', 'aclass', 'asset', 'amount', 'fee', 'balance')
+TRADESHISTORY_COLUMNS = ('txid', 'ordertxid', 'pair', 'time', 'type', 'ordertype', 'price',
+                         'cost', 'fee', 'vol', 'margin', 'misc')
+
+
+class _CsvSink(object):
+
+    def __init__(self, path, columns, append):
+        self.path = path
+        new = not (append and os.path.exists(path) and os.path.getsize(path))
+        self._file = open(path, 'a' if append else 'w', newline='')
+        self._writer = csv.writer(self._file)
+        if new:
+            self._writer.writerow(columns)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _JsonlSink(object):
+
+    def __init__(self, path, columns, append):
+        self.path = path
+        self._columns = columns
+        self._file = open(path, 'a' if append else 'w')
+
+    def write(self, rows):
+        self._file.write(''.join(json.dumps(dict(zip(self._columns, row))) + '\n'
+                                 for row in rows))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class _RecordSink(object):
+
+    def __init__(self, path, fmt, append):
+        self.path = path
+        if not append and os.path.exists(path):
+            os.remove(path)
+        self._writer = RecordWriter(path, fmt)
+
+    def write(self, rows):
+        self._writer.append(rows)
+        self._writer.flush()
+
+    def close(self):
+        self._writer.close()
+
+
+class Progress(object):
+    """Prints rows written, throughput and, when the amount of work is known, ETA to stderr."""
+
+    def __init__(self, stream=sys.stderr, interval=1.0):
+        self.stream = stream
+        self.interval = interval
+        self.started = time.time()
+        self.rows = 0
+        self._fractions = {}
+        self._printed = 0
+        self._lock = threading.Lock()
+
+    def update(self, name, rows, fraction=None):
+        with self._lock:
+            self.rows += rows
+            if fraction is not None:
+                self._fractions[name] = min(1.0, max(0.0, fraction))
+            now = time.time()
+            if now - self._printed >= self.interval:
+                self._printed = now
+                self.stream.write(self.line(now) + '\n')
+                self.stream.flush()
+
+    def line(self, now=None):
+        elapsed = (now or time.time()) - self.started
+        text = '{} rows, {:.0f} rows/s'.format(self.rows, self.rows / elapsed if elapsed else 0)
+        if self._fractions:
+            done = sum(self._fractions.values()) / len(self._fractions)
+            if 0 < done < 1:
+                text += ', {:.1%} done, ETA {:.0f}s'.format(done, elapsed * (1 - done) / done)
+        return text
+
+
+def _ticker_row(pair, t):
+    return [pair, t['a'][0], t['b'][0], t['c'][0], t['v'][1], t['p'][1], t['t'][1], t['l'][1],
+            t['h'][1], t['o']]
+
+
+def _entry_rows(entries, columns):
+    return [[key] + [entry.get(c, '') for c in columns[1:]]
+            for key, entry in sorted(entries.items(), key=lambda kv: kv[1]['time'])]
+
+
+def _load_cursor(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _save_cursor(path, cursor):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(cursor, f)
+    replace(path + '.tmp', path)
+
+
+def _open_sink(args, name, columns, fmt, size=None):
+    """
+    :param size: size of the file when its cursor was saved: whatever was written after it,
+        by a run interrupted between writing a page and saving its cursor, is dropped
+    """
+    path = os.path.join(args.output, '{}.{}'.format(name, args.format))
+    if args.resume and size is not None and os.path.exists(path):
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+    if args.format == 'csv':
+        return _CsvSink(path, columns, args.resume)
+    if args.format == 'jsonl':
+        return _JsonlSink(path, columns, args.resume)
+    if fmt is None:
+        raise SystemExit('{} cannot be exported in the binary format'.format(args.command))
+    return _RecordSink(path, fmt, args.resume)
+
+
+def export_pair(client, args, pair, progress):
+    """
+    Exports one pair's OHLC, trades or spread, resuming from its saved cursor with --resume
+    :return: number of rows written
+    """
+    name = '{}-{}'.format(args.command, pair)
+    cursor_path = os.path.join(args.output, name + '.cursor')
+    cursor = _load_cursor(cursor_path) if args.resume else {}
+    since = cursor.get('since') or args.since
+    if args.command == 'ohlc':
+        pages = iter_ohlc(client, pair, interval=args.interval, since=since)
+        columns, fmt = OHLC_COLUMNS, OHLC
+    elif args.command == 'spread':
+        pages, columns, fmt = iter_spread(client, pair, since=since), SPREAD_COLUMNS, SPREAD
+    else:
+        pages, columns, fmt = iter_trades(client, pair, since=since), TRADES_COLUMNS, TRADE
+
+    sink = _open_sink(args, name, columns, fmt, cursor.get('size'))
+    time_index = 2 if args.command == 'trades' else 0
+    written, first = 0, None
+    try:
+        for rows, last in pages:
+            past_until = args.until and float(rows[-1][time_index]) >= args.until
+            if past_until:
+                rows = [r for r in rows if float(r[time_index]) < args.until]
+            sink.write(rows)
+            _save_cursor(cursor_path, {'since': last, 'size': os.path.getsize(sink.path)})
+            written += len(rows)
+            fraction = None
+            if rows and args.until:
+                first = first if first is not None else float(rows[0][time_index])
+                span = args.until - first
+                fraction = (float(rows[-1][time_index]) - first) / span if span > 0 else 1.0
+            progress.update(name, len(rows), fraction)
+            if past_until:
+                break
+    finally:
+        sink.close()
+    return written
+
+
+def export_history(client, args, progress):
+    """
+    Exports ledgers or trades history, oldest first, resuming from the saved offset with
+    --resume
+    :return: number of rows written
+    """
+    cursor_path = os.path.join(args.output, args.command + '.cursor')
+    cursor = _load_cursor(cursor_path) if args.resume else {}
+    # freeze the end of the range so that the offsets stay valid across a resume
+    end = cursor.get('end') or args.until or int(time.time())
+    # the API pages from the newest: they are fetched from the last offset down
+    before = cursor.get('before')
+    if args.command == 'ledgers':
+        pages = iter_ledgers(client, asset=args.asset, start=args.since, end=end, ofs=before,
+                             oldest_first=True)
+        columns = LEDGERS_COLUMNS
+    else:
+        pages = iter_tradeshistory(client, start=args.since, end=end, ofs=before,
+                                   oldest_first=True)
+        columns = TRADESHISTORY_COLUMNS
+
+    sink = _open_sink(args, args.command, columns, None, cursor.get('size'))
+    written = 0
+    try:
+        for entries, ofs, count in pages:
+            rows = _entry_rows(entries, columns)
+            sink.write(rows)
+            _save_cursor(cursor_path, {'end': end, 'before': ofs,
+                                       'size': os.path.getsize(sink.path)})
+            written += len(rows)
+            progress.update(args.command, len(rows), 1.0 - float(ofs) / count if count else 1.0)
+    finally:
+        sink.close()
+    return written
+
+
+def export_ticker(client, args, progress):
+    """Exports one ticker snapshot row per pair, fetched in a single request."""
+    sink = _open_sink(args, 'ticker', TICKER_COLUMNS, None)
+    try:
+        result = client.kpublic_ticker(pair=args.pairs)
+        rows = [_ticker_row(pair, t) for pair, t in sorted(result.items())]
+        sink.write(rows)
+        progress.update('ticker', len(rows))
+    finally:
+        sink.close()
+    return len(rows)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='pykraken', description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--key', default=os.environ.get('K_API_KEY'),
+                        help='API key, $K_API_KEY by default')
+    parser.add_argument('--secret', default=os.environ.get('K_PRIVATE_KEY'),
+                        help='private key, $K_PRIVATE_KEY by default')
+    parser.add_argument('--format', choices=('csv', 'jsonl', 'bin'), default='csv')
+    parser.add_argument('--output', default='.', help='directory the files are written to')
+    parser.add_argument('--resume', action='store_true', help='append from the saved cursors')
+    parser.add_argument('--workers', type=int, default=4, help='pairs exported concurrently')
+    parser.add_argument('--rate', type=float, default=1.0,
+                        help='queries per second, shared by all workers')
+    parser.add_argument('--http2', action='store_true',
+                        help='multiplex the workers over one HTTP/2 connection '
+                             '(needs httpx[http2])')
+    parser.add_argument('--quiet', action='store_true', help='do not print progress')
+
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+    for command in ('ticker', 'ohlc', 'trades', 'spread'):
+        sub = commands.add_parser(command)
+        sub.add_argument('pairs', nargs='+', metavar='pair')
+        if command != 'ticker':
+            sub.add_argument('--since', help='cursor to start from (exclusive)')
+            sub.add_argument('--until', type=float, help='unix timestamp to stop at (exclusive)')
+        if command == 'ohlc':
+            sub.add_argument('--interval', type=int, default=1,
+                             help='time frame interval in minutes')
+    for command in ('ledgers', 'tradeshistory'):
+        sub = commands.add_parser(command)
+        sub.add_argument('--since', help='starting unix timestamp or id (exclusive)')
+        sub.add_argument('--until', type=int, help='ending unix timestamp or id (inclusive)')
+        if command == 'ledgers':
+            sub.add_argument('--asset', default='all')
+    return parser
+
+
+def main(argv=None):
+    """
+    Runs an export and prints the number of rows written
+    :return: the exit status, 0
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.key:
+        # the client is built with a key even though the public requests are not signed
+        parser.error('an API key is needed: --key or $K_API_KEY')
+    if args.command in ('ledgers', 'tradeshistory') and not args.secret:
+        parser.error('{} needs the private key: --secret or $K_PRIVATE_KEY'.format(args.command))
+    if not os.path.isdir(args.output):
+        os.makedirs(args.output)
+    with open(os.devnull, 'w') as devnull:
+        progress = Progress(stream=devnull if args.quiet else sys.stderr)
+        total = export(args, progress)
+    if not args.quiet:
+        sys.stderr.write('done: ' + progress.line() + '\n')
+    sys.stdout.write('{}\n'.format(total))
+    return 0
+
+
+def export(args, progress):
+    """
+    Runs the export of the parsed command line arguments
+    :return: number of rows written
+    """
+    limiter = RateLimiter(args.rate)
+    transport = Http2Transport() if args.http2 else None
+
+    def client():
+        return Client(key=args.key, private_key=args.secret, rate_limiter=limiter,
+                      transport=transport)
+
+    if args.command == 'ticker':
+        total = export_ticker(client(), args, progress)
+    elif args.command in ('ledgers', 'tradeshistory'):
+        total = export_history(client(), args, progress)
+    else:
+        # one client per worker, the rate budget being shared through the limiter
+        with concurrent.futures.ThreadPoolExecutor(args.workers) as pool:
+            total = sum(pool.map(lambda pair: export_pair(client(), args, pair, progress),
+                                 args.pairs))
+    return total
+
+
+if __name__ == '__main__':
+    sys.exit(main())
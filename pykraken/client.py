@@ -8,13 +8,22 @@ from datetime import datetime
 from datetime import timedelta
 import hashlib
 import hmac
+import json
+import re
 
 import requests
 import random
+import threading
 import time
 
 import pykraken
+from .compression import accept_encoding, iter_decoded, ByteCounters
+from .endpoints import ENDPOINTS_BY_PATH, PRIORITY_ACCOUNT
+from .breaker import is_service_error
 from .exceptions import _RetriableRequest, ApiError
+from .lifecycle import LIMITER, NETWORK, RESPONSE, SIGN
+from .streaming import StreamingResult
+from .transport import RequestsTransport
 
 try:  # Python 3
     from urllib.parse import urlencode
@@ -26,13 +35,21 @@ _DEFAULT_BASE_URL = "https://api.kraken.com"
 
 _RETRIABLE_STATUSES = set([500, 503, 504])
 
+# size of the chunks read from the socket by streaming requests
+_STREAM_CHUNK_SIZE = 64 * 1024
+
+# start of the bodies of successful responses
+_NO_ERROR = re.compile(br'\s*\{\s*"error"\s*:\s*\[\s*\]')
+
 
 class Client(object):
     """Performs requests to the kraken API."""
 
     def __init__(self, key=None, private_key=None, timeout=None, connect_timeout=None, read_timeout=None,
                  retry_timeout=60, requests_kwargs=None,
-                 queries_per_second=10):
+                 queries_per_second=10, rate_limiter=None, clock=None, transport=None,
+                 base_url=_DEFAULT_BASE_URL, compression=True, circuit_breaker=None,
+                 scheduler=None, lifecycle=None):
         """
         :param key: API key.
         :type key: string
@@ -60,6 +77,44 @@ class Client(object):
             appropriate amount of time before it runs the current query.
         :type queries_per_second: int
 
+        :param rate_limiter: Limiter acquired before every request instead of
+            the queries_per_second check, e.g. a shared one enforcing a single
+            budget across several clients or processes.
+        :type rate_limiter: pykraken.ratelimit.RateLimiter
+
+        :param clock: Server clock estimate the nonces are taken from instead
+            of the local time, see pykraken.clock.ClockSync.
+        :type clock: pykraken.clock.ClockSync
+
+        :param transport: Transport sending the requests, a RequestsTransport
+            pooling HTTP/1.1 connections by default; see
+            pykraken.transport.Http2Transport to multiplex concurrent requests
+            over a single HTTP/2 connection.
+
+        :param base_url: Scheme and host the requests are sent to.
+        :type base_url: string
+
+        :param compression: Content codings accepted for the responses: True
+            for all those that can be decoded (gzip, deflate, and br or zstd
+            when brotli or zstandard is installed), False for none, or a list.
+            Bodies are decompressed as they are read, and the bytes received
+            per endpoint are counted in byte_counters.
+        :type compression: bool or list
+
+        :param circuit_breaker: Breaker failing the requests of an endpoint
+            group fast, and shedding the low priority ones, while the exchange
+            is degraded, instead of retrying them until retry_timeout.
+        :type circuit_breaker: pykraken.breaker.CircuitBreaker
+
+        :param scheduler: Scheduler the requests wait in, by priority and
+            deadline, for the budget of its rate limiter; used instead of
+            rate_limiter.
+        :type scheduler: pykraken.scheduler.PriorityScheduler
+
+        :param lifecycle: Tracker timing the stages of the orders added, from
+            their validation to their appearance in the open or closed orders.
+        :type lifecycle: pykraken.lifecycle.LifecycleTracker
+
         :raises ValueError: when either credentials are missing, incomplete
             or invalid.
         :raises NotImplementedError: if connect_timeout and read_timeout are
@@ -84,7 +139,7 @@ class Client(object):
 
         if connect_timeout and read_timeout:
             # Check that the version of requests is >= 2.4.0
-            chunks = requests.__version__.split(".")
+            chunks = [int(c) for c in requests.__version__.split(".")[:2]]
             if chunks[0] < 2 or (chunks[0] == 2 and chunks[1] < 4):
                 raise NotImplementedError("Connect/Read timeouts require "
                                           "requests v2.4.0 or higher")
@@ -102,91 +157,246 @@ class Client(object):
 
         self.queries_per_second = queries_per_second
         self.sent_times = collections.deque("", queries_per_second)
-
-    def _post(self, url, params={}, first_request_time=None, retry_counter=0,
-              base_url=_DEFAULT_BASE_URL, accepts_clientid=True,
-              extract_body=None, requests_kwargs=None):
+        self.rate_limiter = rate_limiter
+        self.clock = clock
+        self._nonce_lock = threading.Lock()
+        self._last_nonce = 0
+        self.transport = transport or RequestsTransport()
+        self.base_url = base_url
+        self.accept_encoding = accept_encoding(compression)
+        self.byte_counters = ByteCounters()
+        self.circuit_breaker = circuit_breaker
+        self.scheduler = scheduler
+        self.lifecycle = lifecycle
+
+    def _next_nonce(self):
+        """Returns a millisecond timestamp nonce, strictly increasing across threads."""
+        now = self.clock.now() if self.clock else time.time()
+        with self._nonce_lock:
+            nonce = max(int(1000 * now), self._last_nonce + 1)
+            self._last_nonce = nonce
+        return nonce
+
+    def _post(self, url, params=None, first_request_time=None, retry_counter=0,
+              base_url=None, accepts_clientid=True,
+              extract_body=None, requests_kwargs=None, prepared=None, timing=None):
+        """
+        :param prepared: pykraken.prepared.PreparedRequest signing the request, params
+            being then its already urlencoded variable parameters
+        :param timing: pykraken.lifecycle.OrderTiming the stages are marked on
+        """
 
         if not first_request_time:
             first_request_time = datetime.now()
+        base_url = base_url or self.base_url
 
         elapsed = datetime.now() - first_request_time
         if elapsed > self.retry_timeout:
             raise pykraken.exceptions.Timeout()
 
-        if retry_counter > 0:
-            # 0.5 * (1.5 ^ i) is an increased sleep time of 1.5x per iteration,
-            # starting at 0.5s when retry_counter=0. The first retry will occur
-            # at 1, so subtract that first.
-            delay_seconds = 0.5 * 1.5 ** (retry_counter - 1)
-
-            # Jitter this value by 50% and pause.
-            time.sleep(delay_seconds * (random.random() + 0.5))
-
-        # Unicode-objects must be encoded before hashing
-        # "API-Sign = Message signature using HMAC-SHA512 of (URI path + SHA256(nonce + POST data)) and base64 decoded secret API key"
-        params['nonce'] = int(1000 * time.time())
-
-        postdata = urlencode(params)
-
-        # Unicode-objects must be encoded before hashing
-        encoded = (str(params['nonce']) + postdata).encode()
-        message = url.encode() + hashlib.sha256(encoded).digest()
-
-        signature = hmac.new(base64.b64decode(self.private_key), message, hashlib.sha512)
-        sigdigest = base64.b64encode(signature.digest())
+        endpoint = ENDPOINTS_BY_PATH.get(url)
+        if self.circuit_breaker:
+            # raises at once when the endpoint's group is failing, retries included
+            self.circuit_breaker.allow(endpoint.group if endpoint else url,
+                                       endpoint.priority if endpoint else PRIORITY_ACCOUNT)
 
-        self.requests_kwargs.update({
-            "headers": {"User-Agent": _USER_AGENT, "API-Key": self.key, "API-Sign": sigdigest.decode()},
-            "timeout": self.timeout,
-            "verify": True,  # NOTE(cbro): verify SSL certs.
-        })
-
-        # Default to the client-level self.requests_kwargs, with method-level
-        # requests_kwargs arg overriding.
-        requests_kwargs = dict(self.requests_kwargs, **(requests_kwargs or {}))
         try:
-            resp = requests.post(base_url + url, data=params, **requests_kwargs)
-        except requests.exceptions.Timeout:
-            raise pykraken.exceptions.Timeout()
+            postdata, headers, final_requests_kwargs = self._wait_and_sign(
+                url, params, endpoint, retry_counter, requests_kwargs, prepared, timing)
+        except BaseException:
+            # the request let through is not sent after all (deadline exceeded, signing
+            # failed...): give back its slot, a half-open probe in particular
+            if self.circuit_breaker:
+                self.circuit_breaker.cancel(endpoint.group if endpoint else url)
+            raise
+        started = time.time()
+        try:
+            # postdata is sent as is, rather than urlencoding params a second time
+            resp = self.transport.post(base_url + url, postdata, headers, **final_requests_kwargs)
+        except pykraken.exceptions.Timeout:
+            self._record(endpoint, url, False, time.time() - started)
+            raise
         except Exception as e:
+            self._record(endpoint, url, False, time.time() - started)
             raise pykraken.exceptions.TransportError(e)
+        seconds = time.time() - started
+        if timing is not None:
+            timing.mark(NETWORK)
 
         if resp.status_code in _RETRIABLE_STATUSES:
+            resp.close()
+            self._record(endpoint, url, False, seconds)
             # Retry request.
             return self._post(url, params, first_request_time, retry_counter + 1,
-                              base_url, accepts_clientid, extract_body)
-
-        # Check if the time of the nth previous query (where n is queries_per_second)
-        # is under a second ago - if so, sleep for the difference.
-        if self.sent_times and len(self.sent_times) == self.queries_per_second:
-            elapsed_since_earliest = time.time() - self.sent_times[0]
-            if elapsed_since_earliest < 1:
-                time.sleep(1 - elapsed_since_earliest)
+                              base_url, accepts_clientid, extract_body, requests_kwargs, prepared,
+                              timing)
 
+        started = time.time()
         try:
             if extract_body:
                 result = extract_body(resp)
             else:
-                result = self._get_body(resp)
-            self.sent_times.append(time.time())
-            return result
+                result = self._get_body(resp, url)
         except _RetriableRequest:
+            self._record(endpoint, url, False, seconds + time.time() - started)
             # Retry request.
             return self._post(url, params, first_request_time, retry_counter + 1,
-                              base_url, accepts_clientid, extract_body)
+                              base_url, accepts_clientid, extract_body, requests_kwargs, prepared,
+                              timing)
+        except pykraken.exceptions.HTTPError as e:
+            self._record(endpoint, url, e.status_code < 500, seconds + time.time() - started)
+            raise
+        except ApiError as e:
+            self._record(endpoint, url, not is_service_error(e), seconds + time.time() - started)
+            raise
+        except Exception:
+            self._record(endpoint, url, False, seconds + time.time() - started)
+            raise
+        if isinstance(result, StreamingResult):
+            # the body is only read as the rows are iterated over: the outcome is known once
+            # they have been consumed, or their decoding failed
+            def done(error):
+                ok = error is None or (isinstance(error, ApiError) and
+                                       not is_service_error(error))
+                self._record(endpoint, url, ok, seconds + time.time() - started)
+                if error is None:
+                    self.sent_times.append(time.time())
+            result.on_done = done
+            return result
+        self._record(endpoint, url, True, seconds + time.time() - started)
+        self.sent_times.append(time.time())
+        if timing is not None:
+            timing.mark(RESPONSE)
+        return result
+
+    def _wait_and_sign(self, url, params, endpoint, retry_counter, requests_kwargs, prepared,
+                       timing):
+        """
+        Waits for the retry backoff and the limiter, then signs the request
+        :return: (postdata, headers, requests_kwargs) tuple
+        """
+        if retry_counter > 0:
+            # 0.5 * (1.5 ^ i) is an increased sleep time of 1.5x per iteration,
+            # starting at 0.5s when retry_counter=0. The first retry will occur
+            # at 1, so subtract that first.
+            delay_seconds = 0.5 * 1.5 ** (retry_counter - 1)
+
+            # Jitter this value by 50% and pause.
+            time.sleep(delay_seconds * (random.random() + 0.5))
 
-    def _get_body(self, resp):
+        # Wait for the limiter before taking the nonce, so that nonces keep
+        # increasing in sending order.
+        if self.scheduler:
+            self.scheduler.acquire(endpoint.cost if endpoint else 1,
+                                   endpoint.priority if endpoint else PRIORITY_ACCOUNT)
+        elif self.rate_limiter:
+            self.rate_limiter.acquire(endpoint.cost if endpoint else 1)
+        elif self.sent_times and len(self.sent_times) == self.queries_per_second:
+            # Check if the time of the nth previous query (where n is queries_per_second)
+            # is under a second ago - if so, sleep for the difference.
+            elapsed_since_earliest = time.time() - self.sent_times[0]
+            if elapsed_since_earliest < 1:
+                time.sleep(1 - elapsed_since_earliest)
+        if timing is not None:
+            timing.mark(LIMITER)
+
+        if prepared is not None:
+            # the static parts of the request are encoded once, by the PreparedRequest
+            postdata, headers = prepared.sign(str(self._next_nonce()), params)
+            final_requests_kwargs = prepared.requests_kwargs
+        else:
+            # Default to the client-level self.requests_kwargs, with method-level
+            # requests_kwargs arg overriding. The signed headers are built per call
+            # so that concurrent requests never share them.
+            final_requests_kwargs = dict(self.requests_kwargs, **(requests_kwargs or {}))
+            headers = dict(final_requests_kwargs.pop("headers"))
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+            headers["Accept-Encoding"] = self.accept_encoding
+            # bodies are always read from the socket, and decompressed, by _read_body
+            final_requests_kwargs["stream"] = True
+
+            if endpoint is not None and not endpoint.private:
+                # public requests are not signed, and take no nonce: a ClockSync sampling
+                # kpublic_time through the client it gives nonces to would recurse
+                postdata = urlencode(params) if params else ""
+            else:
+                # Unicode-objects must be encoded before hashing
+                # "API-Sign = Message signature using HMAC-SHA512 of (URI path + SHA256(nonce +
+                # POST data)) and base64 decoded secret API key"
+                nonce = str(self._next_nonce())
+                postdata = "nonce=" + nonce
+                if params:
+                    postdata += "&" + urlencode(params)
+
+                # Unicode-objects must be encoded before hashing
+                encoded = (nonce + postdata).encode()
+                message = url.encode() + hashlib.sha256(encoded).digest()
+
+                signature = hmac.new(base64.b64decode(self.private_key), message, hashlib.sha512)
+                headers["API-Sign"] = base64.b64encode(signature.digest()).decode()
+        if timing is not None:
+            timing.mark(SIGN)
+        return postdata, headers, final_requests_kwargs
+
+    def _record(self, endpoint, url, ok, seconds):
+        if self.circuit_breaker:
+            self.circuit_breaker.record(endpoint.group if endpoint else url, ok, seconds)
+
+    def _read_body(self, resp, url):
+        """Yields the decompressed chunks of the body, counting the bytes received."""
+        endpoint = ENDPOINTS_BY_PATH.get(url)
+        return iter_decoded(self.transport.iter_raw(resp, _STREAM_CHUNK_SIZE),
+                            resp.headers.get("Content-Encoding"), self.byte_counters,
+                            endpoint.name if endpoint else url)
+
+    def _get_body(self, resp, url=None):
         if resp.status_code != 200:
+            resp.close()
             raise pykraken.exceptions.HTTPError(resp.status_code)
 
-        body = resp.json()
+        body = json.loads(b"".join(self._read_body(resp, url)).decode("utf-8"))
 
         if len(body["error"]):
             raise ApiError(resp.status_code, message=body["error"])
         else:
             return body
 
+    def _post_stream(self, url, params, row_parser=None):
+        """
+        Performs a request whose body is parsed incrementally as it is read from the socket.
+
+        :param row_parser: callable applied to each row of the result
+        :rtype: pykraken.streaming.StreamingResult
+        """
+        def extract_body(resp):
+            if resp.status_code != 200:
+                resp.close()
+                raise pykraken.exceptions.HTTPError(resp.status_code)
+            return StreamingResult(self._read_body(resp, url), row_parser, resp.status_code)
+
+        return self._post(url, params, extract_body=extract_body)
+
+    def _post_raw(self, url, params):
+        """
+        Performs a request and returns its body decompressed but not parsed, so that it can
+        be parsed in another process (see pykraken.workers). API errors are raised here.
+
+        :rtype: bytes
+        """
+        def extract_body(resp):
+            if resp.status_code != 200:
+                resp.close()
+                raise pykraken.exceptions.HTTPError(resp.status_code)
+            body = b"".join(self._read_body(resp, url))
+            # error bodies are small: only those are parsed here
+            if not _NO_ERROR.match(body):
+                error = json.loads(body.decode("utf-8")).get("error")
+                if error:
+                    raise ApiError(resp.status_code, message=error)
+            return body
+
+        return self._post(url, params, extract_body=extract_body)
+
 # public market data https://www.kraken.com/help/api#public-market-data
 from .kpublic import kpublic_time
 from .kpublic import kpublic_assets
@@ -196,23 +406,33 @@ from .kpublic import kpublic_ohlc
 from .kpublic import kpublic_depth
 from .kpublic import kpublic_trades
 from .kpublic import kpublic_spread
+from .kpublic import kpublic_trades_stream
+from .kpublic import kpublic_depth_stream
 
 # private user data https://www.kraken.com/help/api#private-user-data
 from .kprivate import kprivate_balance
 from .kprivate import kprivate_tradebalance
 from .kprivate import kprivate_openorders
 from .kprivate import kprivate_closedorders
+from .kprivate import kprivate_queryorders
 from .kprivate import kprivate_tradeshistory
 from .kprivate import kprivate_querytrades
 from .kprivate import kprivate_openpositions
 from .kprivate import kprivate_ledgers
 from .kprivate import kprivate_queryledgers
 from .kprivate import kprivate_tradevolume
+from .kprivate import kprivate_queryorders_bulk
+from .kprivate import kprivate_querytrades_bulk
+from .kprivate import kprivate_queryledgers_bulk
 
 # private user trading https://www.kraken.com/help/api#private-user-trading
 from .kprivate import kprivate_addorder
 from .kprivate import kprivate_cancelorder
 
+# prepared private requests, for latency sensitive order flow
+from .prepared import prepare_addorder
+from .prepared import prepare_cancelorder
+
 Client.kpublic_time = kpublic_time
 Client.kpublic_assets = kpublic_assets
 Client.kpublic_assetpairs = kpublic_assetpairs
@@ -221,19 +441,27 @@ Client.kpublic_ohlc = kpublic_ohlc
 Client.kpublic_depth = kpublic_depth
 Client.kpublic_trades = kpublic_trades
 Client.kpublic_spread = kpublic_spread
+Client.kpublic_trades_stream = kpublic_trades_stream
+Client.kpublic_depth_stream = kpublic_depth_stream
 
 Client.kprivate_balance = kprivate_balance
 Client.kprivate_tradebalance = kprivate_tradebalance
 Client.kprivate_openorders = kprivate_openorders
 Client.kprivate_closedorders = kprivate_closedorders
+Client.kprivate_queryorders = kprivate_queryorders
 Client.kprivate_tradeshistory = kprivate_tradeshistory
 Client.kprivate_querytrades = kprivate_querytrades
 Client.kprivate_openpositions = kprivate_openpositions
 Client.kprivate_ledgers = kprivate_ledgers
 Client.kprivate_queryledgers = kprivate_queryledgers
 Client.kprivate_tradevolume = kprivate_tradevolume
+Client.kprivate_queryorders_bulk = kprivate_queryorders_bulk
+Client.kprivate_querytrades_bulk = kprivate_querytrades_bulk
+Client.kprivate_queryledgers_bulk = kprivate_queryledgers_bulk
 Client.kprivate_addorder = kprivate_addorder
 Client.kprivate_cancelorder = kprivate_cancelorder
+Client.prepare_addorder = prepare_addorder
+Client.prepare_cancelorder = prepare_cancelorder
 
 
 def sign_hmac(secret, payload):
@@ -0,0 +1,147 @@
+"""
+Estimation of the offset between the local clock and kraken's, so that nonces and absolute
+time parameters (starttm, expiretm, start, end) follow the server time on a skewed host.
+"""
+
+import collections
+import threading
+import time
+
+
+class ClockSync(object):
+    """
+    Estimates the server clock from kpublic_time samples, NTP-style: each sample is
+    compensated by half its round-trip time, only the samples with the shortest round trips
+    of a sync are trusted, their median offset is smoothed across syncs and a drift is
+    fitted on the offsets of the recent syncs.
+    """
+
+    def __init__(self, client, samples=4, interval=600, smoothing=0.3, history=8,
+                 local_time=time.time):
+        """
+        :param client: the client used to sample kpublic_time
+        :param samples: kpublic_time requests per sync
+        :param interval: seconds between background syncs
+        :param smoothing: weight of a new sync in the smoothed offset, between 0 and 1
+        :param history: number of syncs the drift is fitted on
+        :param local_time: local clock, time.time by default
+        """
+        self.client = client
+        self.samples = samples
+        self.interval = interval
+        self.smoothing = smoothing
+        self.local_time = local_time
+        self._history = collections.deque(maxlen=history)
+        self._offset = None
+        self._drift = 0.0
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """
+        Measures the offset once
+        :return: a tuple (offset, round-trip time) in seconds
+        """
+        sent = self.local_time()
+        unixtime, _ = self.client.kpublic_time()
+        received = self.local_time()
+        # unixtime is truncated to the second: on average the server was half a second later
+        return unixtime + 0.5 - (sent + received) / 2.0, received - sent
+
+    def sync(self):
+        """
+        Samples the server time and updates the offset and drift estimates
+        :return: the offset measured by this sync, in seconds
+        """
+        measures = sorted((self.sample() for _ in range(self.samples)), key=lambda m: m[1])
+        # the clock filter: samples with long round trips are the least accurate
+        best = [offset for offset, rtt in measures if rtt <= measures[0][1] * 1.5 + 0.001]
+        best.sort()
+        measured = best[len(best) // 2]
+        now = self.local_time()
+        with self._lock:
+            if self._offset is None:
+                self._offset = measured
+            else:
+                predicted = self._offset + self._drift * (now - self._synced_at)
+                self._offset = predicted + self.smoothing * (measured - predicted)
+            self._synced_at = now
+            self._history.append((now, self._offset))
+            self._drift = self._fit_drift()
+        return measured
+
+    def _fit_drift(self):
+        if len(self._history) < 2:
+            return 0.0
+        n = float(len(self._history))
+        mean_t = sum(t for t, _ in self._history) / n
+        mean_o = sum(o for _, o in self._history) / n
+        var = sum((t - mean_t) ** 2 for t, _ in self._history)
+        if not var:
+            return 0.0
+        return sum((t - mean_t) * (o - mean_o) for t, o in self._history) / var
+
+    @property
+    def drift(self):
+        """Estimated drift of the offset, in seconds per second."""
+        return self._drift
+
+    def offset(self, at=None):
+        """
+        Returns the estimated offset (server minus local time) in seconds, syncing first if
+        it was never done
+        :param at: local timestamp the offset is wanted for, now by default
+        """
+        if self._offset is None:
+            self.sync()
+        with self._lock:
+            at = self.local_time() if at is None else at
+            return self._offset + self._drift * (at - self._synced_at)
+
+    def now(self):
+        """Returns the estimated server unix time."""
+        local = self.local_time()
+        return local + self.offset(local)
+
+    def timestamp(self, seconds_from_now=0):
+        """
+        Returns an absolute server unix timestamp, e.g. for the starttm, expiretm, start or end
+        parameters
+        :param seconds_from_now: delay added to the server's current time
+        :rtype: int
+        """
+        return int(self.now() + seconds_from_now)
+
+    def order_time(self, value):
+        """
+        Pins an order time parameter (starttm, expiretm) to the server clock: '+<n>' becomes
+        the absolute server timestamp n seconds from now, so that the time spent waiting for
+        the rate limiter does not shift it; other values are returned unchanged
+        """
+        if isinstance(value, str) and value.startswith('+') and value[1:].isdigit():
+            return self.timestamp(int(value[1:]))
+        return value
+
+    def start(self):
+        """Syncs now, then keeps re-syncing every interval seconds in a daemon thread."""
+        self.sync()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='pykraken-clock-sync')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sync()
+            except Exception:
+                # keep the previous estimate, the next sync may succeed
+                pass
@@ -0,0 +1,180 @@
+"""
+Negotiation and streaming decompression of compressed response bodies, and per endpoint
+counters of the bytes received on the wire and after decompression.
+
+gzip and deflate are always available; br and zstd are offered when the brotli and
+zstandard packages are installed.
+"""
+
+import threading
+import time
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+
+def available_encodings():
+    """
+    Returns the content codings that can be decoded, in order of preference
+    :rtype: list
+    """
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    return encodings + ['gzip', 'deflate']
+
+
+def accept_encoding(encodings=True):
+    """
+    Builds the Accept-Encoding header value
+    :param encodings: True for all the available encodings, False for none, or a list of them
+    :rtype: str
+    """
+    if encodings is True:
+        encodings = available_encodings()
+    if not encodings:
+        return 'identity'
+    unknown = set(encodings) - set(available_encodings())
+    if unknown:
+        raise ValueError('cannot decode {}'.format(', '.join(sorted(unknown))))
+    return ', '.join(encodings)
+
+
+class _ZlibDecoder(object):
+
+    def __init__(self, wbits):
+        self._wbits = wbits
+        self._obj = zlib.decompressobj(wbits)
+        self._started = False
+
+    def decompress(self, data):
+        if not self._started and data:
+            self._started = True
+            try:
+                return self._obj.decompress(data)
+            except zlib.error:
+                if self._wbits != zlib.MAX_WBITS:
+                    raise
+                # some servers send raw deflate streams without the zlib wrapper
+                self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._obj.decompress(data)
+
+    def flush(self):
+        return self._obj.flush()
+
+
+class _BrotliDecoder(object):
+
+    def __init__(self):
+        self._obj = brotli.Decompressor()
+
+    def decompress(self, data):
+        return self._obj.process(data)
+
+    def flush(self):
+        return b''
+
+
+class _IdentityDecoder(object):
+
+    def decompress(self, data):
+        return data
+
+    def flush(self):
+        return b''
+
+
+def decoder(encoding):
+    """
+    Returns an incremental decoder of a Content-Encoding, with decompress(data) and flush()
+    :raises ValueError: for an encoding that cannot be decoded
+    """
+    encoding = (encoding or 'identity').strip().lower()
+    if encoding in ('identity', ''):
+        return _IdentityDecoder()
+    if encoding in ('gzip', 'x-gzip'):
+        return _ZlibDecoder(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        return _ZlibDecoder(zlib.MAX_WBITS)
+    if encoding == 'br' and brotli is not None:
+        return _BrotliDecoder()
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError('cannot decode {} content'.format(encoding))
+
+
+class ByteCounters(object):
+    """Bytes received per endpoint, as sent by the server and once decompressed."""
+
+    def __init__(self):
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def add(self, endpoint, compressed, decompressed, seconds):
+        with self._lock:
+            counter = self._counters.setdefault(endpoint, [0, 0, 0, 0.0])
+            counter[0] += 1
+            counter[1] += compressed
+            counter[2] += decompressed
+            counter[3] += seconds
+
+    def report(self):
+        """
+        :return: dict of endpoint name -> dict of requests, compressed and decompressed
+            bytes, saved bytes, compression ratio, seconds spent receiving the bodies and an
+            estimate of the seconds saved, assuming the transfers were bandwidth bound
+        """
+        with self._lock:
+            counters = dict((k, list(v)) for k, v in self._counters.items())
+        report = {}
+        for endpoint, (requests, compressed, decompressed, seconds) in counters.items():
+            ratio = float(decompressed) / compressed if compressed else 1.0
+            report[endpoint] = {
+                'requests': requests,
+                'compressed': compressed,
+                'decompressed': decompressed,
+                'saved': decompressed - compressed,
+                'ratio': ratio,
+                'seconds': seconds,
+                'saved_seconds': seconds * (ratio - 1),
+            }
+        return report
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+def iter_decoded(raw_chunks, encoding, counters=None, endpoint=None):
+    """
+    Decompresses a body chunk by chunk as it is received
+    :param raw_chunks: iterable of the bytes received
+    :param encoding: Content-Encoding of the response
+    :param counters: ByteCounters the sizes are added to, once the body is read
+    :param endpoint: name the sizes are counted under
+    """
+    decode = decoder(encoding)
+    compressed = decompressed = 0
+    started = time.time()
+    for chunk in raw_chunks:
+        compressed += len(chunk)
+        data = decode.decompress(chunk)
+        if data:
+            decompressed += len(data)
+            yield data
+    data = decode.flush()
+    if data:
+        decompressed += len(data)
+        yield data
+    if counters is not None:
+        counters.add(endpoint, compressed, decompressed, time.time() - started)
@@ -1,17 +1,72 @@
 import re
+from decimal import Decimal
 
 from .exceptions import BadParamterError
 
+_OTIME = re.compile(r'^\+?\d+$')
+
 
 def commasep(entryList, sep=','):
     return sep.join(entryList)
 
+
 def parseOTime(timestring):
+    """
+    Validates an order time parameter (starttm, expiretm)
+    :param timestring: +<n> = <n> seconds from now, <n> = unix timestamp
+    :return: the time parameter as a string
+    """
+    timestring = str(timestring)
+    if _OTIME.match(timestring):
+        return timestring
+    raise BadParamterError('+<n> = schedule start time <n> seconds from now '
+                           '<n> = unix timestamp of start time')
+
+
+def parse_scaled(value, decimals):
+    """
+    Parses a decimal number, as returned by the API, into an integer scaled by 10 ** decimals
+    without going through float; extra decimals are truncated
+    :param value: decimal string (or number) such as '3741.00000'
+    :param decimals: number of decimals kept in the scaled integer
+    :return: int
+    """
+    if decimals and isinstance(value, str) and value[-decimals - 1:-decimals] == '.':
+        # fast path: the API sends prices and volumes with a fixed number of decimals
+        digits = value.replace('.', '', 1)
+        if digits.lstrip('-').isdigit():
+            return int(digits)
+    value = str(value)
+    if 'e' in value or 'E' in value:
+        value = '{:f}'.format(Decimal(value))
+    negative = value.startswith('-')
+    if negative:
+        value = value[1:]
+    whole, _, frac = value.partition('.')
+    scaled = int(whole or '0') * 10 ** decimals + int((frac + '0' * decimals)[:decimals] or '0')
+    return -scaled if negative else scaled
+
+
+def format_scaled(units, decimals):
+    """
+    Formats an integer scaled by 10 ** decimals as a decimal string, the inverse of
+    parse_scaled, e.g. format_scaled(374100000, 5) == '3741.00000'
+    :rtype: str
+    """
+    if not decimals:
+        return str(units)
+    whole, frac = divmod(abs(units), 10 ** decimals)
+    return '{}{}.{:0{}d}'.format('-' if units < 0 else '', whole, frac, decimals)
 
-    a = re.match('^\+\d+', timestring )
-    b = re.match('^\d+', timestring)
-    if a or b:
-        return
-    else:
-        raise BadParamterError('+<n> = schedule start time <n> seconds from now <n> = unix timestamp of start time')
 
+def format_number(value):
+    """
+    Formats a price or volume order parameter: floats and Decimals in plain notation (never
+    1e-05), anything else, such as a Fixed or a relative price string ('+5', '#1.5%'), as str
+    :rtype: str
+    """
+    if isinstance(value, float):
+        value = Decimal(repr(value))
+    if isinstance(value, Decimal):
+        return '{:f}'.format(value)
+    return str(value)
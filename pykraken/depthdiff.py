@@ -0,0 +1,167 @@
+"""
+Deltas between successive kpublic_depth snapshots.
+
+DepthDiffer keeps the previous snapshot of each pair and compares it with the new one in a
+single merge over each sorted side (asks by increasing price, bids by decreasing price),
+emitting the levels inserted, updated and removed. Applying the deltas to the previous
+book with apply_deltas gives back the new snapshot, so they can be published instead of
+full books and replayed downstream.
+"""
+
+import collections
+
+INSERT = 'insert'
+UPDATE = 'update'
+REMOVE = 'remove'
+
+SIDES = ('asks', 'bids')
+
+# entry: [<price>, <volume>, <timestamp>] as in kpublic_depth's result
+Delta = collections.namedtuple('Delta', ('side', 'action', 'entry'))
+
+
+def _key(side, price):
+    # both sides are merged on increasing keys
+    return float(price) if side == 'asks' else -float(price)
+
+
+def _keys(side, entries):
+    return [_key(side, e[0]) for e in entries]
+
+
+def diff_side(side, old, new, old_keys=None, new_keys=None):
+    """
+    Compares two sorted sides of a book in one pass
+    :param side: 'asks' or 'bids'
+    :param old: previous entries
+    :param new: current entries
+    :param old_keys: sort keys of old, if already computed
+    :param new_keys: sort keys of new, if already computed
+    :return: list of Delta, in price order
+    """
+    old_keys = _keys(side, old) if old_keys is None else old_keys
+    new_keys = _keys(side, new) if new_keys is None else new_keys
+    deltas = []
+    i = j = 0
+    while i < len(old) and j < len(new):
+        if old_keys[i] < new_keys[j]:
+            deltas.append(Delta(side, REMOVE, old[i]))
+            i += 1
+        elif new_keys[j] < old_keys[i]:
+            deltas.append(Delta(side, INSERT, new[j]))
+            j += 1
+        else:
+            if list(old[i][1:]) != list(new[j][1:]):
+                deltas.append(Delta(side, UPDATE, new[j]))
+            i += 1
+            j += 1
+    deltas.extend(Delta(side, REMOVE, e) for e in old[i:])
+    deltas.extend(Delta(side, INSERT, e) for e in new[j:])
+    return deltas
+
+
+def apply_deltas(book, deltas):
+    """
+    Replays deltas on a book
+    :param book: dict with asks and bids, as in kpublic_depth's result, left untouched
+    :param deltas: Delta list of diff_side or DepthDiffer.update
+    :return: the new book, a dict with asks and bids
+    """
+    result = {}
+    for side in SIDES:
+        changes = [d for d in deltas if d.side == side]
+        entries = book.get(side, [])
+        if not changes:
+            result[side] = list(entries)
+            continue
+        # the changes are in price order too: merge them with the entries
+        merged = []
+        i = 0
+        for delta in changes:
+            key = _key(side, delta.entry[0])
+            while i < len(entries) and _key(side, entries[i][0]) < key:
+                merged.append(entries[i])
+                i += 1
+            if delta.action == INSERT:
+                merged.append(delta.entry)
+            else:
+                if i == len(entries) or _key(side, entries[i][0]) != key:
+                    raise ValueError('{} of missing {} level {}'.format(
+                        delta.action, side, delta.entry[0]))
+                i += 1
+                if delta.action == UPDATE:
+                    merged.append(delta.entry)
+        merged.extend(entries[i:])
+        result[side] = merged
+    return result
+
+
+def compact(deltas):
+    """
+    Encodes deltas as short lists for publishing, e.g. ['a', '10.1', '0.5', 1499999999]
+    for an ask level set to 0.5 and ['b', '9.9', '0'] for a bid level removed
+    """
+    out = []
+    for delta in deltas:
+        side = delta.side[0]
+        if delta.action == REMOVE:
+            out.append([side, delta.entry[0], '0'])
+        else:
+            out.append([side] + list(delta.entry))
+    return out
+
+
+def expand(book, records):
+    """
+    Decodes compact records against the book they apply to
+    :return: list of Delta
+    """
+    sides = dict((s[0], s) for s in SIDES)
+    levels = dict((s, set(e[0] for e in book.get(s, []))) for s in SIDES)
+    deltas = []
+    for record in records:
+        side = sides[record[0]]
+        entry = record[1:]
+        if entry[1] == '0' and len(entry) == 2:
+            deltas.append(Delta(side, REMOVE, entry))
+        else:
+            deltas.append(Delta(side, UPDATE if entry[0] in levels[side] else INSERT, entry))
+    return deltas
+
+
+class DepthDiffer(object):
+    """Keeps the last snapshot of each pair and returns the deltas to each new one."""
+
+    def __init__(self):
+        self.books = {}
+        # sort keys of the sides of the last snapshots, so that prices are parsed once
+        self._keys = {}
+
+    def update(self, pair, depth):
+        """
+        :param depth: market depth of pair, as in kpublic_depth's result
+        :return: list of Delta from the previous snapshot of pair, all inserts for the first
+        """
+        previous = self.books.get(pair, {})
+        previous_keys = self._keys.get(pair, {})
+        book, keys, deltas = {}, {}, []
+        for side in SIDES:
+            entries = list(depth.get(side, []))
+            keys[side] = _keys(side, entries)
+            deltas.extend(diff_side(side, previous.get(side, []), entries,
+                                    previous_keys.get(side), keys[side]))
+            book[side] = entries
+        self.books[pair] = book
+        self._keys[pair] = keys
+        return deltas
+
+    def poll(self, client, pairs, count=None):
+        """
+        Fetches the depth of each pair
+        :return: dict of pair -> list of Delta
+        """
+        result = {}
+        for pair in pairs:
+            for name, depth in client.kpublic_depth(pair=[pair], count=count).items():
+                result[name] = self.update(name, depth)
+        return result
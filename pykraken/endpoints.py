@@ -0,0 +1,259 @@
+"""
+Declarative specification of the kraken API endpoints.
+
+Each endpoint lists its path, whether it is private, its request cost, its group and
+priority (for circuit breaking and load shedding) and its parameters, with their types,
+allowed values and list joining. The validators and encoders are
+compiled once, at import, into closures turning the keyword arguments of the kpublic_* and
+kprivate_* functions into the request parameters, all of them as strings.
+"""
+
+from .convert import format_number, parseOTime
+from .exceptions import BadParamterError, RequiredParameterError
+
+ORDER_TYPES_0 = ['market']
+ORDER_TYPES_1 = ['limit', 'stop-loss', 'take-profit', 'trailing-stop']
+ORDER_TYPES_2 = ['stop-loss-profit', 'stop-loss-profit-limit', 'stop-loss-limit',
+                 'take-profit-limit', 'trailing-stop-limit', 'stop-loss-and-limit']
+ORDER_FLAGS = ['viqc', 'fcib', 'fciq', 'nompp', 'post']
+
+OHLC_INTERVALS = [1, 5, 15, 30, 60, 240, 1440, 10080, 21600]
+TRADE_TYPES = ['all', 'any position', 'closed position', 'closing position', 'no position']
+LEDGER_TYPES = ['all', 'deposit', 'withdrawal', 'trade', 'margin']
+
+# ids accepted by one QueryOrders, QueryTrades or QueryLedgers call
+QUERY_MAX_IDS = 20
+
+# request priorities, the most urgent first
+PRIORITY_CANCEL = 0
+PRIORITY_TRADE = 1
+PRIORITY_ACCOUNT = 2
+PRIORITY_MARKET_DATA = 3
+PRIORITY_HISTORY = 4
+
+# endpoint groups, failing together when the exchange is degraded
+GROUP_PUBLIC = 'public'
+GROUP_PRIVATE = 'private'
+GROUP_TRADING = 'trading'
+
+
+def _integer(value):
+    try:
+        return str(int(value))
+    except (TypeError, ValueError):
+        raise BadParamterError('{!r} is not an integer'.format(value))
+
+
+def _boolean(value):
+    return 'true' if value else 'false'
+
+
+_CONVERTERS = {
+    str: str,
+    int: _integer,
+    bool: _boolean,
+    'otime': parseOTime,
+    'number': format_number,
+}
+
+
+class Param(object):
+    """One parameter of an endpoint."""
+
+    def __init__(self, name, kind=str, required=False, choices=None, join=False, max_items=None,
+                 arg=None):
+        """
+        :param name: name of the parameter in the request
+        :param kind: str, int, bool, 'otime' (unix timestamp or +<seconds>) or 'number' (price
+            or volume, see format_number)
+        :param required: raise RequiredParameterError when missing
+        :param choices: allowed values
+        :param join: the value is a list, sent comma delimited
+        :param max_items: maximum length of the list
+        :param arg: name of the keyword argument when it differs from name, e.g. typet for type
+        """
+        self.name = name
+        self.arg = arg or name
+        self.kind = kind
+        self.required = required
+        self.choices = frozenset(choices) if choices else None
+        self.join = join
+        self.max_items = max_items
+
+    def compile(self):
+        """
+        Returns a function(kwargs, params) validating the argument of this parameter and
+        setting its encoded value in params
+        """
+        name, arg, required, max_items, join = (self.name, self.arg, self.required, self.max_items,
+                                                self.join)
+        convert = _CONVERTERS[self.kind]
+        choices = frozenset(convert(c) for c in self.choices) if self.choices else None
+
+        def encode(kwargs, params):
+            value = kwargs.get(arg)
+            if value is None or value is False or value == '' or value == []:
+                if required:
+                    raise RequiredParameterError(arg)
+                return
+            if join:
+                values = value.split(',') if isinstance(value, str) else [convert(v) for v in value]
+                if max_items and len(values) > max_items:
+                    raise BadParamterError('at most {} values allowed for {}'.format(max_items,
+                                                                                     arg))
+                value = ','.join(values)
+            else:
+                values = [convert(value)]
+                value = values[0]
+            if choices and not choices.issuperset(values):
+                raise BadParamterError('{} should be in {}'.format(arg, sorted(choices)))
+            params[name] = value
+        return encode
+
+
+class Endpoint(object):
+    """One endpoint of the API and its compiled parameter encoder."""
+
+    def __init__(self, name, private, params=(), cost=1, check=None, group=None, priority=None):
+        """
+        :param name: method name, e.g. 'Trades'
+        :param private: whether the endpoint requires authentication
+        :param params: list of Param
+        :param cost: decrease of the rate limiter's budget per call
+        :param group: GROUP_* the endpoint is circuit broken with, by default GROUP_PRIVATE
+            or GROUP_PUBLIC
+        :param priority: PRIORITY_* of its requests, by default PRIORITY_ACCOUNT or
+            PRIORITY_MARKET_DATA
+        :param check: function(params) run on the encoded parameters, for rules spanning
+            several of them
+        """
+        self.name = name
+        self.private = private
+        self.path = '/0/{}/{}'.format('private' if private else 'public', name)
+        self.params = params
+        self.cost = cost
+        self.group = group or (GROUP_PRIVATE if private else GROUP_PUBLIC)
+        if priority is None:
+            priority = PRIORITY_ACCOUNT if private else PRIORITY_MARKET_DATA
+        self.priority = priority
+        self.check = check
+        steps = [p.compile() for p in params]
+
+        def encode(**kwargs):
+            """
+            Validates the keyword arguments and returns the request parameters
+            :raises RequiredParameterError: if a required parameter is missing
+            :raises BadParamterError: if a parameter has a wrong value
+            """
+            result = {}
+            for step in steps:
+                step(kwargs, result)
+            if check:
+                check(result)
+            return result
+        self.encode = encode
+
+
+def _check_addorder(params):
+    ordertype = params['ordertype']
+    if ordertype in ORDER_TYPES_0:
+        if 'price' in params:
+            raise BadParamterError('if price is set, ordertype cant be at market')
+    elif ordertype in ORDER_TYPES_1:
+        if 'price' not in params:
+            raise RequiredParameterError('price required for this order type: {}'.format(ordertype))
+    elif 'price' not in params or 'price2' not in params:
+        raise RequiredParameterError(
+            'price and price2 required for this order type: {}'.format(ordertype))
+
+
+# public market data https://www.kraken.com/help/api#public-market-data
+TIME = Endpoint('Time', False)
+ASSETS = Endpoint('Assets', False, [
+    Param('info', choices=['info']),
+    Param('aclass', choices=['currency']),
+    Param('asset', join=True),
+])
+ASSET_PAIRS = Endpoint('AssetPairs', False, [
+    Param('info', choices=['info', 'leverage', 'fees', 'margin']),
+    Param('pair', join=True),
+])
+TICKER = Endpoint('Ticker', False, [Param('pair', required=True, join=True)])
+OHLC = Endpoint('OHLC', False, [
+    Param('pair', required=True, join=True),
+    Param('interval', int, choices=OHLC_INTERVALS),
+    Param('since'),
+])
+DEPTH = Endpoint('Depth', False, [Param('pair', required=True, join=True), Param('count', int)])
+TRADES = Endpoint('Trades', False, [Param('pair', required=True, join=True), Param('since')])
+SPREAD = Endpoint('Spread', False, [Param('pair', required=True, join=True), Param('since')])
+
+# private user data https://www.kraken.com/help/api#private-user-data
+BALANCE = Endpoint('Balance', True)
+TRADE_BALANCE = Endpoint('TradeBalance', True, [Param('aclass'), Param('asset')])
+OPEN_ORDERS = Endpoint('OpenOrders', True, [Param('trades', bool), Param('userref')])
+CLOSED_ORDERS = Endpoint('ClosedOrders', True, [
+    Param('trades', bool),
+    Param('userref'),
+    Param('start'),
+    Param('end'),
+    Param('ofs', int),
+    Param('closetime', choices=['open', 'close', 'both']),
+], priority=PRIORITY_HISTORY)
+QUERY_ORDERS = Endpoint('QueryOrders', True, [
+    Param('trades', bool),
+    Param('userref'),
+    Param('txid', join=True, max_items=QUERY_MAX_IDS),
+], priority=PRIORITY_HISTORY)
+TRADES_HISTORY = Endpoint('TradesHistory', True, [
+    Param('type', choices=TRADE_TYPES, arg='typet'),
+    Param('trades', bool),
+    Param('start'),
+    Param('end'),
+    Param('ofs', int),
+], cost=2, priority=PRIORITY_HISTORY)
+QUERY_TRADES = Endpoint('QueryTrades', True, [
+    Param('txid', required=True, join=True, max_items=QUERY_MAX_IDS),
+    Param('trades', bool),
+], priority=PRIORITY_HISTORY)
+OPEN_POSITIONS = Endpoint('OpenPositions', True, [Param('txid', join=True), Param('docalcs', bool)])
+LEDGERS = Endpoint('Ledgers', True, [
+    Param('aclass'),
+    Param('asset', join=True),
+    Param('type', choices=LEDGER_TYPES, arg='typet'),
+    Param('start'),
+    Param('end'),
+    Param('ofs', int),
+], cost=2, priority=PRIORITY_HISTORY)
+QUERY_LEDGERS = Endpoint('QueryLedgers', True, [
+    Param('id', required=True, join=True, max_items=QUERY_MAX_IDS),
+], cost=2, priority=PRIORITY_HISTORY)
+TRADE_VOLUME = Endpoint('TradeVolume', True, [
+    Param('pair', join=True),
+    Param('fee-info', bool, arg='feeinfo'),
+])
+
+# private user trading https://www.kraken.com/help/api#private-user-trading
+ADD_ORDER = Endpoint('AddOrder', True, [
+    Param('pair', required=True),
+    Param('type', required=True, choices=['buy', 'sell'], arg='typeo'),
+    Param('ordertype', required=True, choices=ORDER_TYPES_0 + ORDER_TYPES_1 + ORDER_TYPES_2),
+    Param('price', 'number'),
+    Param('price2', 'number'),
+    Param('volume', 'number', required=True),
+    Param('leverage'),
+    Param('oflags', join=True, choices=ORDER_FLAGS),
+    Param('starttm', 'otime'),
+    Param('expiretm', 'otime'),
+    Param('userref'),
+    Param('validate', bool),
+], check=_check_addorder, group=GROUP_TRADING, priority=PRIORITY_TRADE)
+CANCEL_ORDER = Endpoint('CancelOrder', True, [Param('txid', required=True)], group=GROUP_TRADING,
+                        priority=PRIORITY_CANCEL)
+
+ENDPOINTS = dict((e.name, e) for e in (
+    TIME, ASSETS, ASSET_PAIRS, TICKER, OHLC, DEPTH, TRADES, SPREAD,
+    BALANCE, TRADE_BALANCE, OPEN_ORDERS, CLOSED_ORDERS, QUERY_ORDERS, TRADES_HISTORY, QUERY_TRADES,
+    OPEN_POSITIONS, LEDGERS, QUERY_LEDGERS, TRADE_VOLUME, ADD_ORDER, CANCEL_ORDER,
+))
+ENDPOINTS_BY_PATH = dict((e.path, e) for e in ENDPOINTS.values())
@@ -40,11 +40,36 @@ class HTTPError(TransportError):
         return "HTTP Error: %d" % self.status_code
 
 
+class CircuitOpenError(TransportError):
+    """The endpoint group is failing: the request was rejected without being sent."""
+
+    def __init__(self, group, retry_after=None):
+        self.group = group
+        self.retry_after = retry_after
+
+    def __str__(self):
+        if self.retry_after is None:
+            return "Circuit open for %s requests" % self.group
+        return "Circuit open for %s requests, retry in %.1fs" % (self.group, self.retry_after)
+
+
+class LoadShedError(CircuitOpenError):
+    """The endpoint group is degraded: the low priority request was dropped."""
+
+    def __str__(self):
+        return "Low priority %s request shed" % self.group
+
+
 class Timeout(Exception):
     """The request timed out."""
     pass
 
 
+class DeadlineExceeded(Timeout):
+    """The request was dropped unsent: its deadline passed while it was queued."""
+    pass
+
+
 class _RetriableRequest(Exception):
     """Signifies that the request can be retried."""
     pass
@@ -65,7 +90,7 @@ class BadParamterError(Exception):
         return "Bad parameter error: {}".format(self.message)
 
 
-class RequiredParameterError(Exception):
+class RequiredParameterError(BadParamterError):
     """Signifies that the parameter is required"""
 
     def __init__(self, required):
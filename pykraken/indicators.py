@@ -0,0 +1,340 @@
+"""
+Technical indicators over columnar OHLC data.
+
+The string rows of kpublic_ohlc are parsed once into float columns (array('d')); each
+indicator is then a single pass over the columns keeping running sums, so its cost does not
+depend on the period. The batch functions return columns aligned with their input, NaN
+during the warm-up.
+
+The classes are the incremental forms of the same indicators: update() takes one new bar
+in O(1) and returns the latest value, None during the warm-up. A live poller feeds them the
+bars closed since its last cursor; kraken's last entry is the bar in progress, which is
+resent, updated, until it closes.
+"""
+
+import array
+import collections
+import math
+
+from .resample import Bar
+from .records import OHLC, TIME_DECIMALS
+
+NAN = float('nan')
+
+Columns = collections.namedtuple('Columns', Bar._fields)
+
+
+def columns(rows):
+    """
+    Parses OHLC rows into columns
+    :param rows: entries of kpublic_ohlc's result, or Bar tuples
+    :rtype: Columns of array('d')
+    """
+    cols = Columns(*[array.array('d') for _ in Bar._fields])
+    appends = [c.append for c in cols]
+    for row in rows:
+        for append, value in zip(appends, row):
+            append(float(value))
+    return cols
+
+
+def columns_from_records(reader):
+    """
+    Reads the columns of an OHLC record file
+    :param reader: pykraken.records.RecordReader of OHLC records
+    :rtype: Columns of array('d')
+    """
+    if reader.fmt is not OHLC:
+        raise ValueError('not an OHLC record file')
+    scales = {'time': 10.0 ** TIME_DECIMALS, 'volume': 10.0 ** reader.volume_decimals,
+              'count': 1.0}
+    price_scale = 10.0 ** reader.price_decimals
+    return Columns(*[array.array('d', [v / scales.get(name, price_scale)
+                                       for v in reader.column(name)])
+                     for name in Bar._fields])
+
+
+def _output(n):
+    return array.array('d', [NAN]) * n
+
+
+def sma(values, period):
+    """Simple moving average."""
+    out = _output(len(values))
+    total = 0.0
+    for i, value in enumerate(values):
+        total += value
+        if i >= period:
+            total -= values[i - period]
+        if i >= period - 1:
+            out[i] = total / period
+    return out
+
+
+def ema(values, period):
+    """Exponential moving average, seeded with the simple average of the first period values."""
+    out = _output(len(values))
+    alpha = 2.0 / (period + 1)
+    current = 0.0
+    for i, value in enumerate(values):
+        if i < period:
+            current += value
+            if i == period - 1:
+                current /= period
+                out[i] = current
+        else:
+            current += alpha * (value - current)
+            out[i] = current
+    return out
+
+
+def vwap(prices, volumes, period=None):
+    """
+    Volume weighted average price
+    :param prices: price column, typically the vwap column of the bars
+    :param period: number of bars averaged, None for a cumulative average
+    """
+    out = _output(len(prices))
+    pv = volume = 0.0
+    for i, (price, vol) in enumerate(zip(prices, volumes)):
+        pv += price * vol
+        volume += vol
+        if period is not None:
+            if i >= period:
+                pv -= prices[i - period] * volumes[i - period]
+                volume -= volumes[i - period]
+            if i < period - 1:
+                continue
+        out[i] = pv / volume if volume > 0 else NAN
+    return out
+
+
+def true_range(highs, lows, closes):
+    out = array.array('d', [0.0]) * len(highs)
+    previous = None
+    for i, (high, low, close) in enumerate(zip(highs, lows, closes)):
+        if previous is None:
+            out[i] = high - low
+        else:
+            out[i] = max(high - low, abs(high - previous), abs(low - previous))
+        previous = close
+    return out
+
+
+def atr(highs, lows, closes, period=14):
+    """Average true range, Wilder's smoothing."""
+    ranges = true_range(highs, lows, closes)
+    out = _output(len(ranges))
+    current = 0.0
+    for i, tr in enumerate(ranges):
+        if i < period:
+            current += tr
+            if i == period - 1:
+                current /= period
+                out[i] = current
+        else:
+            current = (current * (period - 1) + tr) / period
+            out[i] = current
+    return out
+
+
+def bollinger(values, period=20, k=2.0):
+    """
+    Bollinger bands, over the population standard deviation
+    :return: (middle, upper, lower) columns
+    """
+    n = len(values)
+    middle, upper, lower = _output(n), _output(n), _output(n)
+    total = squares = 0.0
+    for i, value in enumerate(values):
+        total += value
+        squares += value * value
+        if i >= period:
+            old = values[i - period]
+            total -= old
+            squares -= old * old
+        if i >= period - 1:
+            mean = total / period
+            width = k * math.sqrt(max(0.0, squares / period - mean * mean))
+            middle[i], upper[i], lower[i] = mean, mean + width, mean - width
+    return middle, upper, lower
+
+
+def _rsi_value(gain, loss):
+    if not loss:
+        # no move at all is neutral, only gains without any loss are overbought
+        return 100.0 if gain else 50.0
+    return 100.0 - 100.0 / (1.0 + gain / loss)
+
+
+def rsi(values, period=14):
+    """Relative strength index, Wilder's smoothing."""
+    out = _output(len(values))
+    gain = loss = 0.0
+    for i in range(1, len(values)):
+        change = values[i] - values[i - 1]
+        up, down = (change, 0.0) if change > 0 else (0.0, -change)
+        if i <= period:
+            gain += up
+            loss += down
+            if i < period:
+                continue
+            gain /= period
+            loss /= period
+        else:
+            gain = (gain * (period - 1) + up) / period
+            loss = (loss * (period - 1) + down) / period
+        out[i] = _rsi_value(gain, loss)
+    return out
+
+
+class SMA(object):
+    """Incremental simple moving average."""
+
+    def __init__(self, period):
+        self.period = period
+        self._window = collections.deque()
+        self._total = 0.0
+        self.value = None
+
+    def update(self, value):
+        value = float(value)
+        self._window.append(value)
+        self._total += value
+        if len(self._window) > self.period:
+            self._total -= self._window.popleft()
+        if len(self._window) == self.period:
+            self.value = self._total / self.period
+        return self.value
+
+
+class EMA(object):
+    """Incremental exponential moving average."""
+
+    def __init__(self, period):
+        self.period = period
+        self._alpha = 2.0 / (period + 1)
+        self._count = 0
+        self._seed = 0.0
+        self.value = None
+
+    def update(self, value):
+        value = float(value)
+        self._count += 1
+        if self.value is None:
+            self._seed += value
+            if self._count == self.period:
+                self.value = self._seed / self.period
+        else:
+            self.value += self._alpha * (value - self.value)
+        return self.value
+
+
+class VWAP(object):
+    """Incremental volume weighted average price, cumulative or over the last period bars."""
+
+    def __init__(self, period=None):
+        self.period = period
+        self._window = collections.deque()
+        self._pv = self._volume = 0.0
+        self.value = None
+
+    def update(self, price, volume):
+        price, volume = float(price), float(volume)
+        self._pv += price * volume
+        self._volume += volume
+        if self.period is not None:
+            self._window.append((price, volume))
+            if len(self._window) > self.period:
+                old_price, old_volume = self._window.popleft()
+                self._pv -= old_price * old_volume
+                self._volume -= old_volume
+            if len(self._window) < self.period:
+                return None
+        self.value = self._pv / self._volume if self._volume > 0 else None
+        return self.value
+
+
+class ATR(object):
+    """Incremental average true range."""
+
+    def __init__(self, period=14):
+        self.period = period
+        self._count = 0
+        self._seed = 0.0
+        self._close = None
+        self.value = None
+
+    def update(self, high, low, close):
+        high, low, close = float(high), float(low), float(close)
+        if self._close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self._close), abs(low - self._close))
+        self._close = close
+        self._count += 1
+        if self.value is None:
+            self._seed += tr
+            if self._count == self.period:
+                self.value = self._seed / self.period
+        else:
+            self.value = (self.value * (self.period - 1) + tr) / self.period
+        return self.value
+
+
+class Bollinger(object):
+    """Incremental Bollinger bands, update() returning (middle, upper, lower)."""
+
+    def __init__(self, period=20, k=2.0):
+        self.period = period
+        self.k = k
+        self._window = collections.deque()
+        self._total = self._squares = 0.0
+        self.value = None
+
+    def update(self, value):
+        value = float(value)
+        self._window.append(value)
+        self._total += value
+        self._squares += value * value
+        if len(self._window) > self.period:
+            old = self._window.popleft()
+            self._total -= old
+            self._squares -= old * old
+        if len(self._window) == self.period:
+            mean = self._total / self.period
+            width = self.k * math.sqrt(max(0.0, self._squares / self.period - mean * mean))
+            self.value = (mean, mean + width, mean - width)
+        return self.value
+
+
+class RSI(object):
+    """Incremental relative strength index."""
+
+    def __init__(self, period=14):
+        self.period = period
+        self._previous = None
+        self._count = 0
+        self._gain = self._loss = 0.0
+        self.value = None
+
+    def update(self, value):
+        value = float(value)
+        previous, self._previous = self._previous, value
+        if previous is None:
+            return None
+        change = value - previous
+        up, down = (change, 0.0) if change > 0 else (0.0, -change)
+        self._count += 1
+        if self._count <= self.period:
+            self._gain += up
+            self._loss += down
+            if self._count < self.period:
+                return None
+            self._gain /= self.period
+            self._loss /= self.period
+        else:
+            self._gain = (self._gain * (self.period - 1) + up) / self.period
+            self._loss = (self._loss * (self.period - 1) + down) / self.period
+        self.value = _rsi_value(self._gain, self._loss)
+        return self.value
@@ -0,0 +1,344 @@
+"""
+Crash-safe order submission: a journal of the orders and cancels sent, keyed by userref.
+
+Before an order or a cancel is sent, its intent is appended to the journal and fsynced;
+the outcome (txid, rejection) is appended once known. A process dying in between leaves
+the intent without outcome: the order is in doubt. On restart, OrderJournal.recover looks
+up only the orders in doubt:
+
+- orders never acknowledged, by their userref: kprivate_openorders(userref=...), then
+  kprivate_closedorders(userref=..., start=<time of the intent>) when not open
+- cancels of known orders, by txid, with kprivate_queryorders_bulk
+
+instead of scanning the open and closed orders.
+
+The journal is a file of JSON lines, only appended to. The fsyncs are batched: a thread
+appending an intent while another one is fsyncing waits for the next fsync, which covers
+every intent appended meanwhile. Outcomes are not fsynced by themselves, since an outcome
+lost in a crash leaves the order in doubt, to be looked up again.
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+from ._compat import replace
+from .breaker import is_service_error
+from .exceptions import ApiError, BadParamterError, CircuitOpenError, DeadlineExceeded
+from .kprivate import FINAL_ORDER_STATUSES
+
+# states of an order
+SENT = 'sent'  # in doubt until its outcome is known
+PLACED = 'placed'
+REJECTED = 'rejected'  # rejected by kraken, not sent, or not found by recover
+
+# states of a cancel
+CANCEL_SENT = 'cancel sent'  # in doubt
+CANCELED = 'canceled'
+CANCEL_FAILED = 'cancel failed'  # rejected, or the order still open after recover
+
+# errors raised before the request is sent
+_NOT_SENT = (BadParamterError, CircuitOpenError, DeadlineExceeded)
+
+# userrefs are taken from the seconds elapsed since then, so that they keep increasing
+# across restarts, and fit in the 32 bits signed integer of the API until 2083
+_USERREF_EPOCH = 1500000000
+
+# seconds allowed between the local clock and kraken's when looking up an order by time
+_CLOCK_SLACK = 60
+
+
+def _dumps(record):
+    # prices given as Decimal or money.Fixed, times as datetime, are journaled as strings
+    return json.dumps(record, separators=(',', ':'), default=str) + '\n'
+
+
+class JournalEntry(object):
+    """An order sent through the journal, and its cancel."""
+
+    __slots__ = ('userref', 'time', 'params', 'state', 'txid', 'error', 'cancel', 'status')
+
+    def __init__(self, userref, time, params):
+        self.userref = userref
+        self.time = time
+        self.params = params
+        self.state = SENT
+        self.txid = None
+        self.error = None
+        self.cancel = None
+        self.status = None  # kraken's status of the order, as found by recover
+
+    @property
+    def in_doubt(self):
+        return self.state == SENT or self.cancel == CANCEL_SENT
+
+    def __repr__(self):
+        return 'JournalEntry({}, {}, txid={}, cancel={})'.format(
+            self.userref, self.state, self.txid, self.cancel)
+
+
+class OrderJournal(object):
+    """Append-only journal of the order and cancel intents, with batched fsyncs."""
+
+    def __init__(self, path, batch_seconds=0.0, fsync=True):
+        """
+        :param path: journal file, created if missing and replayed otherwise
+        :param batch_seconds: time the thread about to fsync waits for other intents to
+            share the fsync with
+        :param fsync: False to only flush the appends to the OS, e.g. on a battery backed
+            disk or in tests
+        """
+        self.path = path
+        self.batch_seconds = batch_seconds
+        self.fsync = fsync
+        self.entries = collections.OrderedDict()  # userref -> JournalEntry
+        self._last_userref = 0
+        self._lock = threading.Lock()
+        self._synced_cond = threading.Condition(self._lock)
+        self._written = 0
+        self._synced = 0
+        self._syncing = False
+        self._replay()
+        self._file = open(path, 'a')
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            good = 0
+            for line in iter(f.readline, b''):
+                try:
+                    record = json.loads(line.decode('utf-8')) if line.endswith(b'\n') else None
+                except ValueError:
+                    record = None
+                if record is None:
+                    # an append torn by a crash, dropped with anything after it
+                    f.truncate(good)
+                    break
+                self._apply(record)
+                good = f.tell()
+
+    def _apply(self, record):
+        op, userref = record['op'], record['userref']
+        self._last_userref = max(self._last_userref, userref)
+        if op == 'userref':  # kept by compact
+            return
+        if op == 'add':
+            self.entries[userref] = JournalEntry(userref, record['time'], record['params'])
+            return
+        entry = self.entries.get(userref)
+        if entry is None:
+            return
+        if op == 'placed':
+            entry.state, entry.txid = PLACED, record['txid']
+            entry.status = record.get('status', entry.status)
+        elif op == 'rejected':
+            entry.state, entry.error = REJECTED, record['error']
+        elif op == 'cancel':
+            entry.cancel = CANCEL_SENT
+        elif op == 'canceled':
+            entry.cancel = CANCELED
+            entry.status = record.get('status', entry.status)
+        elif op == 'cancel_failed':
+            entry.cancel, entry.error = CANCEL_FAILED, record['error']
+            entry.status = record.get('status', entry.status)
+
+    def _append(self, record, durable):
+        line = _dumps(record)
+        with self._lock:
+            self._file.write(line)
+            self._apply(record)
+            self._written += 1
+            if not durable:
+                return
+            mine = self._written
+            while self._synced < mine:
+                if self._syncing:
+                    self._synced_cond.wait()
+                    continue
+                # this thread fsyncs for all the intents written so far
+                self._syncing = True
+                try:
+                    if self.batch_seconds:
+                        self._synced_cond.wait(self.batch_seconds)
+                    covered = self._written
+                    self._file.flush()
+                    self._lock.release()
+                    try:
+                        if self.fsync:
+                            os.fsync(self._file.fileno())
+                    finally:
+                        self._lock.acquire()
+                    self._synced = max(self._synced, covered)
+                finally:
+                    self._syncing = False
+                    self._synced_cond.notify_all()
+
+    def next_userref(self):
+        """
+        :return: a userref not used by the journal before, increasing with time
+        """
+        with self._lock:
+            self._last_userref = max(self._last_userref + 1, int(time.time()) - _USERREF_EPOCH)
+            return self._last_userref
+
+    def add_order(self, client, userref=None, **kwargs):
+        """
+        Journals and sends an order
+        :param userref: identifies the order in the journal, next_userref() by default
+        :param kwargs: arguments of kprivate_addorder
+        :return: the result of kprivate_addorder
+        :raises: the errors of kprivate_addorder; the order stays in doubt unless kraken
+            rejected it or it was not sent
+        """
+        if kwargs.get('validate'):
+            return client.kprivate_addorder(userref=userref, **kwargs)
+        if userref is None:
+            userref = self.next_userref()
+        elif userref in self.entries:
+            raise ValueError('userref {} is already in the journal'.format(userref))
+        self._append({'op': 'add', 'userref': userref, 'time': time.time(), 'params': kwargs},
+                     True)
+        try:
+            result = client.kprivate_addorder(userref=userref, **kwargs)
+        except Exception as e:
+            if self._definite(e):
+                self._append({'op': 'rejected', 'userref': userref, 'error': str(e)}, False)
+            raise
+        self._append({'op': 'placed', 'userref': userref, 'txid': result.get('txid')}, False)
+        return result
+
+    def cancel_order(self, client, userref):
+        """
+        Journals and sends the cancel of an order of the journal, by txid when known and by
+        userref otherwise
+        :return: the result of kprivate_cancelorder
+        """
+        entry = self.entries[userref]
+        self._append({'op': 'cancel', 'userref': userref}, True)
+        try:
+            result = client.kprivate_cancelorder(txid=entry.txid[0] if entry.txid else userref)
+        except Exception as e:
+            if self._definite(e):
+                self._append({'op': 'cancel_failed', 'userref': userref, 'error': str(e)},
+                             False)
+            raise
+        self._append({'op': 'canceled', 'userref': userref}, False)
+        return result
+
+    @staticmethod
+    def _definite(error):
+        """Whether the request surely did not take effect."""
+        if isinstance(error, ApiError):
+            return not is_service_error(error)
+        return isinstance(error, _NOT_SENT)
+
+    def in_doubt(self):
+        """
+        :return: the entries whose order or cancel has an unknown outcome
+        :rtype: list of JournalEntry
+        """
+        with self._lock:
+            return [e for e in self.entries.values() if e.in_doubt]
+
+    def recover(self, client):
+        """
+        Looks up the orders and cancels in doubt and journals their outcome; run it on
+        startup, before sending new orders
+        :return: the entries looked up, by userref
+        :rtype: dict of userref -> JournalEntry
+        """
+        doubtful = self.in_doubt()
+        for entry in doubtful:
+            if entry.state != SENT:
+                continue
+            userref = entry.userref
+            orders = client.kprivate_openorders(userref=userref).get('open')
+            if not orders:
+                start = int(entry.time) - _CLOCK_SLACK
+                orders = client.kprivate_closedorders(userref=userref, start=start).get('closed')
+            if orders:
+                self._append({'op': 'placed', 'userref': userref, 'txid': sorted(orders),
+                              'status': orders[min(orders)].get('status')}, False)
+            else:
+                self._append({'op': 'rejected', 'userref': userref, 'error': 'not found'},
+                             False)
+
+        cancels = [e for e in doubtful if e.cancel == CANCEL_SENT]
+        placed = [e for e in cancels if e.state == PLACED]
+        orders = {}
+        if placed:
+            orders = client.kprivate_queryorders_bulk([e.txid[0] for e in placed])
+        for entry in cancels:
+            order = orders.get(entry.txid[0]) if entry.state == PLACED else None
+            status = order.get('status') if order else None
+            if status == 'canceled':
+                self._append({'op': 'canceled', 'userref': entry.userref, 'status': status},
+                             False)
+            else:
+                reason = 'order {}'.format(status) if status else 'order not placed'
+                self._append({'op': 'cancel_failed', 'userref': entry.userref,
+                              'error': reason, 'status': status}, False)
+        self.flush()
+        return dict((e.userref, e) for e in doubtful)
+
+    def compact(self):
+        """
+        Rewrites the journal without the orders settled: placed orders canceled or
+        closed, and rejected orders
+        """
+        with self._lock:
+            while self._syncing:
+                self._synced_cond.wait()
+            self._file.flush()
+            kept = [e for e in self.entries.values()
+                    if not (e.state == REJECTED or e.cancel == CANCELED
+                            or (e.state == PLACED and e.status in FINAL_ORDER_STATUSES))]
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w') as f:
+                f.write(_dumps({'op': 'userref', 'userref': self._last_userref}))
+                for entry in kept:
+                    for record in self._records(entry):
+                        f.write(_dumps(record))
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+            self._file.close()
+            replace(tmp, self.path)
+            self._file = open(self.path, 'a')
+            last, self.entries = self._last_userref, collections.OrderedDict()
+            for entry in kept:
+                for record in self._records(entry):
+                    self._apply(record)
+            self._last_userref = last
+        return len(kept)
+
+    @staticmethod
+    def _records(entry):
+        userref = entry.userref
+        records = [{'op': 'add', 'userref': userref, 'time': entry.time, 'params': entry.params}]
+        if entry.state == PLACED:
+            records.append({'op': 'placed', 'userref': userref, 'txid': entry.txid,
+                            'status': entry.status})
+        if entry.cancel is not None:
+            records.append({'op': 'cancel', 'userref': userref})
+        if entry.cancel == CANCEL_FAILED:
+            records.append({'op': 'cancel_failed', 'userref': userref, 'error': entry.error,
+                            'status': entry.status})
+        return records
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,224 +1,196 @@
-import pykraken
-from .exceptions import RequiredParameterError
-from .convert import commasep, parseOTime
+import concurrent.futures
+
+from .endpoints import (BALANCE, TRADE_BALANCE, OPEN_ORDERS, CLOSED_ORDERS, QUERY_ORDERS,
+                        TRADES_HISTORY, QUERY_TRADES, OPEN_POSITIONS, LEDGERS, QUERY_LEDGERS,
+                        TRADE_VOLUME, ADD_ORDER, CANCEL_ORDER)
+from .endpoints import ORDER_TYPES_0, ORDER_TYPES_1, ORDER_TYPES_2, ORDER_FLAGS  # NOQA
+from .endpoints import QUERY_MAX_IDS
+
+# statuses of the orders that will not change anymore, and can be cached
+FINAL_ORDER_STATUSES = frozenset(['closed', 'canceled', 'expired'])
 
 
 def kprivate_balance(client):
-    c = client._post("/0/private/Balance")
+    c = client._post(BALANCE.path)
     return c['result']
 
 
 def kprivate_tradebalance(client, aclass='currency', asset='ZUSD'):
-    params = {}
-    if aclass:
-        params['aclass'] = aclass
-    if asset:
-        params['asset'] = asset
-    c = client._post("/0/private/TradeBalance", params)
+    c = client._post(TRADE_BALANCE.path, TRADE_BALANCE.encode(aclass=aclass, asset=asset))
     return c['result']
 
 
 def kprivate_openorders(client, trades=False, userref=None):
-    params = {}
-    if trades:
-        params['trades'] = trades
-    if userref:
-        params['userref'] = userref
-    c = client._post("/0/private/OpenOrders", params)
+    c = client._post(OPEN_ORDERS.path, OPEN_ORDERS.encode(trades=trades, userref=userref))
+    if client.lifecycle is not None:
+        client.lifecycle.observe(c['result'].get('open'))
     return c['result']
 
 
 def kprivate_closedorders(client, trades=False, userref=None, start=None, end=None, ofs=None, closetime='both'):
-    params = {}
-    if trades:
-        params['trades'] = trades
-    if userref:
-        params['userref'] = userref
-    if start:
-        params['start'] = start
-    if end:
-        params['end'] = end
-    if ofs:
-        params['ofs'] = ofs
-    if closetime:
-        params['closetime'] = closetime
-
-    c = client._post("/0/private/ClosedOrders", params)
+    params = CLOSED_ORDERS.encode(trades=trades, userref=userref, start=start, end=end, ofs=ofs,
+                                  closetime=closetime)
+    c = client._post(CLOSED_ORDERS.path, params)
+    if client.lifecycle is not None:
+        client.lifecycle.observe(c['result'].get('closed'))
     return c['result']
 
 
 def kprivate_queryorders(client, trades=False, userref=None, txid=None):
-    params = {}
-    if trades:
-        params['trades'] = trades
-    if userref:
-        params['userref'] = userref
-    if txid:
-        params['txid'] = commasep(txid)
-
-    c = client._post("/0/private/QueryOrders", params)
+    c = client._post(QUERY_ORDERS.path,
+                     QUERY_ORDERS.encode(trades=trades, userref=userref, txid=txid))
     return c['result']
 
 
 def kprivate_tradeshistory(client, typet=None, trades=False, start=None, end=None, ofs=None):
-    params = {}
-    if typet and typet in ['all', 'any position', 'closed position', 'closing position', 'no position']:
-        # using typet variable as type is reserved, but it need to be type in the params dictionnary
-        params['type'] = typet
-    if trades:
-        params['trades'] = trades
-    if start:
-        params['start'] = start
-    if end:
-        params['end'] = end
-    if ofs:
-        params['ofs'] = ofs
-
-    c = client._post("/0/private/TradesHistory", params)
+    # using typet variable as type is reserved, but it need to be type in the params dictionnary
+    params = TRADES_HISTORY.encode(typet=typet, trades=trades, start=start, end=end, ofs=ofs)
+    c = client._post(TRADES_HISTORY.path, params)
     return c['result']
 
 
 def kprivate_querytrades(client, txid=None, trades=False):
-    params = {}
-    if txid and len(txid) <= 20 and isinstance(txid, list):
-        params['txid'] = commasep(txid)
-    else:
-        raise pykraken.exceptions.RequiredParameterError('no txid found')
-    if trades:
-        params['trades'] = trades
-    c = client._post("/0/private/QueryTrades", params)
+    c = client._post(QUERY_TRADES.path, QUERY_TRADES.encode(txid=txid, trades=trades))
     return c['result']
 
 
 def kprivate_openpositions(client, txid=None, docalcs=False):
-    params = {}
-    if txid and isinstance(txid, list):
-        params['txid'] = commasep(txid)
-    if docalcs:
-        params['docalcs'] = docalcs
-
-    c = client._post("/0/private/OpenPositions", params)
+    c = client._post(OPEN_POSITIONS.path, OPEN_POSITIONS.encode(txid=txid, docalcs=docalcs))
     return c['result']
 
 
 def kprivate_ledgers(client, aclass='currency', asset='all', typet='all', start=None, end=None, ofs=None):
-    params = {}
-    if aclass:
-        params['aclass'] = aclass
-    if asset:
-        params['asset'] = asset
-    if typet:
-        params['type'] = typet
-    if start:
-        params['start'] = start
-    if end:
-        params['end'] = end
-    if ofs:
-        params['ofs'] = ofs
-
-    c = client._post("/0/private/Ledgers")
+    params = LEDGERS.encode(aclass=aclass, asset=asset, typet=typet, start=start, end=end, ofs=ofs)
+    c = client._post(LEDGERS.path, params)
     return c['result']
 
 
 def kprivate_queryledgers(client, id=None):
-    params = {}
-    if id and len(id) <= 20 and isinstance(id, list):
-        params['id'] = commasep(id)
-    else:
-        raise pykraken.exceptions.BadParamterError('error in ids')
-    c = client._post("/0/private/QueryLedgers", params)
+    c = client._post(QUERY_LEDGERS.path, QUERY_LEDGERS.encode(id=id))
     return c['result']
 
 
 def kprivate_tradevolume(client, pair=None, feeinfo=None):
-    params = {}
-    if pair:
-        params['pair'] = commasep(pair)
-    if feeinfo:
-        params['fee-info'] = feeinfo
-
-    c = client._post("/0/private/TradeVolume")
+    c = client._post(TRADE_VOLUME.path, TRADE_VOLUME.encode(pair=pair, feeinfo=feeinfo))
     return c['result']
 
 
-ORDER_TYPES_0 = ['market']
-ORDER_TYPES_1 = ['limit', 'stop-loss', 'take-profit', 'trailing-stop']
-ORDER_TYPES_2 = ['stop-loss-profit', 'stop-loss-profit-limit', 'stop-loss-limit', 'take-profit-limit',
-                 'trailing-stop-limit', 'stop-loss-and-limit']
-ORDER_FLAGS = ['viqc', 'fcib', 'fciq', 'nompp', 'post']
-
-
 def kprivate_addorder(client, pair=None, typeo=None, ordertype=None, price=None, price2=None, volume=None,
                       leverage=None, oflags=None,
-                      starttm=None, expiretm=None, userref=None, validate=None):
-    params = {}
-    if pair:
-        params['pair'] = pair
-    else:
-        raise RequiredParameterError('pair')
-    if typeo and typeo in ['buy', 'sell']:
-        params['type'] = typeo
-    else:
-        raise RequiredParameterError('typeo')
-    if ordertype and ordertype in (ORDER_TYPES_0 + ORDER_TYPES_1 + ORDER_TYPES_2):
-        params['ordertype'] = ordertype
-    else:
-        raise RequiredParameterError('ordertype')
-
-    if ordertype in ORDER_TYPES_0:
-        if price:
-            raise pykraken.exceptions.BadParamterError('if price is set, ordertype cant be at market')
-    elif ordertype in ORDER_TYPES_1:
-        if price:
-            params['price'] = price
-        else:
-            raise pykraken.exceptions.RequiredParameterError(
-                'price required for this order type: {}'.format(ordertype))
-    elif ordertype in ORDER_TYPES_2:
-        if price and price2:
-            params['price'] = price
-            params['price2'] = price2
-        else:
-            raise pykraken.exceptions.RequiredParameterError(
-                'price and price2 required for this order type: {}'.format(ordertype))
-    else:
-        raise pykraken.exceptions.BadParamterError(
-            'ordertype: {} not allowed, it should be in {} or {} or {}'.format(ordertype, ORDER_TYPES_0, ORDER_TYPES_1,
-                                                                               ORDER_TYPES_2))
-    if volume:
-        params['volume'] = volume
-    else:
-        raise pykraken.exceptions.RequiredParameterError('volume is required')
-
-    if leverage:
-        params['leverage'] = leverage
-
-    if oflags:
-        params['oflags'] = commasep(oflags)
-    if starttm:
-        params['starttm'] = parseOTime(starttm)
-    if expiretm:
-        params['expiretm'] = parseOTime(expiretm)
-    if userref:
-        params['userref'] = userref
-    if validate:
-        params['validate'] = validate
-
-    c = client._post("/0/private/AddOrder", params)
+                      starttm=None, expiretm=None, userref=None, validate=None, tick=None):
+    """
+    :param starttm: with client.clock, a relative '+<n>' is sent as the absolute server time
+        n seconds after this call, see ClockSync.order_time; likewise expiretm
+    :param tick: time, on the timer of client.lifecycle, of the market data the order reacts
+        to, for the tick to acknowledgement latency
+    """
+    lifecycle = client.lifecycle
+    timing = lifecycle.begin(ordertype, userref, tick) if lifecycle is not None else None
+    if client.clock is not None:
+        starttm, expiretm = client.clock.order_time(starttm), client.clock.order_time(expiretm)
+    params = ADD_ORDER.encode(pair=pair, typeo=typeo, ordertype=ordertype, price=price,
+                              price2=price2, volume=volume, leverage=leverage, oflags=oflags,
+                              starttm=starttm, expiretm=expiretm, userref=userref,
+                              validate=validate)
+    if timing is not None:
+        return lifecycle.post(client, ADD_ORDER.path, params, timing)
+    c = client._post(ADD_ORDER.path, params)
     return c['result']
 
 
 def kprivate_cancelorder(client, txid=None):
-    params = {}
-    if txid:
-        params['txid'] = txid
-    else:
-        raise pykraken.exceptions.RequiredParameterError('transaction id required')
-
-    c = client._post("/0/private/CancelOrder", params)
+    c = client._post(CANCEL_ORDER.path, CANCEL_ORDER.encode(txid=txid))
     return c['result']
 
 
+def _is_final_order(order):
+    return order.get('status') in FINAL_ORDER_STATUSES
+
+
+def _query_bulk(query, ids, workers, cache, cacheable=None):
+    """
+    Runs query on chunks of QUERY_MAX_IDS ids, concurrently, and merges the results
+    :param query: function(chunk) returning a dict of id -> entry
+    :param cache: dict-like of id -> entry served without request and updated with the
+        entries fetched, None for no cache
+    :param cacheable: function(entry) telling whether an entry may be cached
+    """
+    if isinstance(ids, str):
+        ids = ids.split(',')
+    result = {}
+    missing, seen = [], set()
+    for key in ids:
+        if key in seen:
+            continue
+        seen.add(key)
+        if cache is not None and key in cache:
+            result[key] = cache[key]
+        else:
+            missing.append(key)
+    chunks = [missing[i:i + QUERY_MAX_IDS] for i in range(0, len(missing), QUERY_MAX_IDS)]
+
+    def merge(page):
+        result.update(page)
+        if cache is not None:
+            for key, entry in page.items():
+                if cacheable is None or cacheable(entry):
+                    cache[key] = entry
+
+    if workers <= 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            merge(query(chunk))
+        return result
+    # the client's rate limiter (or scheduler) paces the chunks
+    with concurrent.futures.ThreadPoolExecutor(min(workers, len(chunks))) as pool:
+        futures = [pool.submit(query, chunk) for chunk in chunks]
+        error = None
+        for future in futures:
+            try:
+                # the chunks fetched are cached even if another one failed
+                merge(future.result())
+            except Exception as e:
+                error = error or e
+    if error is not None:
+        raise error
+    return result
+
+
+def kprivate_queryorders_bulk(client, txid, trades=False, userref=None, workers=4, cache=None):
+    """
+    Queries any number of orders, QUERY_MAX_IDS per request
+    :param txid: list of transaction ids
+    :param workers: requests sent concurrently
+    :param cache: dict-like of txid -> order info; only closed, canceled and expired orders
+        are added to it, since open ones still change
+    :return: dict of txid -> order info, as kprivate_queryorders
+    """
+    return _query_bulk(lambda chunk: kprivate_queryorders(client, trades=trades, userref=userref,
+                                                          txid=chunk),
+                       txid, workers, cache, _is_final_order)
+
+
+def kprivate_querytrades_bulk(client, txid, trades=False, workers=4, cache=None):
+    """
+    Queries any number of trades, QUERY_MAX_IDS per request
+    :param txid: list of transaction ids
+    :param workers: requests sent concurrently
+    :param cache: dict-like of txid -> trade info, served without request and updated
+    :return: dict of txid -> trade info, as kprivate_querytrades
+    """
+    return _query_bulk(lambda chunk: kprivate_querytrades(client, txid=chunk, trades=trades),
+                       txid, workers, cache)
+
+
+def kprivate_queryledgers_bulk(client, id, workers=4, cache=None):
+    """
+    Queries any number of ledger entries, QUERY_MAX_IDS per request
+    :param id: list of ledger ids
+    :param workers: requests sent concurrently
+    :param cache: dict-like of ledger id -> ledger entry, served without request and updated
+    :return: dict of ledger id -> ledger entry, as kprivate_queryledgers
+    """
+    return _query_bulk(lambda chunk: kprivate_queryledgers(client, id=chunk), id, workers, cache)
+
+
 def kprivate_depositmethods():
     pass
-
@@ -1,6 +1,4 @@
-import pykraken
-from .exceptions import BadParamterError
-from .convert import commasep
+from .endpoints import TIME, ASSETS, ASSET_PAIRS, TICKER, OHLC, DEPTH, TRADES, SPREAD
 
 
 def kpublic_time(client):
@@ -9,7 +7,7 @@ def kpublic_time(client):
     :param client: the client
     :return: a tuple (unixtime =  as unix timestamp, rfc1123 = as RFC 1123 time format)
     """
-    c = client._post("/0/public/Time")
+    c = client._post(TIME.path)
     return c['result']['unixtime'], c['result']['rfc1123']
 
 
@@ -26,15 +24,7 @@ def kpublic_assets(client, info='info', aclass=None, asset=None):
                 decimals = scaling decimal places for record keeping
                 display_decimals = scaling decimal places for output display
     """
-    params = {}
-    if info:
-        params['info'] = info
-    if asset:
-        params['asset'] = commasep(asset)
-    if aclass:
-        if aclass is not "currency":
-            raise BadParamterError('aclass should be currency')
-    c = client._post("/0/public/Assets", params)
+    c = client._post(ASSETS.path, ASSETS.encode(info=info, aclass=aclass, asset=asset))
     return c['result']
 
 
@@ -62,15 +52,7 @@ def kpublic_assetpairs(client, info='info', pair=None):
         margin_call = margin call level
         margin_stop = stop-out/liquidation margin level
     """
-    params = {}
-    if info not in ['info', 'leverage', 'fees', 'margin']:
-        raise pykraken.exceptions.BadParamterError()
-    else:
-        params['info'] = info
-    if pair:
-        params['pair'] = commasep(pair)
-
-    c = client._post("/0/public/AssetPairs", params)
+    c = client._post(ASSET_PAIRS.path, ASSET_PAIRS.encode(info=info, pair=pair))
     return c['result']
 
 
@@ -90,12 +72,7 @@ def kpublic_ticker(client, pair=None):
         h = high array(<today>, <last 24 hours>),
         o = today's opening price
     """
-    params = {}
-    if pair:
-        params['pair'] = commasep(pair)
-    else:
-        raise pykraken.exceptions.BadParamterError()
-    c = client._post("/0/public/Ticker", params)
+    c = client._post(TICKER.path, TICKER.encode(pair=pair))
     return c['result']
 
 
@@ -110,16 +87,7 @@ def kpublic_ohlc(client, pair=None, interval=1, since=None):
             array of array entries(<time>, <open>, <high>, <low>, <close>, <vwap>, <volume>, <count>)
             last = id to be used as since when polling for new, committed OHLC data
     """
-    params = {}
-    if pair:
-        params['pair'] = commasep(pair)
-    else:
-        raise pykraken.exceptions.BadParamterError()
-    if interval:
-        params['interval'] = interval
-    if since:
-        params['since'] = since
-    c = client._post("/0/public/OHLC", params)
+    c = client._post(OHLC.path, OHLC.encode(pair=pair, interval=interval, since=since))
     return c['result']
 
 
@@ -133,15 +101,7 @@ def kpublic_depth(client, pair=None, count=None):
                 asks = ask side array of array entries(<price>, <volume>, <timestamp>)
                 bids = bid side array of array entries(<price>, <volume>, <timestamp>)
     """
-    params = {}
-    if pair:
-        params['pair'] = commasep(pair)
-    else:
-        raise pykraken.exceptions.BadParamterError()
-    if count:
-        params['count'] = count
-
-    c = client._post("/0/public/Depth", params)
+    c = client._post(DEPTH.path, DEPTH.encode(pair=pair, count=count))
     return c['result']
 
 
@@ -155,15 +115,7 @@ def kpublic_trades(client, pair=None, since=None):
         array of array entries(<price>, <volume>, <time>, <buy/sell>, <market/limit>, <miscellaneous>)
         last = id to be used as since when polling for new trade data
     """
-    params = {}
-    if pair:
-        params['pair'] = commasep(pair)
-    else:
-        raise pykraken.exceptions.BadParamterError()
-    if since:
-        params['count'] = since
-
-    c = client._post("/0/public/Trades", params)
+    c = client._post(TRADES.path, TRADES.encode(pair=pair, since=since))
     return c['result']
 
 
@@ -177,13 +129,32 @@ def kpublic_spread(client, pair=None, since=None):
         array of array entries(<time>, <bid>, <ask>)
         last = id to be used as since when polling for new spread data
     """
-    params = {}
-    if pair:
-        params['pair'] = commasep(pair)
-    else:
-        raise pykraken.exceptions.BadParamterError()
-    if since:
-        params['count'] = since
-
-    c = client._post("/0/public/Spread", params)
+    c = client._post(SPREAD.path, SPREAD.encode(pair=pair, since=since))
     return c['result']
+
+
+def kpublic_trades_stream(client, pair=None, since=None, row_parser=None):
+    """
+    Same as kpublic_trades, but the trades are decoded one at a time as the response is read,
+    in bounded memory whatever the size of the response
+    :param client: the client
+    :param pair: asset pair to get trade data for
+    :param since: return trade data since given id (optional.  exclusive)
+    :param row_parser: callable applied to each trade (optional), e.g. to build typed records
+    :return: a StreamingResult yielding Row(<pair_name>, None, <trade>) tuples; once consumed, its
+        last attribute is the id to be used as since when polling for new trade data
+    """
+    return client._post_stream(TRADES.path, TRADES.encode(pair=pair, since=since), row_parser)
+
+
+def kpublic_depth_stream(client, pair=None, count=None, row_parser=None):
+    """
+    Same as kpublic_depth, but the price levels are decoded one at a time as the response is read
+    :param client: the client
+    :param pair: asset pair to get market depth for
+    :param count: maximum number of asks/bids (optional)
+    :param row_parser: callable applied to each price level (optional)
+    :return: a StreamingResult yielding Row(<pair_name>, <asks/bids>,
+        (<price>, <volume>, <timestamp>))
+    """
+    return client._post_stream(DEPTH.path, DEPTH.encode(pair=pair, count=count), row_parser)
@@ -0,0 +1,254 @@
+"""
+Latency of each stage of the life of an order, from kprivate_addorder to its appearance
+in the open or closed orders.
+
+A LifecycleTracker given to the client (Client(lifecycle=...)) times, with a monotonic
+clock, the stages of every kprivate_addorder and prepared addorder:
+
+- validate: validating and encoding the parameters
+- limiter: waiting for the circuit breaker, the rate limiter, scheduler or
+  queries_per_second throttle, and the backoff of retries
+- sign: taking the nonce and signing
+- network: sending the request and waiting for the response status
+- response: reading and decoding the acknowledgement
+- ack: the whole call, from kprivate_addorder to the acknowledgement
+- tick_to_ack: from the market data the order reacts to (the tick argument) to the
+  acknowledgement
+- visible: from the acknowledgement to the first kprivate_openorders or
+  kprivate_closedorders listing the order, correlated by txid (or by userref for an
+  order whose request failed, timed from the failure); its resolution is the polling
+  interval of these calls
+
+and keeps the last samples of each stage per order type, from which p50, p99 and p999 are
+computed on demand. Recording costs a few clock reads and deque appends per order.
+"""
+
+import collections
+import threading
+import time
+
+VALIDATE = 'validate'
+LIMITER = 'limiter'
+SIGN = 'sign'
+NETWORK = 'network'
+RESPONSE = 'response'
+ACK = 'ack'
+TICK_TO_ACK = 'tick_to_ack'
+VISIBLE = 'visible'
+
+STAGES = (VALIDATE, LIMITER, SIGN, NETWORK, RESPONSE, ACK, TICK_TO_ACK, VISIBLE)
+
+# monotonic clock of the stages: Python 2 only has time.time
+_default_timer = getattr(time, 'perf_counter', time.time)
+
+QUANTILES = (('p50', 0.5), ('p99', 0.99), ('p999', 0.999))
+
+
+class RollingQuantiles(object):
+    """Quantiles of the last window samples."""
+
+    def __init__(self, window=10000):
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+
+    def add(self, value):
+        self.samples.append(value)
+        self.count += 1
+
+    def quantiles(self, quantiles=QUANTILES):
+        """
+        :param quantiles: (name, quantile) pairs
+        :return: dict of name -> sample at that rank (nearest rank), None when empty
+        """
+        ordered = sorted(self.samples)
+        if not ordered:
+            return dict((name, None) for name, _ in quantiles)
+        last = len(ordered) - 1
+        return dict((name, ordered[min(last, int(q * len(ordered)))]) for name, q in quantiles)
+
+
+class OrderTiming(object):
+    """Stage durations of one order, in seconds."""
+
+    __slots__ = ('ordertype', 'userref', 'tick', 'started', 'last', 'durations', 'txid',
+                 '_timer')
+
+    def __init__(self, ordertype, userref, tick, timer):
+        self.ordertype = ordertype
+        self.userref = userref
+        self.tick = tick
+        self._timer = timer
+        self.started = self.last = timer()
+        self.durations = {}
+        self.txid = None
+
+    def mark(self, stage):
+        """Ends stage, which lasted since the previous mark; added up over retries."""
+        now = self._timer()
+        self.durations[stage] = self.durations.get(stage, 0.0) + now - self.last
+        self.last = now
+
+
+class LifecycleTracker(object):
+    """Times the stages of orders and keeps rolling percentiles per order type."""
+
+    def __init__(self, window=10000, max_pending=10000, pending_seconds=3600.0,
+                 timer=None):
+        """
+        :param window: samples kept per order type and stage
+        :param max_pending: acknowledged orders waiting to be seen in the open or closed
+            orders, the oldest are dropped beyond
+        :param pending_seconds: seconds after which an order not seen yet is dropped
+        :param timer: monotonic clock, time.perf_counter by default (time.time on Python 2);
+            the tick arguments are times on this clock
+        """
+        self.window = window
+        self.max_pending = max_pending
+        self.pending_seconds = pending_seconds
+        self.timer = timer or _default_timer
+        self.errors = collections.Counter()
+        self._series = {}
+        self._pending = collections.OrderedDict()  # txid -> OrderTiming
+        # userref -> [(time.time() of the request, OrderTiming)]
+        self._doubtful = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, ordertype, userref=None, tick=None):
+        """
+        Starts timing an order, before its parameters are validated
+        :rtype: OrderTiming
+        """
+        return OrderTiming(ordertype, userref, tick, self.timer)
+
+    def post(self, client, url, params, timing, prepared=None):
+        """
+        Sends an addorder whose parameters were just validated, timing its stages
+        :return: the result of the request
+        """
+        timing.mark(VALIDATE)
+        try:
+            result = client._post(url, params, prepared=prepared, timing=timing)['result']
+        except Exception:
+            self.failed(timing)
+            raise
+        self.acknowledged(timing, result)
+        return result
+
+    def acknowledged(self, timing, result):
+        """Records the stages of an acknowledged order, which is then waited for."""
+        samples = list(timing.durations.items())
+        samples.append((ACK, timing.last - timing.started))
+        if timing.tick is not None:
+            samples.append((TICK_TO_ACK, timing.last - timing.tick))
+        series = self._series
+        for stage, seconds in samples:
+            key = (timing.ordertype, stage)
+            (series.get(key) or self._new_series(key)).add(seconds)
+        txids = result.get('txid') if isinstance(result, dict) else None
+        if txids:
+            timing.txid = tuple(txids)
+            with self._lock:
+                for txid in txids:
+                    self._pending[txid] = timing
+                self._expire(timing.last)
+
+    def failed(self, timing):
+        """
+        Counts an order whose request failed; with a userref, it is still waited for in
+        case it was placed
+        """
+        self.errors[timing.ordertype] += 1
+        if timing.userref is not None:
+            timing.last = self.timer()  # the visible stage starts now
+            # wall time, to match only orders opened since; allows for some clock offset
+            sent = time.time() - 1.0 - (timing.last - timing.started)
+            with self._lock:
+                self._doubtful.setdefault(timing.userref, []).append((sent, timing))
+                self._expire(timing.last)
+
+    def observe(self, orders):
+        """
+        Records the orders seen for the first time
+        :param orders: dict of txid -> order info, as listed by kprivate_openorders or
+            kprivate_closedorders
+        :return: number of orders seen for the first time
+        """
+        if not (self._pending or self._doubtful) or not orders:
+            return 0
+        now = self.timer()
+        seen = []
+        with self._lock:
+            for txid, info in orders.items():
+                timing = self._pending.pop(txid, None)
+                if timing is None and self._doubtful and isinstance(info, dict):
+                    timing = self._match_doubtful(info)
+                if timing is not None:
+                    seen.append(timing)
+                    # an order with several txids is seen once
+                    for other in timing.txid or ():
+                        self._pending.pop(other, None)
+            self._expire(now)
+        for timing in seen:
+            self._add(timing.ordertype, VISIBLE, now - timing.last)
+        return len(seen)
+
+    def _match_doubtful(self, info):
+        waiting = self._doubtful.get(info.get('userref'))
+        if not waiting:
+            return None
+        opened = float(info.get('opentm') or 0)
+        for i, (sent, timing) in enumerate(waiting):
+            if opened >= sent:
+                del waiting[i]
+                if not waiting:
+                    del self._doubtful[info.get('userref')]
+                return timing
+        return None
+
+    def _expire(self, now):
+        oldest = now - self.pending_seconds
+        for waiting in (self._pending, self._doubtful):
+            while waiting:
+                first = next(iter(waiting.values()))
+                if isinstance(first, list):
+                    first = first[0][1]
+                if len(waiting) <= self.max_pending and first.last >= oldest:
+                    break
+                waiting.popitem(last=False)
+
+    def _add(self, ordertype, stage, seconds):
+        key = (ordertype, stage)
+        (self._series.get(key) or self._new_series(key)).add(seconds)
+
+    def _new_series(self, key):
+        return self._series.setdefault(key, RollingQuantiles(self.window))
+
+    def pending(self):
+        """
+        :return: number of orders waiting to be seen in the open or closed orders
+        """
+        with self._lock:
+            return len(self._pending) + sum(len(w) for w in self._doubtful.values())
+
+    def stats(self, ordertype=None):
+        """
+        :param ordertype: only this order type
+        :return: dict of order type -> stage -> dict of the count of samples recorded and
+            their p50, p99 and p999 over the window, in seconds
+        """
+        result = {}
+        for (otype, stage), series in list(self._series.items()):
+            if ordertype is not None and otype != ordertype:
+                continue
+            stats = series.quantiles()
+            stats['count'] = series.count
+            result.setdefault(otype, {})[stage] = stats
+        return result
+
+    def reset(self):
+        """Forgets the samples, the errors and the orders waited for."""
+        with self._lock:
+            self._series = {}
+            self.errors.clear()
+            self._pending.clear()
+            self._doubtful.clear()
@@ -0,0 +1,213 @@
+"""
+Fixed-point prices and volumes.
+
+Fixed holds an integer scaled by 10 ** decimals, decimals being the pair_decimals (prices)
+or lot_decimals (volumes) of a pair, as given by kpublic_assetpairs. Parsing the API's
+strings and formatting order parameters never goes through float or Decimal, and the
+arithmetic of amounts of the same scale is integer arithmetic.
+"""
+
+from decimal import Decimal
+
+from .convert import parse_scaled, format_scaled
+
+ROUND_DOWN = 'down'
+ROUND_UP = 'up'
+ROUND_HALF_EVEN = 'half_even'
+
+
+class Fixed(object):
+    """A decimal amount with a fixed number of decimals, stored as a scaled integer."""
+
+    __slots__ = ('units', 'decimals')
+
+    def __init__(self, units, decimals):
+        """
+        :param units: the amount multiplied by 10 ** decimals
+        :type units: int
+        :param decimals: number of decimals
+        :type decimals: int
+        """
+        self.units = units
+        self.decimals = decimals
+
+    @classmethod
+    def parse(cls, value, decimals):
+        """
+        Parses a decimal string (or a number), extra decimals being truncated
+        :rtype: Fixed
+        """
+        return cls(parse_scaled(value, decimals), decimals)
+
+    def __str__(self):
+        return format_scaled(self.units, self.decimals)
+
+    def __repr__(self):
+        return 'Fixed({!r}, {})'.format(str(self), self.decimals)
+
+    def __float__(self):
+        return self.units / float(10 ** self.decimals)
+
+    def to_decimal(self):
+        return Decimal(self.units).scaleb(-self.decimals)
+
+    def quantize(self, decimals, rounding=ROUND_DOWN):
+        """
+        Returns the amount with another number of decimals
+        :param rounding: ROUND_DOWN (towards zero), ROUND_UP (away from zero) or
+            ROUND_HALF_EVEN, when decimals are dropped
+        """
+        if decimals >= self.decimals:
+            return Fixed(self.units * 10 ** (decimals - self.decimals), decimals)
+        factor = 10 ** (self.decimals - decimals)
+        quotient, remainder = divmod(abs(self.units), factor)
+        if remainder:
+            if rounding == ROUND_UP:
+                quotient += 1
+            elif rounding == ROUND_HALF_EVEN:
+                if remainder * 2 > factor or (remainder * 2 == factor and quotient % 2):
+                    quotient += 1
+            elif rounding != ROUND_DOWN:
+                raise ValueError('unknown rounding {}'.format(rounding))
+        return Fixed(-quotient if self.units < 0 else quotient, decimals)
+
+    def _align(self, other):
+        if not isinstance(other, Fixed):
+            if isinstance(other, int):
+                other = Fixed(other, 0)
+            else:
+                return None, None, None
+        if other.decimals == self.decimals:
+            return self.units, other.units, self.decimals
+        decimals = max(self.decimals, other.decimals)
+        return (self.units * 10 ** (decimals - self.decimals),
+                other.units * 10 ** (decimals - other.decimals), decimals)
+
+    def __add__(self, other):
+        if other.__class__ is Fixed and other.decimals == self.decimals:
+            return Fixed(self.units + other.units, self.decimals)
+        a, b, decimals = self._align(other)
+        if decimals is None:
+            return NotImplemented
+        return Fixed(a + b, decimals)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        a, b, decimals = self._align(other)
+        if decimals is None:
+            return NotImplemented
+        return Fixed(a - b, decimals)
+
+    def __rsub__(self, other):
+        return -self + other
+
+    def __neg__(self):
+        return Fixed(-self.units, self.decimals)
+
+    def __abs__(self):
+        return Fixed(abs(self.units), self.decimals)
+
+    def __mul__(self, other):
+        """Exact product: its decimals are the sum of both, e.g. price * volume = cost."""
+        if isinstance(other, Fixed):
+            return Fixed(self.units * other.units, self.decimals + other.decimals)
+        if isinstance(other, int):
+            return Fixed(self.units * other, self.decimals)
+        return NotImplemented
+
+    __rmul__ = __mul__
+
+    def _compare(self, other):
+        a, b, decimals = self._align(other)
+        if decimals is None:
+            raise TypeError('cannot compare Fixed and {}'.format(type(other).__name__))
+        return (a > b) - (a < b)
+
+    def __eq__(self, other):
+        a, b, decimals = self._align(other)
+        return decimals is not None and a == b
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __lt__(self, other):
+        return self._compare(other) < 0
+
+    def __le__(self, other):
+        return self._compare(other) <= 0
+
+    def __gt__(self, other):
+        return self._compare(other) > 0
+
+    def __ge__(self, other):
+        return self._compare(other) >= 0
+
+    def __hash__(self):
+        # equal amounts of different scales hash alike, and integral ones like the int
+        # they compare equal to
+        units, decimals = self.units, self.decimals
+        while decimals and units % 10 == 0:
+            units //= 10
+            decimals -= 1
+        if not decimals:
+            return hash(units)
+        return hash((units, decimals))
+
+    def __bool__(self):
+        return bool(self.units)
+
+    __nonzero__ = __bool__
+
+
+class PairScales(object):
+    """Price and volume decimals of the pairs, from kpublic_assetpairs."""
+
+    def __init__(self, assetpairs):
+        """
+        :param assetpairs: result of kpublic_assetpairs
+        """
+        self._scales = {}
+        for name, info in assetpairs.items():
+            scale = (int(info['pair_decimals']), int(info['lot_decimals']))
+            self._scales[name] = scale
+            if 'altname' in info:
+                self._scales.setdefault(info['altname'], scale)
+
+    def decimals(self, pair):
+        """
+        :return: (pair_decimals, lot_decimals) of pair, by name or altname
+        """
+        try:
+            return self._scales[pair]
+        except KeyError:
+            raise KeyError('unknown pair {}'.format(pair))
+
+    def price(self, pair, value, rounding=ROUND_DOWN):
+        """Returns value as a Fixed price of pair, rounded to the pair's decimals."""
+        return self._fixed(value, self.decimals(pair)[0], rounding)
+
+    def volume(self, pair, value, rounding=ROUND_DOWN):
+        """Returns value as a Fixed volume of pair, rounded to the lot decimals."""
+        return self._fixed(value, self.decimals(pair)[1], rounding)
+
+    def _fixed(self, value, decimals, rounding):
+        if isinstance(value, Fixed):
+            return value.quantize(decimals, rounding)
+        if rounding == ROUND_DOWN:
+            return Fixed.parse(value, decimals)
+        # parse with all the decimals given, then round them
+        text = '{:f}'.format(Decimal(repr(value) if isinstance(value, float) else str(value)))
+        return Fixed.parse(text, len(text.partition('.')[2])).quantize(decimals, rounding)
+
+    def trades_parser(self, pair):
+        """
+        Returns a row parser of kpublic_trades_stream turning the price and volume of each
+        trade into Fixed amounts
+        """
+        price_decimals, lot_decimals = self.decimals(pair)
+
+        def parse(row):
+            return ((Fixed(parse_scaled(row[0], price_decimals), price_decimals),
+                     Fixed(parse_scaled(row[1], lot_decimals), lot_decimals)) + tuple(row[2:]))
+        return parse
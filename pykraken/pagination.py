@@ -0,0 +1,132 @@
+"""
+Helpers walking the cursor (since) and offset (ofs) paginated endpoints page by page.
+"""
+
+# Kraken returns at most this many trades per /0/public/Trades call and this
+# many entries per /0/private/Ledgers or /0/private/TradesHistory call.
+TRADES_PAGE_SIZE = 1000
+HISTORY_PAGE_SIZE = 50
+
+
+def split_pair_result(result):
+    """
+    Splits a since-paginated public result into its rows and its cursor
+    :param result: result of kpublic_trades, kpublic_ohlc or kpublic_spread for a single pair
+    :return: a tuple (rows, last), rows being the array of entries of the pair and last the new
+        cursor
+    """
+    rows = []
+    for key, value in result.items():
+        if key != 'last':
+            rows = value
+    return rows, result.get('last')
+
+
+def iter_trades(client, pair, since=None):
+    """
+    Yields the recent trades of a pair page by page until caught up with the market
+    :param client: the client
+    :param pair: asset pair to get trade data for
+    :param since: return trade data since given id (optional.  exclusive)
+    :return: generator of (rows, last) tuples, last being the cursor to resume after rows
+    """
+    while True:
+        rows, last = split_pair_result(client.kpublic_trades(pair=[pair], since=since))
+        if rows:
+            yield rows, last
+        if len(rows) < TRADES_PAGE_SIZE or last == since:
+            return
+        since = last
+
+
+def iter_ohlc(client, pair, interval=1, since=None):
+    """
+    Yields the committed OHLC bars of a pair; Kraken serves a single page (at most 720 bars)
+    :param client: the client
+    :param pair: asset pair to get OHLC data for
+    :param interval: time frame interval in minutes
+    :param since: return committed OHLC data since given id (optional.  exclusive)
+    :return: generator of (rows, last) tuples
+    """
+    rows, last = split_pair_result(client.kpublic_ohlc(pair=[pair], interval=interval, since=since))
+    if rows:
+        yield rows, last
+
+
+def iter_spread(client, pair, since=None):
+    """
+    Yields the recent spread points of a pair; Kraken serves a single page
+    :param client: the client
+    :param pair: asset pair to get spread data for
+    :param since: return spread data since given id (optional.  inclusive)
+    :return: generator of (rows, last) tuples
+    """
+    rows, last = split_pair_result(client.kpublic_spread(pair=[pair], since=since))
+    if rows:
+        yield rows, last
+
+
+def _iter_offset_pages(fetch, key, ofs):
+    while True:
+        result = fetch(ofs)
+        entries = result[key]
+        if not entries:
+            return
+        ofs += len(entries)
+        yield entries, ofs, int(result['count'])
+        if ofs >= int(result['count']):
+            return
+
+
+def _iter_offset_pages_oldest_first(fetch, key, before):
+    """
+    Yields the pages from the oldest, walking the offsets down from the count given by the
+    first (newest) page; the range must be bounded by end so that the offsets stay valid
+    :param before: offset of the page yielded last, to resume from the page before it
+    """
+    newest = fetch(0)
+    count, size = int(newest['count']), len(newest[key])
+    if not size:
+        return
+    ofs = ((count - 1) // size) * size if before is None else before - size
+    while ofs >= 0:
+        result = newest if ofs == 0 else fetch(ofs)
+        yield result[key], ofs, count
+        ofs -= size
+
+
+def iter_ledgers(client, aclass='currency', asset='all', typet='all', start=None, end=None, ofs=0,
+                 oldest_first=False):
+    """
+    Yields the ledger entries page by page, newest first
+    :param client: the client
+    :param ofs: result offset to resume from (optional)
+    :param oldest_first: yield the pages from the oldest instead, ofs being then the offset
+        of the page yielded last (None to start from the oldest); needs end
+    :return: generator of (entries, ofs, count) tuples, entries being a dict keyed by ledger id,
+        ofs the offset of the next page (of this page with oldest_first) and count the total
+        number of matching entries
+    """
+    def fetch(offset):
+        return client.kprivate_ledgers(aclass=aclass, asset=asset, typet=typet, start=start,
+                                       end=end, ofs=offset)
+    if oldest_first:
+        return _iter_offset_pages_oldest_first(fetch, 'ledger', ofs)
+    return _iter_offset_pages(fetch, 'ledger', ofs)
+
+
+def iter_tradeshistory(client, typet=None, trades=False, start=None, end=None, ofs=0,
+                       oldest_first=False):
+    """
+    Yields the trades history page by page, newest first
+    :param client: the client
+    :param ofs: result offset to resume from (optional)
+    :param oldest_first: see iter_ledgers
+    :return: generator of (entries, ofs, count) tuples, entries being a dict keyed by txid
+    """
+    def fetch(offset):
+        return client.kprivate_tradeshistory(typet=typet, trades=trades, start=start, end=end,
+                                             ofs=offset)
+    if oldest_first:
+        return _iter_offset_pages_oldest_first(fetch, 'trades', ofs)
+    return _iter_offset_pages(fetch, 'trades', ofs)
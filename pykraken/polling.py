@@ -0,0 +1,216 @@
+"""
+Adaptive polling of kpublic_trades or kpublic_ticker over many pairs.
+
+Polling every pair at the same interval spends most of the rate budget on illiquid pairs
+and under-samples the busy ones. AdaptivePoller estimates the change rate of each pair,
+in events per second, from its recent polls:
+
+- trades: the number of new trades returned since the previous cursor
+- ticker: the number of trades made since the previous poll (from the trades-today count),
+  plus one when the best bid or ask moved
+
+and shares a fixed budget of requests per second between the pairs in proportion to the
+square root of their change rates (which minimises the average staleness of the data for
+a given number of requests), within [1 / max_interval, 1 / min_interval] polls per second.
+Quiet pairs back off to max_interval; the estimates decay with a half-life, so that a pair
+waking up is polled faster again within a few polls.
+"""
+
+import heapq
+import math
+import threading
+import time
+
+from .pagination import split_pair_result
+
+TRADES = 'trades'
+TICKER = 'ticker'
+
+
+class _Pair(object):
+
+    def __init__(self, name, rate):
+        self.name = name
+        self.rate = rate  # change rate estimate, events per second
+        self.polls_per_second = 0.0
+        self.polled_at = None
+        self.due = 0.0
+        self.polls = 0
+        self.events = 0
+        self.cursor = None  # trades: since cursor, ticker: (trades today, bid, ask)
+
+
+class AdaptivePoller(object):
+    """Polls pairs at rates following how often they change, within a request budget."""
+
+    def __init__(self, client, pairs, kind=TRADES, budget=1.0, min_interval=1.0,
+                 max_interval=60.0, half_life=120.0, initial_rate=0.1, callback=None,
+                 local_time=time.time, sleep=time.sleep):
+        """
+        :param client: the client
+        :param pairs: pairs polled
+        :param kind: TRADES (kpublic_trades) or TICKER (kpublic_ticker)
+        :param budget: requests per second shared by all the pairs
+        :param min_interval: shortest interval between two polls of a pair, in seconds
+        :param max_interval: longest interval between two polls of a pair, in seconds
+        :param half_life: seconds after which past observations weigh half in the estimates
+        :param initial_rate: change rate assumed for a pair not polled yet, events per second
+        :param callback: function(pair, result, events) called after each poll, result
+            being the new trades (rows) or the ticker of the pair
+        :param local_time: local clock, time.time by default
+        :param sleep: function(seconds) waiting for the next poll, time.sleep by default
+        """
+        if kind not in (TRADES, TICKER):
+            raise ValueError('kind should be {} or {}'.format(TRADES, TICKER))
+        if budget <= 0:
+            raise ValueError('budget should be positive')
+        if min_interval > max_interval:
+            raise ValueError('min_interval is longer than max_interval')
+        self.client = client
+        self.kind = kind
+        self.budget = float(budget)
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+        self.half_life = float(half_life)
+        self.callback = callback
+        self.local_time = local_time
+        self.sleep = sleep
+        self._pairs = dict((p, _Pair(p, initial_rate)) for p in pairs)
+        self._queue = [(0.0, name) for name in sorted(self._pairs)]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._allocate()
+
+    def _allocate(self):
+        """Shares the budget between the pairs, in proportion to sqrt(change rate)."""
+        pairs = list(self._pairs.values())
+        if not pairs:
+            return
+        # a budget too small for every pair's max_interval is shared evenly
+        low = min(1.0 / self.max_interval, self.budget / len(pairs))
+        high = 1.0 / self.min_interval
+        # water-filling: the pairs whose share exceeds a bound are clamped to it and set
+        # aside, one side at a time, and the others share what is left
+        free, budget = pairs, self.budget
+        while free:
+            weights = [math.sqrt(max(p.rate, 0.0)) for p in free]
+            total = sum(weights)
+            if total > 0:
+                shares = [budget * w / total for w in weights]
+            else:
+                shares = [budget / len(free)] * len(free)
+            clamped = [(p, high) for p, s in zip(free, shares) if s > high]
+            if not clamped:
+                clamped = [(p, low) for p, s in zip(free, shares) if s < low]
+            if not clamped:
+                for p, share in zip(free, shares):
+                    p.polls_per_second = share
+                return
+            for p, share in clamped:
+                p.polls_per_second = share
+                budget -= share
+            done = set(id(p) for p, _ in clamped)
+            free = [p for p in free if id(p) not in done]
+            budget = max(budget, 0.0)
+
+    def _observe(self, pair, now, events):
+        if pair.polled_at is not None:
+            elapsed = max(now - pair.polled_at, 1e-3)
+            weight = 1.0 - 0.5 ** (elapsed / self.half_life)
+            pair.rate += weight * (events / elapsed - pair.rate)
+        pair.polled_at = now
+        pair.polls += 1
+        pair.events += events
+
+    def _fetch(self, pair):
+        if self.kind == TRADES:
+            rows, last = split_pair_result(self.client.kpublic_trades(pair=[pair.name],
+                                                                      since=pair.cursor))
+            first = pair.cursor is None
+            pair.cursor = last
+            # the first poll returns the backlog, not changes
+            return rows, 0 if first else len(rows)
+        result = self.client.kpublic_ticker(pair=[pair.name])
+        ticker = next(iter(result.values()))
+        state = (int(ticker['t'][0]), ticker['b'][0], ticker['a'][0])
+        previous, pair.cursor = pair.cursor, state
+        if previous is None:
+            return ticker, 0
+        trades = state[0] - previous[0]
+        if trades < 0:  # the day rolled over
+            trades = state[0]
+        return ticker, trades + (1 if state[1:] != previous[1:] else 0)
+
+    def poll_next(self):
+        """
+        Waits for the pair due first, polls it and reschedules it
+        :return: (pair, events seen by the poll)
+        """
+        with self._lock:
+            due, name = self._queue[0]
+        wait = due - self.local_time()
+        if wait > 0:
+            self.sleep(wait)
+        with self._lock:
+            due, name = heapq.heappop(self._queue)
+        pair = self._pairs[name]
+        try:
+            result, events = self._fetch(pair)
+        except Exception:
+            # retried at the pair's current pace
+            with self._lock:
+                pair.due = self.local_time() + 1.0 / pair.polls_per_second
+                heapq.heappush(self._queue, (pair.due, name))
+            raise
+        now = self.local_time()
+        with self._lock:
+            self._observe(pair, now, events)
+            self._allocate()
+            pair.due = now + 1.0 / pair.polls_per_second
+            heapq.heappush(self._queue, (pair.due, name))
+        if self.callback is not None:
+            self.callback(name, result, events)
+        return name, events
+
+    def allocation(self):
+        """
+        :return: dict of pair -> dict of the change rate estimate (events per second), the
+            polls per second and interval allocated, the share of the budget, and the polls
+            made and events seen so far
+        """
+        with self._lock:
+            return dict((p.name, {'rate': p.rate,
+                                  'polls_per_second': p.polls_per_second,
+                                  'interval': 1.0 / p.polls_per_second,
+                                  'share': p.polls_per_second / self.budget,
+                                  'polls': p.polls,
+                                  'events': p.events})
+                        for p in self._pairs.values())
+
+    def start(self):
+        """Keeps polling in a daemon thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='pykraken-poller')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                wait = self._queue[0][0] - self.local_time()
+            if wait > 0 and self._stop.wait(min(wait, 1.0)):
+                return
+            if wait > 1.0:
+                continue
+            try:
+                self.poll_next()
+            except Exception:
+                # the pair is rescheduled, the others keep being polled
+                pass
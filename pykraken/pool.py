@@ -0,0 +1,172 @@
+"""
+Pool of clients spreading private requests across several API keys.
+
+Kraken rate limits each API key separately, so read-only private calls are routed to the
+key with the most budget left, each key keeping its own nonce sequence and rate limiter.
+The bulk queries route each of their chunks separately, so that they are fetched with all
+the keys at once.
+Order-mutating calls stay pinned: orders are placed with the trading key (or the key asked
+for) and cancelled with the key that placed them.
+"""
+
+import collections
+import threading
+
+from . import kprivate
+from .client import Client
+from .ratelimit import RateLimiter
+
+READ_ONLY_CALLS = (
+    'kprivate_balance',
+    'kprivate_tradebalance',
+    'kprivate_openorders',
+    'kprivate_closedorders',
+    'kprivate_queryorders',
+    'kprivate_tradeshistory',
+    'kprivate_querytrades',
+    'kprivate_openpositions',
+    'kprivate_ledgers',
+    'kprivate_queryledgers',
+    'kprivate_tradevolume',
+)
+
+
+class ClientPool(object):
+    """Routes private requests across several API keys."""
+
+    def __init__(self, credentials, queries_per_second=1, burst=None, trading_key=0,
+                 max_orders=10000, **client_kwargs):
+        """
+        :param credentials: (key, private_key) tuples, one per API key
+        :type credentials: list
+
+        :param queries_per_second: sustained request rate permitted per key
+        :param burst: requests permitted at once per key, queries_per_second by default
+
+        :param trading_key: index of the key placing orders by default
+        :type trading_key: int
+
+        :param max_orders: orders whose key is remembered, until cancelled; beyond, the oldest
+            are forgotten and cancelled with the trading key
+
+        :param client_kwargs: extra keyword arguments of each Client (timeouts,
+            requests_kwargs...)
+        """
+        if not credentials:
+            raise ValueError("Must provide at least one set of credentials.")
+        self.clients = [Client(key=key, private_key=private_key,
+                               rate_limiter=RateLimiter(queries_per_second, burst), **client_kwargs)
+                        for key, private_key in credentials]
+        self.trading_key = trading_key
+        self.max_orders = max_orders
+        self._calls = [0] * len(self.clients)
+        # requests picked for a key and not answered yet, not counted by its limiter yet
+        self._inflight = [0] * len(self.clients)
+        # txid -> index of the key that placed the order
+        self._order_keys = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pick(self):
+        return max(range(len(self.clients)),
+                   key=lambda i: self.clients[i].rate_limiter.available() - self._inflight[i])
+
+    def _call(self, index, name, args, kwargs):
+        with self._lock:
+            if index is None:
+                index = self._pick()
+            self._calls[index] += 1
+            self._inflight[index] += 1
+        try:
+            return getattr(kprivate, name)(self.clients[index], *args, **kwargs)
+        finally:
+            with self._lock:
+                self._inflight[index] -= 1
+
+    def _bulk(self, name, ids, workers, cache, cacheable=None, **kwargs):
+        if workers is None:
+            workers = 4 * len(self.clients)
+        return kprivate._query_bulk(lambda chunk: self._call(None, name, (), dict(kwargs, **{
+            'id' if name == 'kprivate_queryledgers' else 'txid': chunk})),
+            ids, workers, cache, cacheable)
+
+    def kprivate_queryorders_bulk(self, txid, trades=False, userref=None, workers=None,
+                                  cache=None):
+        """
+        Queries any number of orders, each chunk with the key having the most budget left;
+        see kprivate_queryorders_bulk
+        :param workers: chunks fetched concurrently, 4 per key by default
+        """
+        return self._bulk('kprivate_queryorders', txid, workers, cache, kprivate._is_final_order,
+                          trades=trades, userref=userref)
+
+    def kprivate_querytrades_bulk(self, txid, trades=False, workers=None, cache=None):
+        """
+        Queries any number of trades, each chunk with the key having the most budget left;
+        see kprivate_querytrades_bulk
+        """
+        return self._bulk('kprivate_querytrades', txid, workers, cache, trades=trades)
+
+    def kprivate_queryledgers_bulk(self, id, workers=None, cache=None):
+        """
+        Queries any number of ledger entries, each chunk with the key having the most budget
+        left; see kprivate_queryledgers_bulk
+        """
+        return self._bulk('kprivate_queryledgers', id, workers, cache)
+
+    def kprivate_addorder(self, *args, **kwargs):
+        """
+        Places an order with the trading key, or the one given as key=<index>; see
+        kprivate_addorder
+        """
+        index = kwargs.pop('key', self.trading_key)
+        result = self._call(index, 'kprivate_addorder', args, kwargs)
+        with self._lock:
+            for txid in result.get('txid', ()):
+                self._order_keys[txid] = index
+            # orders filled or cancelled elsewhere are never popped: keep the newest only
+            while len(self._order_keys) > self.max_orders:
+                self._order_keys.popitem(last=False)
+        return result
+
+    def kprivate_cancelorder(self, txid=None, key=None):
+        """
+        Cancels an order with the key that placed it, falling back to the trading key for
+        orders placed elsewhere; see kprivate_cancelorder
+        """
+        if key is None:
+            with self._lock:
+                key = self._order_keys.get(txid, self.trading_key)
+        result = self._call(key, 'kprivate_cancelorder', (), {'txid': txid})
+        with self._lock:
+            self._order_keys.pop(txid, None)
+        return result
+
+    def utilisation(self):
+        """
+        Reports the usage of each key
+        :return: list of dicts with key (truncated), calls routed, share of all calls, tokens
+            currently available, requests acquired and seconds waited on the key's limiter
+        """
+        with self._lock:
+            calls = list(self._calls)
+        total = float(sum(calls)) or 1.0
+        return [{'key': client.key[:8],
+                 'calls': calls[i],
+                 'share': calls[i] / total,
+                 'available': client.rate_limiter.available(),
+                 'acquired': client.rate_limiter.acquired,
+                 'waited': client.rate_limiter.waited}
+                for i, client in enumerate(self.clients)]
+
+
+def _routed(name):
+    def call(self, *args, **kwargs):
+        return self._call(kwargs.pop('key', None), name, args, kwargs)
+    call.__name__ = name
+    call.__doc__ = ("Runs {} with the key having the most budget left, "
+                    "or the one given as key=<index>.".format(name))
+    return call
+
+
+for _name in READ_ONLY_CALLS:
+    setattr(ClientPool, _name, _routed(_name))
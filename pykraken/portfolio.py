@@ -0,0 +1,248 @@
+"""
+Valuation of balances in one quote currency.
+
+A conversion graph is built once from kpublic_assetpairs: assets are nodes and each pair is
+an edge usable both ways, selling the base for the quote or buying it with the quote. Each
+asset gets a conversion path to the quote currency, either the shortest one or the cheapest
+one (the lowest sum of relative bid/ask spreads, i.e. the most liquid route). The tickers of
+all the pairs on those paths are then fetched in a single kpublic_ticker request, and price
+updates only revalue the assets whose path goes through the pairs that changed.
+"""
+
+import collections
+
+SELL = 'sell'  # base -> quote, at the bid
+BUY = 'buy'  # quote -> base, at the ask
+
+# one hop of a conversion path: the pair traded and its direction
+Hop = collections.namedtuple('Hop', ('pair', 'direction'))
+
+
+class ConversionGraph(object):
+    """Assets connected by the pairs trading them."""
+
+    def __init__(self, assetpairs):
+        """
+        :param assetpairs: result of kpublic_assetpairs
+        """
+        self.edges = collections.defaultdict(list)
+        for name, info in sorted(assetpairs.items()):
+            # dark pool books have the same prices as the regular pair
+            if name.endswith('.d'):
+                continue
+            base, quote = info['base'], info['quote']
+            self.edges[base].append((quote, Hop(name, SELL)))
+            self.edges[quote].append((base, Hop(name, BUY)))
+
+    def shortest(self, source, target):
+        """
+        Returns the path with the fewest hops from source to target, [] if they are the
+        same asset, None if there is none
+        """
+        if source == target:
+            return []
+        previous = {source: None}
+        queue = collections.deque([source])
+        while queue:
+            asset = queue.popleft()
+            for other, hop in self.edges.get(asset, ()):
+                if other in previous:
+                    continue
+                previous[other] = (asset, hop)
+                if other == target:
+                    path = []
+                    while previous[other] is not None:
+                        other, hop = previous[other]
+                        path.append(hop)
+                    return path[::-1]
+                queue.append(other)
+        return None
+
+    def paths(self, source, target, max_hops):
+        """Yields every path from source to target of at most max_hops hops."""
+        if source == target:
+            yield []
+            return
+        stack = [(source, [], set([source]))]
+        while stack:
+            asset, path, seen = stack.pop()
+            if len(path) == max_hops:
+                continue
+            for other, hop in self.edges.get(asset, ()):
+                if other == target:
+                    yield path + [hop]
+                elif other not in seen:
+                    stack.append((other, path + [hop], seen | set([other])))
+
+
+class Portfolio(object):
+    """Values balances in a quote currency, from one batched ticker request."""
+
+    def __init__(self, client, quote='ZUSD', route='shortest', max_hops=3, price='mid'):
+        """
+        :param client: the client
+        :param quote: asset the portfolio is valued in, e.g. ZUSD or ZEUR
+        :param route: 'shortest' for the paths with the fewest hops, 'cheapest' for the ones
+            with the lowest sum of relative spreads
+        :param max_hops: longest path considered by the cheapest route
+        :param price: 'mid' to value at mid prices, 'bid' to value at the prices the
+            assets could be sold at (bid, or ask when a hop buys)
+        """
+        if route not in ('shortest', 'cheapest'):
+            raise ValueError('route should be shortest or cheapest')
+        if price not in ('mid', 'bid'):
+            raise ValueError('price should be mid or bid')
+        self.client = client
+        self.quote = quote
+        self.route = route
+        self.max_hops = max_hops
+        self.price = price
+        self.graph = None
+        self.balances = {}
+        self.paths = {}
+        # pair -> (bid, ask)
+        self.prices = {}
+        self.values = {}
+        self.total = 0.0
+        # pair -> assets whose path goes through it
+        self._assets_by_pair = collections.defaultdict(set)
+
+    def load_pairs(self, assetpairs=None):
+        """Builds the conversion graph, from kpublic_assetpairs by default."""
+        if assetpairs is None:
+            assetpairs = self.client.kpublic_assetpairs()
+        self.graph = ConversionGraph(assetpairs)
+        self.paths.clear()
+        self._assets_by_pair.clear()
+
+    def _plan(self, assets):
+        """
+        Finds the paths of the assets not planned yet
+        :return: the pairs whose tickers were fetched to compare the paths
+        """
+        if self.graph is None:
+            self.load_pairs()
+        assets = [a for a in assets if a not in self.paths]
+        fetched = set()
+        if self.route == 'shortest':
+            planned = dict((a, self.graph.shortest(a, self.quote)) for a in assets)
+        else:
+            candidates = dict((a, list(self.graph.paths(a, self.quote, self.max_hops)))
+                              for a in assets)
+            # the spreads of every candidate pair, in the same single request
+            fetched = self._fetch(set(h.pair for paths in candidates.values()
+                                      for p in paths for h in p))
+            planned = dict((a, min(paths, key=self._path_cost) if paths else None)
+                           for a, paths in candidates.items())
+        for asset, path in planned.items():
+            self.paths[asset] = path
+            for hop in path or ():
+                self._assets_by_pair[hop.pair].add(asset)
+        return fetched
+
+    def _path_cost(self, path):
+        cost = 0.0
+        for hop in path:
+            if hop.pair not in self.prices:
+                return float('inf'), len(path)
+            bid, ask = self.prices[hop.pair]
+            cost += (ask - bid) * 2 / (ask + bid)
+        # prefer fewer hops between equally liquid paths
+        return cost, len(path)
+
+    def _fetch(self, pairs):
+        pairs = sorted(p for p in pairs if p not in self.prices)
+        if pairs:
+            self.update_prices(self.client.kpublic_ticker(pair=pairs))
+        return set(pairs)
+
+    def _value(self, asset):
+        path = self.paths.get(asset)
+        if path is None:
+            return None
+        value = float(self.balances[asset])
+        for pair, direction in path:
+            if pair not in self.prices:
+                return None
+            bid, ask = self.prices[pair]
+            if self.price == 'mid':
+                mid = (bid + ask) / 2
+                value = value * mid if direction == SELL else value / mid
+            else:
+                value = value * bid if direction == SELL else value / ask
+        return value
+
+    def _revalue(self, assets):
+        for asset in assets:
+            old = self.values.pop(asset, None)
+            if old is not None:
+                self.total -= old
+            if asset not in self.balances:
+                continue
+            value = self._value(asset)
+            if value is not None:
+                self.values[asset] = value
+                self.total += value
+
+    @property
+    def unpriced(self):
+        """Assets held that cannot be converted to the quote currency."""
+        return sorted(a for a in self.balances if a not in self.values)
+
+    def refresh(self, balances=None):
+        """
+        Values the balances, fetching the missing tickers in one request
+        :param balances: result of kprivate_balance, fetched by default
+        :return: the total value
+        """
+        if balances is None:
+            balances = self.client.kprivate_balance()
+        self.balances = dict(balances)
+        fetched = self._plan(self.balances)
+        pairs = set(h.pair for a in self.balances for h in self.paths[a] or ()) - fetched
+        # one batched request for every pair of every path
+        if pairs:
+            self.update_prices(self.client.kpublic_ticker(pair=sorted(pairs)))
+        self.values.clear()
+        self.total = 0.0
+        self._revalue(list(self.balances))
+        return self.total
+
+    def update_prices(self, tickers):
+        """
+        Revalues the assets whose path uses a pair whose bid or ask changed
+        :param tickers: result of kpublic_ticker
+        :return: the set of assets revalued
+        """
+        changed = set()
+        for pair, ticker in tickers.items():
+            prices = float(ticker['b'][0]), float(ticker['a'][0])
+            if self.prices.get(pair) != prices:
+                self.prices[pair] = prices
+                changed.add(pair)
+        assets = set()
+        for pair in changed:
+            assets.update(self._assets_by_pair.get(pair, ()))
+        self._revalue(assets)
+        return assets
+
+    def update_balance(self, asset, amount):
+        """
+        Sets the balance of one asset and revalues it, fetching its path's tickers if missing
+        :return: the total value
+        """
+        self.balances[asset] = amount
+        self._plan([asset])
+        self._fetch(h.pair for h in self.paths[asset] or ())
+        self._revalue([asset])
+        return self.total
+
+    def report(self):
+        """
+        :return: dict of asset -> (balance, value, share of the total), value being None for
+            unpriced assets
+        """
+        total = self.total or 1.0
+        return dict((a, (self.balances[a], self.values.get(a),
+                         self.values[a] / total if a in self.values else None))
+                    for a in self.balances)
@@ -0,0 +1,143 @@
+"""
+Prepared private requests, for latency sensitive order flow.
+
+Client._post encodes every request from scratch: it validates and urlencodes all the
+parameters, decodes the secret and keys a new HMAC, and merges the headers and the
+transport options. A PreparedRequest does all of this once for the parts that do not
+change between sends (the path, the constant parameters such as the pair and the order
+type, the keyed HMAC and the headers) and per send only encodes the variable parameters,
+takes a nonce and signs. It goes through the same rate limiting, circuit breaking and
+retries as the other requests.
+
+The client's key, secret, headers and timeouts are captured when the request is prepared.
+"""
+
+import base64
+import hashlib
+import hmac
+
+from .endpoints import ADD_ORDER, CANCEL_ORDER, ORDER_TYPES_0, ORDER_TYPES_1
+from .exceptions import RequiredParameterError
+
+try:  # Python 3
+    from urllib.parse import urlencode
+except ImportError:  # Python 2
+    from urllib import urlencode
+
+
+class PreparedRequest(object):
+    """A private request whose constant parts are encoded once."""
+
+    def __init__(self, client, endpoint, variables=(), **constants):
+        """
+        :param client: the client sending the request
+        :param endpoint: private endpoint, e.g. pykraken.endpoints.ADD_ORDER
+        :param variables: keyword arguments given at each send, all required
+        :param constants: keyword arguments of every send, validated now
+        :raises ValueError: on an argument the endpoint does not take
+        :raises RequiredParameterError: if a required argument is neither constant nor
+            variable
+        """
+        params = dict((p.arg, p) for p in endpoint.params)
+        unknown = (set(constants) | set(variables)) - set(params)
+        if unknown:
+            raise ValueError('{} takes no {}'.format(endpoint.name, ', '.join(sorted(unknown))))
+        for param in endpoint.params:
+            if param.required and param.arg not in constants and param.arg not in variables:
+                raise RequiredParameterError(param.arg)
+        encoded = {}
+        for param in endpoint.params:
+            if param.arg in constants:
+                param.compile()(constants, encoded)
+        if endpoint.check:
+            # the checks only look at which parameters are set
+            endpoint.check(dict(encoded, **dict((params[v].name, '') for v in variables)))
+
+        self.client = client
+        self.endpoint = endpoint
+        self.path = endpoint.path
+        self.variables = tuple(variables)
+        self._variables = frozenset(variables)
+        self._ordertype = constants.get('ordertype')
+        self._userref = constants.get('userref')
+        self._steps = [(v, params[v].compile()) for v in variables]
+        self._constant = '&' + urlencode(encoded) if encoded else ''
+        self._path = endpoint.path.encode()
+        self._mac = hmac.new(base64.b64decode(client.private_key), digestmod=hashlib.sha512)
+        self.requests_kwargs = dict(client.requests_kwargs, stream=True)
+        headers = self.requests_kwargs.pop('headers')
+        self._headers = dict(headers, **{'Content-Type': 'application/x-www-form-urlencoded',
+                                         'Accept-Encoding': client.accept_encoding})
+
+    def encode(self, **values):
+        """
+        Validates and urlencodes the variable parameters
+        :rtype: string
+        :raises ValueError: on an argument that is not a variable of the request
+        """
+        if not self._variables.issuperset(values):
+            unknown = set(values) - self._variables
+            raise ValueError('{} takes no {} at send time'.format(self.endpoint.name,
+                                                                  ', '.join(sorted(unknown))))
+        encoded = {}
+        for arg, step in self._steps:
+            if values.get(arg) is None:
+                raise RequiredParameterError(arg)
+            step(values, encoded)
+        return urlencode(encoded)
+
+    def sign(self, nonce, variables):
+        """
+        Builds the body and the headers of one send
+        :param nonce: the nonce, as a string
+        :param variables: urlencoded variable parameters, see encode
+        :return: (postdata, headers)
+        """
+        postdata = 'nonce=' + nonce + self._constant
+        if variables:
+            postdata += '&' + variables
+        mac = self._mac.copy()
+        mac.update(self._path + hashlib.sha256((nonce + postdata).encode()).digest())
+        headers = self._headers.copy()
+        headers['API-Sign'] = base64.b64encode(mac.digest()).decode()
+        return postdata, headers
+
+    def send(self, tick=None, **values):
+        """
+        Sends the request with these variable parameters
+        :param tick: for an addorder timed by client.lifecycle, see kprivate_addorder
+        :return: the result, as the matching kprivate_* function returns it
+        """
+        lifecycle = self.client.lifecycle
+        if lifecycle is None or self.endpoint is not ADD_ORDER:
+            return self.client._post(self.path, self.encode(**values), prepared=self)['result']
+        timing = lifecycle.begin(self._ordertype, values.get('userref', self._userref), tick)
+        return lifecycle.post(self.client, self.path, self.encode(**values), timing, prepared=self)
+
+
+def prepare_addorder(client, pair=None, typeo=None, ordertype=None, variables=None, **constants):
+    """
+    Prepares kprivate_addorder for a pair, side and order type
+    :param variables: arguments given at each send, by default the price(s) the order type
+        takes and the volume; add 'userref' to tag each order
+    :param constants: other arguments of kprivate_addorder common to all the orders, e.g.
+        oflags or leverage
+    :rtype: PreparedRequest
+    """
+    if variables is None:
+        if ordertype in ORDER_TYPES_0:
+            variables = ('volume',)
+        elif ordertype in ORDER_TYPES_1:
+            variables = ('price', 'volume')
+        else:
+            variables = ('price', 'price2', 'volume')
+    return PreparedRequest(client, ADD_ORDER, variables, pair=pair, typeo=typeo,
+                           ordertype=ordertype, **constants)
+
+
+def prepare_cancelorder(client):
+    """
+    Prepares kprivate_cancelorder, sent with the txid of the order to cancel
+    :rtype: PreparedRequest
+    """
+    return PreparedRequest(client, CANCEL_ORDER, ('txid',))
@@ -0,0 +1,76 @@
+"""
+Token bucket rate limiter, optionally shared between processes.
+"""
+
+import multiprocessing
+import threading
+import time
+
+
+class RateLimiter(object):
+    """
+    Allows queries_per_second requests per second on average, with bursts of up to burst
+    requests. Callers going over the budget reserve their slot and sleep until it is due,
+    so concurrent callers are served in turn instead of all waking up at once.
+    """
+
+    def __init__(self, queries_per_second=1, burst=None, shared=False):
+        """
+        :param queries_per_second: sustained number of requests per second permitted
+        :type queries_per_second: float
+
+        :param burst: number of requests that may be sent at once after an idle period,
+            queries_per_second by default
+        :type burst: float
+
+        :param shared: keep the bucket in shared memory so that it can be handed to worker
+            processes (through a pool initializer) and enforce one global budget
+        :type shared: bool
+        """
+        self.rate = float(queries_per_second)
+        self.burst = float(burst or queries_per_second)
+        if shared:
+            self._state = multiprocessing.Array('d', [self.burst, time.time()])
+            self._lock = self._state.get_lock()
+        else:
+            self._state = [self.burst, time.time()]
+            self._lock = threading.Lock()
+        # usage of this process, for reporting
+        self.acquired = 0
+        self.waited = 0.0
+
+    def _refill(self, now):
+        tokens, updated = self._state[0], self._state[1]
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def reserve(self, cost=1):
+        """
+        Takes cost tokens from the bucket without waiting
+        :return: number of seconds the caller must wait before sending
+        """
+        with self._lock:
+            now = time.time()
+            tokens = self._refill(now) - cost
+            self._state[0], self._state[1] = tokens, now
+            wait = -tokens / self.rate if tokens < 0 else 0.0
+            self.acquired += cost
+            self.waited += wait
+        return wait
+
+    def acquire(self, cost=1):
+        """
+        Takes cost tokens from the bucket, sleeping until they are available
+        :return: number of seconds waited
+        """
+        wait = self.reserve(cost)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def available(self):
+        """
+        Returns the number of tokens currently available (negative when callers are queued)
+        :rtype: float
+        """
+        with self._lock:
+            return self._refill(time.time())
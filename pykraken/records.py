@@ -0,0 +1,279 @@
+"""
+Compact fixed-width binary format for trade, OHLC and spread history.
+
+A file starts with a 16 bytes header followed by fixed-size little-endian records made of
+int64 slots only: timestamps in microseconds, prices and volumes as integers scaled by
+10 ** decimals (stored in the header) and flags in the low byte of the last trade slot.
+Because every slot is an int64, a file can be memory-mapped and viewed as a flat int64
+array, columns being zero-copy strided views of it.
+"""
+
+import bisect
+import collections
+import mmap
+import os
+import struct
+import sys
+
+from .convert import parse_scaled
+
+MAGIC = b'PKRB'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBB8x')
+
+TIME_DECIMALS = 6
+
+FLAG_SELL = 1
+FLAG_MARKET = 2
+
+
+class RecordFormat(object):
+    """Layout of one kind of record."""
+
+    def __init__(self, kind, name, fields, encoder):
+        self.kind = kind
+        self.name = name
+        self.fields = fields
+        self.struct = struct.Struct('<{}q'.format(len(fields)))
+        self.record = collections.namedtuple(name, fields)
+        self.encoder = encoder
+
+    def encode(self, row, price_decimals, volume_decimals):
+        """Packs an API row (array entry of the matching kpublic_* result) into bytes."""
+        return self.struct.pack(*self.encoder(row, price_decimals, volume_decimals))
+
+
+def _encode_trade(row, pd, vd):
+    # <price>, <volume>, <time>, <buy/sell>, <market/limit>, <miscellaneous>
+    flags = (FLAG_SELL if row[3] == 's' else 0) | (FLAG_MARKET if row[4] == 'm' else 0)
+    return (parse_scaled(row[2], TIME_DECIMALS), parse_scaled(row[0], pd),
+            parse_scaled(row[1], vd), flags)
+
+
+def _encode_ohlc(row, pd, vd):
+    # <time>, <open>, <high>, <low>, <close>, <vwap>, <volume>, <count>
+    return (parse_scaled(row[0], TIME_DECIMALS),
+            parse_scaled(row[1], pd), parse_scaled(row[2], pd), parse_scaled(row[3], pd),
+            parse_scaled(row[4], pd), parse_scaled(row[5], pd),
+            parse_scaled(row[6], vd), int(row[7]))
+
+
+def _encode_spread(row, pd, vd):
+    # <time>, <bid>, <ask>
+    return parse_scaled(row[0], TIME_DECIMALS), parse_scaled(row[1], pd), parse_scaled(row[2], pd)
+
+
+TRADE = RecordFormat(1, 'Trade', ('time', 'price', 'volume', 'flags'), _encode_trade)
+OHLC = RecordFormat(2, 'OHLC', ('time', 'open', 'high', 'low', 'close', 'vwap', 'volume', 'count'),
+                    _encode_ohlc)
+SPREAD = RecordFormat(3, 'Spread', ('time', 'bid', 'ask'), _encode_spread)
+
+FORMATS = dict((f.kind, f) for f in (TRADE, OHLC, SPREAD))
+
+
+def _read_header(f):
+    data = f.read(HEADER.size)
+    if len(data) != HEADER.size:
+        raise ValueError('not a pykraken record file: truncated header')
+    magic, version, kind, price_decimals, volume_decimals = HEADER.unpack(data)
+    if magic != MAGIC or version != VERSION or kind not in FORMATS:
+        raise ValueError('not a pykraken record file: bad header')
+    return FORMATS[kind], price_decimals, volume_decimals
+
+
+class RecordWriter(object):
+    """Appends records to a history file, creating it with its header when missing."""
+
+    def __init__(self, path, fmt, price_decimals=8, volume_decimals=8):
+        """
+        :param path: file to append to
+        :param fmt: one of TRADE, OHLC or SPREAD
+        :param price_decimals: decimals kept for prices, ignored if the file exists
+        :param volume_decimals: decimals kept for volumes, ignored if the file exists
+        :raises ValueError: if the existing file holds another kind of records
+        """
+        self.fmt = fmt
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'rb') as f:
+                existing, price_decimals, volume_decimals = _read_header(f)
+            if existing is not fmt:
+                raise ValueError('{} holds {} records, not {}'.format(path, existing.name,
+                                                                      fmt.name))
+            self._file = open(path, 'ab')
+            # drop a record torn by a crash in the middle of an append
+            size = os.path.getsize(path)
+            torn = (size - HEADER.size) % fmt.struct.size
+            if torn:
+                self._file.truncate(size - torn)
+        else:
+            self._file = open(path, 'ab')
+            self._file.write(HEADER.pack(MAGIC, VERSION, fmt.kind, price_decimals, volume_decimals))
+        self.price_decimals = price_decimals
+        self.volume_decimals = volume_decimals
+
+    def append(self, rows):
+        """
+        Encodes and appends API rows, e.g. the array of a pair in kpublic_trades' result
+        :return: number of records written
+        """
+        encode, pd, vd = self.fmt.encode, self.price_decimals, self.volume_decimals
+        self._file.write(b''.join(encode(row, pd, vd) for row in rows))
+        return len(rows)
+
+    def append_records(self, records):
+        """Appends already scaled records (tuples of ints in field order)."""
+        pack = self.fmt.struct.pack
+        self._file.write(b''.join(pack(*r) for r in records))
+
+    def append_packed(self, data):
+        """
+        Appends records already packed, e.g. by pykraken.workers.decode_records
+        :return: number of records written
+        """
+        size = self.fmt.struct.size
+        if len(data) % size:
+            raise ValueError('{} bytes is not a whole number of {} records'.format(
+                len(data), self.fmt.name))
+        self._file.write(data)
+        return len(data) // size
+
+    def truncate(self, count):
+        """Drops every record after the first count ones."""
+        self._file.flush()
+        self._file.truncate(HEADER.size + count * self.fmt.struct.size)
+
+    def flush(self):
+        self._file.flush()
+
+    def sync(self):
+        """Flushes and fsyncs the appended records to disk."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordReader(object):
+    """
+    Memory-maps a history file. Records are decoded on access only, so opening a file is
+    instant and only the pages actually read are loaded.
+
+    Views handed out by view() and column() must be released before close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.fmt, self.price_decimals, self.volume_decimals = _read_header(self._file)
+        self._mmap = None
+        self._buf = None
+        self.refresh()
+
+    def refresh(self):
+        """Remaps the file to see records appended since it was opened."""
+        self._release()
+        size = os.fstat(self._file.fileno()).st_size
+        self._count = (size - HEADER.size) // self.fmt.struct.size
+        if self._count:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            end = HEADER.size + self._count * self.fmt.struct.size
+            self._buf = memoryview(self._mmap)[HEADER.size:end]
+
+    def _release(self):
+        if self._buf is not None:
+            self._buf.release()
+            self._buf = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def close(self):
+        self._release()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError('record index out of range')
+        packer = self.fmt.struct
+        return self.fmt.record._make(packer.unpack_from(self._buf, index * packer.size))
+
+    def __iter__(self):
+        if not self._count:
+            return iter(())
+        return (self.fmt.record._make(r) for r in self.fmt.struct.iter_unpack(self._buf))
+
+    def view(self):
+        """
+        Returns a zero-copy flat int64 view of all the records, len(fmt.fields) slots per record
+        :rtype: memoryview
+        """
+        if sys.byteorder != 'little':
+            raise NotImplementedError('int64 views require a little-endian host')
+        if not self._count:
+            return memoryview(b'').cast('q')
+        return self._buf.cast('q')
+
+    def column(self, name):
+        """
+        Returns a zero-copy strided int64 view of one field across all records
+        :param name: field name, e.g. 'time' or 'price'
+        :rtype: memoryview
+        """
+        width = len(self.fmt.fields)
+        return self.view()[self.fmt.fields.index(name)::width]
+
+    def _time_at(self, index):
+        return struct.unpack_from('<q', self._buf, index * self.fmt.struct.size)[0]
+
+    def search(self, timestamp):
+        """
+        Binary searches the first record at or after a time, reading O(log n) pages
+        :param timestamp: unix timestamp in seconds
+        :return: record index
+        """
+        target = parse_scaled(timestamp, TIME_DECIMALS)
+        times = _TimeColumn(self)
+        return bisect.bisect_left(times, target)
+
+    def between(self, start=None, end=None):
+        """
+        Returns the records within [start, end)
+        :param start: unix timestamp (optional.  inclusive)
+        :param end: unix timestamp (optional.  exclusive)
+        """
+        lo = self.search(start) if start is not None else 0
+        hi = self.search(end) if end is not None else self._count
+        return self[lo:hi]
+
+
+class _TimeColumn(object):
+    """Sequence of record times decoded lazily, for bisect."""
+
+    def __init__(self, reader):
+        self._reader = reader
+
+    def __len__(self):
+        return len(self._reader)
+
+    def __getitem__(self, index):
+        return self._reader._time_at(index)
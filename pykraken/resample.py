@@ -0,0 +1,179 @@
+"""
+OHLC aggregation: builds bars of any interval from trades or from finer bars.
+
+Bars are tuples in the order of kpublic_ohlc's entries, (<time>, <open>, <high>, <low>,
+<close>, <vwap>, <volume>, <count>), time being the start of the bar. Aggregation is a
+single pass over the input; BarBuilder keeps only the bar in progress, so feeding it new
+trades as they arrive never recomputes a closed bar.
+"""
+
+import collections
+
+Bar = collections.namedtuple('Bar', ('time', 'open', 'high', 'low', 'close', 'vwap', 'volume',
+                                     'count'))
+
+
+class _Accumulator(object):
+    __slots__ = ('time', 'open', 'high', 'low', 'close', 'pv', 'volume', 'count')
+
+    def __init__(self, time, price):
+        self.time = time
+        self.open = self.high = self.low = self.close = price
+        self.pv = self.volume = 0.0
+        self.count = 0
+
+    def add(self, open_, high, low, close, vwap, volume, count):
+        if high > self.high:
+            self.high = high
+        if low < self.low:
+            self.low = low
+        self.close = close
+        self.pv += vwap * volume
+        self.volume += volume
+        self.count += count
+
+    def bar(self):
+        vwap = self.pv / self.volume if self.volume else self.close
+        return Bar(self.time, self.open, self.high, self.low, self.close, vwap, self.volume,
+                   self.count)
+
+
+def _bucket(timestamp, interval):
+    return int(timestamp // interval) * interval
+
+
+class BarBuilder(object):
+    """
+    Incrementally aggregates trades or finer bars into bars of a given interval. Input must
+    come in time order; anything older than the bar in progress, or than the end of the last
+    bar closed, is ignored.
+    """
+
+    def __init__(self, interval):
+        """
+        :param interval: bar interval in seconds, e.g. 180 for 3 minutes bars
+        :type interval: int
+        """
+        if interval <= 0:
+            raise ValueError('interval must be positive')
+        self.interval = interval
+        self._current = None
+        # end of the last bar closed: a bar is never reopened once returned
+        self._closed_until = None
+        # finer bars of the bar in progress, by time: kraken resends its last, uncommitted bar
+        self._parts = collections.OrderedDict()
+
+    @property
+    def current(self):
+        """The bar in progress, None before any input."""
+        if self._current is None:
+            return None
+        return self._current.bar()
+
+    def _roll(self, bucket, price):
+        closed = None
+        if self._closed_until is not None and bucket < self._closed_until:
+            return None, False
+        if self._current is not None:
+            if bucket < self._current.time:
+                return None, False
+            if bucket == self._current.time:
+                return None, True
+            closed = self._current.bar()
+            self._closed_until = self._current.time + self.interval
+        self._current = _Accumulator(bucket, price)
+        self._parts.clear()
+        return closed, True
+
+    def add_trades(self, trades):
+        """
+        Aggregates trades
+        :param trades: array of array entries(<price>, <volume>, <time>, ...), as in
+            kpublic_trades
+        :return: list of the bars closed by these trades
+        """
+        interval = self.interval
+        closed = []
+        current = self._current
+        for trade in trades:
+            price, volume, timestamp = float(trade[0]), float(trade[1]), float(trade[2])
+            if current is None or not current.time <= timestamp < current.time + interval:
+                bar, keep = self._roll(_bucket(timestamp, interval), price)
+                if bar is not None:
+                    closed.append(bar)
+                if not keep:
+                    continue
+                current = self._current
+            current.add(price, price, price, price, price, volume, 1)
+        return closed
+
+    def add_bars(self, bars):
+        """
+        Aggregates finer bars. A bar whose time was already seen replaces the previous one,
+        so kraken's uncommitted last bar may be fed again as it gets updated
+        :param bars: array of array entries(<time>, <open>, <high>, <low>, <close>, <vwap>,
+            <volume>, <count>)
+        :return: list of the bars closed by these bars
+        """
+        closed = []
+        for row in bars:
+            timestamp = float(row[0])
+            bar, keep = self._roll(_bucket(timestamp, self.interval), float(row[1]))
+            if bar is not None:
+                closed.append(bar)
+            if not keep:
+                continue
+            replaced = timestamp in self._parts
+            self._parts[timestamp] = tuple(float(v) for v in row[1:7]) + (int(row[7]),)
+            if replaced:
+                first = next(iter(self._parts.values()))
+                current = self._current = _Accumulator(self._current.time, first[0])
+                for part in self._parts.values():
+                    current.add(*part)
+            else:
+                self._current.add(*self._parts[timestamp])
+        return closed
+
+    def close_until(self, timestamp):
+        """
+        Closes the bar in progress if it ends at or before timestamp, for quiet markets
+        :return: list holding the closed bar, if any
+        """
+        if self._current is not None and self._current.time + self.interval <= timestamp:
+            bar = self._current.bar()
+            self._closed_until = self._current.time + self.interval
+            self._current = None
+            self._parts.clear()
+            return [bar]
+        return []
+
+
+def bars_from_trades(trades, interval, include_current=True):
+    """
+    Builds bars from trades
+    :param trades: array of array entries(<price>, <volume>, <time>, ...), as in kpublic_trades
+    :param interval: bar interval in seconds
+    :param include_current: also return the last bar, which may not be complete
+    :return: list of Bar
+    """
+    builder = BarBuilder(interval)
+    bars = builder.add_trades(trades)
+    if include_current and builder.current is not None:
+        bars.append(builder.current)
+    return bars
+
+
+def resample_bars(bars, interval, include_current=True):
+    """
+    Builds coarser bars from finer ones, e.g. 2 hours bars from kpublic_ohlc's 60 minutes ones
+    :param bars: array of array entries(<time>, <open>, <high>, <low>, <close>, <vwap>,
+        <volume>, <count>)
+    :param interval: bar interval in seconds, a multiple of the finer bars' interval
+    :param include_current: also return the last bar, which may not be complete
+    :return: list of Bar
+    """
+    builder = BarBuilder(interval)
+    result = builder.add_bars(bars)
+    if include_current and builder.current is not None:
+        result.append(builder.current)
+    return result
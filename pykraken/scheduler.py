@@ -0,0 +1,113 @@
+"""
+Priority scheduling of the requests competing for one rate budget.
+
+Requests wait in a queue ordered by priority (cancel, addorder, account, market data,
+history, see pykraken.endpoints), then deadline, then arrival. Only the head of the queue
+takes tokens from the rate limiter, so an urgent request arriving behind a backlog of
+history paging is sent as soon as the budget allows. A request still queued when its
+deadline passes is dropped with DeadlineExceeded rather than sent late.
+"""
+
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+
+from .exceptions import DeadlineExceeded
+from .ratelimit import RateLimiter
+
+_NO_DEADLINE = float('inf')
+
+
+class _Ticket(object):
+    __slots__ = ('cost', 'deadline', 'dropped')
+
+    def __init__(self, cost, deadline):
+        self.cost = cost
+        self.deadline = deadline
+        self.dropped = False
+
+
+class PriorityScheduler(object):
+    """Dispatches the requests of one or several clients in priority order."""
+
+    def __init__(self, rate_limiter=None, deadlines=None):
+        """
+        :param rate_limiter: limiter whose budget is scheduled, one of 1 query per second by
+            default
+        :type rate_limiter: pykraken.ratelimit.RateLimiter
+
+        :param deadlines: default seconds a request of a given priority may wait in the
+            queue, e.g. {PRIORITY_MARKET_DATA: 5}; requests of the other priorities wait as
+            long as needed
+        :type deadlines: dict
+        """
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.deadlines = dict(deadlines or {})
+        self._queue = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self.dispatched = {}
+        self.dropped = {}
+
+    @contextlib.contextmanager
+    def deadline(self, seconds):
+        """
+        Sets the deadline of the requests sent by the current thread within the block, e.g.
+        with scheduler.deadline(2): client.kprivate_cancelorder(txid)
+        """
+        previous = getattr(self._local, 'deadline', None)
+        self._local.deadline = time.time() + seconds
+        try:
+            yield
+        finally:
+            self._local.deadline = previous
+
+    def acquire(self, cost, priority):
+        """
+        Waits until the request is at the head of the queue and its tokens are available
+        :param cost: tokens taken from the rate limiter
+        :param priority: PRIORITY_* of the request, the lowest first
+        :raises DeadlineExceeded: if the deadline passed while the request was queued
+        """
+        deadline = getattr(self._local, 'deadline', None)
+        if deadline is None and priority in self.deadlines:
+            deadline = time.time() + self.deadlines[priority]
+        ticket = _Ticket(cost, _NO_DEADLINE if deadline is None else deadline)
+        entry = (priority, ticket.deadline, next(self._sequence), ticket)
+        limiter = self.rate_limiter
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            self._cond.notify_all()
+            while True:
+                self._discard_dropped()
+                now = time.time()
+                if now >= ticket.deadline:
+                    ticket.dropped = True
+                    self.dropped[priority] = self.dropped.get(priority, 0) + 1
+                    # the next request may be the head now
+                    self._cond.notify_all()
+                    raise DeadlineExceeded()
+                wait = ticket.deadline - now
+                if self._queue[0][3] is ticket:
+                    missing = cost - limiter.available()
+                    if missing <= 0:
+                        heapq.heappop(self._queue)
+                        self.dispatched[priority] = self.dispatched.get(priority, 0) + 1
+                        self._cond.notify_all()
+                        break
+                    wait = min(wait, missing / limiter.rate)
+                self._cond.wait(None if wait == _NO_DEADLINE else wait)
+        # another user of the limiter may have taken the tokens in between
+        limiter.acquire(cost)
+
+    def _discard_dropped(self):
+        while self._queue and self._queue[0][3].dropped:
+            heapq.heappop(self._queue)
+
+    def queued(self):
+        """Returns the number of requests waiting."""
+        with self._cond:
+            return sum(1 for entry in self._queue if not entry[3].dropped)
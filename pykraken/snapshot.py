@@ -0,0 +1,264 @@
+"""
+Ticker and depth snapshots shared between the processes of a host.
+
+One SnapshotService process polls kpublic_ticker (all pairs in one request) and kpublic_depth
+for a configured set of pairs, and writes the latest values in a shared memory block. Any
+number of SnapshotReader processes then read them with no network call and no copy of the
+block, each pair's slot being guarded by a seqlock: the writer makes the slot's sequence
+number odd while it writes, and readers retry until they read the same even number before
+and after the values. A slot also holds flags telling whether its ticker and depth were
+written. The header is padded so that every sequence number is 8-byte aligned, and never
+torn by a read.
+"""
+
+import collections
+import struct
+import threading
+import time
+
+try:  # Python >= 3.8
+    from multiprocessing import shared_memory
+    from multiprocessing import resource_tracker
+except ImportError:  # pragma: no cover
+    shared_memory = None
+
+MAGIC = b'PKSS'
+VERSION = 2
+HEADER = struct.Struct('<4sB3xIII4x')
+PAIR_NAME = struct.Struct('<16s')
+SEQUENCE = struct.Struct('<Q')
+FLAGS = struct.Struct('<Q')
+
+# bits of a slot's flags, set once the field was written
+TICKER_WRITTEN = 1
+DEPTH_WRITTEN = 2
+
+# offsets of the fields in a slot
+_FLAGS_OFFSET = SEQUENCE.size
+_TICKER_OFFSET = _FLAGS_OFFSET + FLAGS.size
+
+TICKER_FIELDS = ('ask', 'ask_volume', 'bid', 'bid_volume', 'last', 'last_volume', 'vwap_24h',
+                 'volume_24h', 'low_24h', 'high_24h', 'open', 'updated')
+TICKER = struct.Struct('<{}d'.format(len(TICKER_FIELDS)))
+
+Ticker = collections.namedtuple('Ticker', TICKER_FIELDS)
+TopOfBook = collections.namedtuple('TopOfBook',
+                                   ('bid', 'bid_volume', 'ask', 'ask_volume', 'updated'))
+Depth = collections.namedtuple('Depth', ('asks', 'bids', 'updated'))
+
+
+class _Layout(object):
+
+    def __init__(self, slots, depth_levels):
+        self.slots = slots
+        self.depth_levels = depth_levels
+        # updated time, then <price>, <volume> for each ask level then each bid level
+        self.depth = struct.Struct('<{}d'.format(1 + 4 * depth_levels))
+        self.depth_offset = _TICKER_OFFSET + TICKER.size
+        self.slot_size = self.depth_offset + self.depth.size
+        self.directory = HEADER.size
+        self.first_slot = HEADER.size + PAIR_NAME.size * slots
+        self.size = self.first_slot + self.slot_size * slots
+
+    def slot(self, index):
+        return self.first_slot + index * self.slot_size
+
+
+class SnapshotWriter(object):
+    """Owns the shared memory block and writes snapshots into it."""
+
+    def __init__(self, name, pairs, depth_levels=10):
+        """
+        :param name: name of the shared memory block
+        :param pairs: pairs to keep, by their kraken names as keyed in the results, e.g. XXBTZUSD
+        :param depth_levels: price levels kept per side of the book
+        """
+        if shared_memory is None:
+            raise NotImplementedError('snapshots require Python 3.8 or higher')
+        self.layout = _Layout(len(pairs), depth_levels)
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=self.layout.size)
+        buf = self.shm.buf
+        HEADER.pack_into(buf, 0, MAGIC, VERSION, len(pairs), self.layout.slot_size, depth_levels)
+        self.slots = {}
+        for i, pair in enumerate(pairs):
+            PAIR_NAME.pack_into(buf, self.layout.directory + i * PAIR_NAME.size,
+                                pair.encode('ascii'))
+            self.slots[pair] = self.layout.slot(i)
+        self._lock = threading.Lock()
+
+    def _write(self, pair, offset, packer, values, flag):
+        slot = self.slots[pair]
+        buf = self.shm.buf
+        with self._lock:
+            seq = SEQUENCE.unpack_from(buf, slot)[0]
+            SEQUENCE.pack_into(buf, slot, seq + 1)
+            packer.pack_into(buf, slot + offset, *values)
+            FLAGS.pack_into(buf, slot + _FLAGS_OFFSET,
+                            FLAGS.unpack_from(buf, slot + _FLAGS_OFFSET)[0] | flag)
+            SEQUENCE.pack_into(buf, slot, seq + 2)
+
+    def write_ticker(self, pair, ticker, updated=None):
+        """
+        :param ticker: ticker info of a pair, as in kpublic_ticker's result
+        """
+        t = ticker
+        values = (t['a'][0], t['a'][2], t['b'][0], t['b'][2], t['c'][0], t['c'][1], t['p'][1],
+                  t['v'][1], t['l'][1], t['h'][1], t['o'], updated or time.time())
+        self._write(pair, _TICKER_OFFSET, TICKER, [float(v) for v in values], TICKER_WRITTEN)
+
+    def write_depth(self, pair, depth, updated=None):
+        """
+        :param depth: market depth of a pair, as in kpublic_depth's result
+        """
+        levels = self.layout.depth_levels
+        values = [updated or time.time()]
+        for side in ('asks', 'bids'):
+            entries = depth[side][:levels]
+            for price, volume in ((e[0], e[1]) for e in entries):
+                values.append(float(price))
+                values.append(float(volume))
+            # empty levels are zeroed
+            values.extend([0.0] * (2 * (levels - len(entries))))
+        self._write(pair, self.layout.depth_offset, self.layout.depth, values, DEPTH_WRITTEN)
+
+    def close(self, unlink=True):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+class SnapshotReader(object):
+    """Reads the snapshots of a SnapshotWriter from any local process."""
+
+    def __init__(self, name):
+        """
+        :param name: name of the shared memory block
+        """
+        if shared_memory is None:
+            raise NotImplementedError('snapshots require Python 3.8 or higher')
+        # the block belongs to the writer: the exit of a reader process must not unlink it
+        try:  # Python >= 3.13
+            self.shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            self.shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+        buf = self.shm.buf
+        magic, version, slots, slot_size, depth_levels = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a pykraken snapshot block'.format(name))
+        self.layout = _Layout(slots, depth_levels)
+        self.slots = {}
+        for i in range(slots):
+            raw = PAIR_NAME.unpack_from(buf, self.layout.directory + i * PAIR_NAME.size)[0]
+            self.slots[raw.rstrip(b'\0').decode('ascii')] = self.layout.slot(i)
+
+    def _read(self, pair, offset, unpacker, flag):
+        """Returns the values of a field, None if it was never written."""
+        slot = self.slots[pair]
+        buf = self.shm.buf
+        while True:
+            before = SEQUENCE.unpack_from(buf, slot)[0]
+            if before & 1:
+                # the writer is in the middle of an update
+                time.sleep(0)
+                continue
+            flags = FLAGS.unpack_from(buf, slot + _FLAGS_OFFSET)[0]
+            values = unpacker.unpack_from(buf, slot + offset)
+            if SEQUENCE.unpack_from(buf, slot)[0] == before:
+                return values if flags & flag else None
+
+    def ticker(self, pair):
+        """
+        :return: the latest Ticker of pair, None if never written
+        """
+        values = self._read(pair, _TICKER_OFFSET, TICKER, TICKER_WRITTEN)
+        return Ticker._make(values) if values else None
+
+    def top_of_book(self, pair):
+        """
+        :return: the latest TopOfBook of pair, from its ticker, None if never written
+        """
+        t = self.ticker(pair)
+        return TopOfBook(t.bid, t.bid_volume, t.ask, t.ask_volume, t.updated) if t else None
+
+    def depth(self, pair):
+        """
+        :return: the latest Depth of pair, asks and bids being lists of (<price>, <volume>), None
+            if never written
+        """
+        values = self._read(pair, self.layout.depth_offset, self.layout.depth, DEPTH_WRITTEN)
+        if values is None:
+            return None
+        levels = self.layout.depth_levels
+        asks = [(values[1 + 2 * i], values[2 + 2 * i]) for i in range(levels) if values[2 + 2 * i]]
+        bids = [(values[1 + 2 * (levels + i)], values[2 + 2 * (levels + i)])
+                for i in range(levels) if values[2 + 2 * (levels + i)]]
+        return Depth(asks, bids, values[0])
+
+    def close(self):
+        self.shm.close()
+
+
+class SnapshotService(object):
+    """Refreshes the snapshots of a set of pairs at a target cadence."""
+
+    def __init__(self, client, pairs, name, interval=1.0, depth_levels=10):
+        """
+        :param client: the client; give it a rate_limiter to bound the request rate
+        :param pairs: pairs to refresh, by their kraken names, e.g. XXBTZUSD
+        :param name: name of the shared memory block
+        :param interval: seconds between the starts of two refreshes; a refresh taking longer
+            (because of the rate limit) is followed by the next one at once
+        :param depth_levels: price levels kept per side of the book
+        """
+        self.client = client
+        self.pairs = list(pairs)
+        self.interval = interval
+        self.writer = SnapshotWriter(name, self.pairs, depth_levels)
+        # exception of the last failed refresh, and refreshes failed since the last success
+        self.last_error = None
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """Fetches all the tickers in one request, then each pair's depth."""
+        now = time.time()
+        for pair, ticker in self.client.kpublic_ticker(pair=self.pairs).items():
+            if pair in self.writer.slots:
+                self.writer.write_ticker(pair, ticker, now)
+        for pair in self.pairs:
+            result = self.client.kpublic_depth(pair=[pair], count=self.writer.layout.depth_levels)
+            for name, depth in result.items():
+                if name in self.writer.slots:
+                    self.writer.write_depth(name, depth)
+
+    def run(self):
+        """
+        Refreshes until stop() is called. A failed refresh is retried at the next one, its
+        exception kept as last_error and counted in failures until a refresh succeeds
+        """
+        while not self._stop.is_set():
+            started = time.time()
+            try:
+                self.refresh()
+            except Exception as e:
+                self.last_error = e
+                self.failures += 1
+            else:
+                self.failures = 0
+            self._stop.wait(max(0.0, self.interval - (time.time() - started)))
+
+    def start(self):
+        """Runs in a daemon thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name='pykraken-snapshots')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, unlink=True):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.writer.close(unlink)
@@ -0,0 +1,234 @@
+"""
+Local history store: keeps trades, OHLC bars and ledger entries on disk so that repeated
+historical reads need no network traffic, and fetches only what is new on each sync.
+
+One SQLite file is kept per endpoint and pair (or asset for ledgers). Each file holds the
+rows, indexed by time, and the cursors (since / ofs) needed to resume the next sync.
+"""
+
+import collections
+import json
+import os
+import re
+import sqlite3
+
+from .pagination import iter_trades, iter_ohlc, iter_spread, iter_ledgers
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rows (
+    seq INTEGER PRIMARY KEY,
+    key TEXT UNIQUE,
+    time REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS rows_time ON rows (time, seq);
+CREATE TABLE IF NOT EXISTS cursor (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_UNSAFE_CHARS = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+def _numbered_keys(rows, time_index):
+    """
+    Keys of rows sharing their timestamp: the time and the rank of the row within its
+    second, e.g. '1500000000:2'. An inclusive since serves the whole last second again, in
+    the same order, so its rows get the same keys and are replaced instead of duplicated.
+    """
+    ranks = collections.Counter()
+    keys = []
+    for r in rows:
+        t = str(r[time_index])
+        keys.append('{}:{}'.format(t, ranks[t]))
+        ranks[t] += 1
+    return keys
+
+
+class HistoryStore(object):
+    """Incrementally synced, on-disk history of the paginated kraken endpoints."""
+
+    def __init__(self, path):
+        """
+        :param path: directory holding the store files, created if missing
+        :type path: string
+        """
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self._connections = {}
+
+    def _db(self, endpoint, name):
+        conn = self._connections.get((endpoint, name))
+        if conn is None:
+            filename = '{}-{}.sqlite'.format(endpoint, _UNSAFE_CHARS.sub('_', name))
+            conn = sqlite3.connect(os.path.join(self.path, filename))
+            conn.executescript(_SCHEMA)
+            self._connections[(endpoint, name)] = conn
+        return conn
+
+    def close(self):
+        for conn in self._connections.values():
+            conn.close()
+        self._connections.clear()
+
+    def get_cursor(self, endpoint, name, cursor='last'):
+        """
+        Returns a stored cursor
+        :param endpoint: store endpoint name, e.g. 'trades', 'ohlc60', 'ledgers'
+        :param name: pair (or asset for ledgers)
+        :param cursor: cursor name, 'last' for since-paginated endpoints
+        :return: the cursor value or None if never synced
+        """
+        row = self._db(endpoint, name).execute(
+            "SELECT value FROM cursor WHERE name = ?", (cursor,)).fetchone()
+        return row[0] if row else None
+
+    def _set_cursor(self, conn, cursor, value):
+        if value is None:
+            conn.execute("DELETE FROM cursor WHERE name = ?", (cursor,))
+        else:
+            conn.execute("INSERT OR REPLACE INTO cursor (name, value) VALUES (?, ?)",
+                         (cursor, str(value)))
+
+    def _sync_since(self, endpoint, pair, pages, time_index, insert):
+        # insert: 'append' for an exclusive since, 'replace' to overwrite the row of the same
+        # time (OHLC bars), 'replace_numbered' for rows sharing their time (spread points)
+        conn = self._db(endpoint, pair)
+        added = 0
+        for rows, last in pages(self.get_cursor(endpoint, pair)):
+            # rows and the cursor pointing after them are committed together, so that an
+            # interrupted sync never skips nor duplicates rows
+            with conn:
+                if insert == 'append':
+                    conn.executemany("INSERT INTO rows (time, data) VALUES (?, ?)",
+                                     [(float(r[time_index]), json.dumps(r)) for r in rows])
+                else:
+                    keys = (_numbered_keys(rows, time_index) if insert == 'replace_numbered'
+                            else [str(r[time_index]) for r in rows])
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO rows (key, time, data) VALUES (?, ?, ?)",
+                        [(k, float(r[time_index]), json.dumps(r)) for k, r in zip(keys, rows)])
+                self._set_cursor(conn, 'last', last)
+            added += len(rows)
+        return added
+
+    def sync_trades(self, client, pair):
+        """
+        Fetches the trades of a pair that are newer than the stored cursor
+        :param client: the client
+        :param pair: asset pair
+        :return: number of trades added
+        """
+        return self._sync_since('trades', pair,
+                                lambda since: iter_trades(client, pair, since=since),
+                                2, 'append')
+
+    def sync_ohlc(self, client, pair, interval=1):
+        """
+        Fetches the OHLC bars of a pair that are newer than the stored cursor. The last,
+        uncommitted bar is overwritten on the next sync
+        :param client: the client
+        :param pair: asset pair
+        :param interval: time frame interval in minutes
+        :return: number of bars added or updated
+        """
+        return self._sync_since('ohlc{}'.format(interval), pair,
+                                lambda since: iter_ohlc(client, pair, interval=interval,
+                                                        since=since),
+                                0, 'replace')
+
+    def sync_spread(self, client, pair):
+        """
+        Fetches the spread points of a pair that are newer than the stored cursor. Several
+        points may share a second: those of the last second, served again, are replaced
+        :param client: the client
+        :param pair: asset pair
+        :return: number of spread points added or updated
+        """
+        return self._sync_since('spread', pair,
+                                lambda since: iter_spread(client, pair, since=since),
+                                0, 'replace_numbered')
+
+    def sync_ledgers(self, client, asset='all'):
+        """
+        Fetches the ledger entries newer than the stored ones. Ledgers are served newest first
+        with an offset, so a sync interrupted mid-way resumes from its stored start and ofs
+        :param client: the client
+        :param asset: asset to sync the ledger of, 'all' by default
+        :return: number of entries added
+        """
+        conn = self._db('ledgers', asset)
+        start = self.get_cursor('ledgers', asset, 'pending_start')
+        if start is None:
+            start = self.get_cursor('ledgers', asset, 'start') or ''
+            with conn:
+                self._set_cursor(conn, 'pending_start', start)
+        ofs = int(self.get_cursor('ledgers', asset, 'ofs') or 0)
+
+        added = 0
+        for entries, ofs, count in iter_ledgers(client, asset=asset, start=start or None, ofs=ofs):
+            with conn:
+                cur = conn.executemany(
+                    "INSERT OR IGNORE INTO rows (key, time, data) VALUES (?, ?, ?)",
+                    [(lid, float(e['time']), json.dumps(e)) for lid, e in entries.items()])
+                self._set_cursor(conn, 'ofs', ofs)
+            added += cur.rowcount
+
+        newest = conn.execute("SELECT MAX(time) FROM rows").fetchone()[0]
+        with conn:
+            # start is exclusive: step back one second so same-second entries are not missed,
+            # the already known ones being ignored on insert
+            self._set_cursor(conn, 'start', int(newest) - 1 if newest is not None else None)
+            self._set_cursor(conn, 'pending_start', None)
+            self._set_cursor(conn, 'ofs', None)
+        return added
+
+    def _range(self, endpoint, name, start, end):
+        query = "SELECT key, data FROM rows"
+        clauses, args = [], []
+        if start is not None:
+            clauses.append("time >= ?")
+            args.append(start)
+        if end is not None:
+            clauses.append("time < ?")
+            args.append(end)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        return self._db(endpoint, name).execute(query + " ORDER BY time, seq", args)
+
+    def trades(self, pair, start=None, end=None):
+        """
+        Returns the stored trades of a pair within [start, end)
+        :param pair: asset pair
+        :param start: unix timestamp of the first trade (optional.  inclusive)
+        :param end: unix timestamp to stop at (optional.  exclusive)
+        :return: array of array entries(<price>, <volume>, <time>, <buy/sell>, <market/limit>,
+            <miscellaneous>)
+        """
+        return [json.loads(data) for _, data in self._range('trades', pair, start, end)]
+
+    def ohlc(self, pair, interval=1, start=None, end=None):
+        """
+        Returns the stored OHLC bars of a pair within [start, end)
+        :return: array of array entries(<time>, <open>, <high>, <low>, <close>, <vwap>,
+            <volume>, <count>)
+        """
+        rows = self._range('ohlc{}'.format(interval), pair, start, end)
+        return [json.loads(data) for _, data in rows]
+
+    def spread(self, pair, start=None, end=None):
+        """
+        Returns the stored spread points of a pair within [start, end)
+        :return: array of array entries(<time>, <bid>, <ask>)
+        """
+        return [json.loads(data) for _, data in self._range('spread', pair, start, end)]
+
+    def ledgers(self, asset='all', start=None, end=None):
+        """
+        Returns the stored ledger entries within [start, end), oldest first
+        :return: ordered dict of ledger id to ledger entry
+        """
+        return collections.OrderedDict((key, json.loads(data))
+                                       for key, data in self._range('ledgers', asset, start, end))
@@ -0,0 +1,209 @@
+"""
+Incremental parsing of API responses, for the very large kpublic_trades and kpublic_depth
+results.
+
+The body is decoded chunk by chunk as it comes from the socket: the arrays of rows under
+result.<pair> (or result.<pair>.<asks|bids>) are yielded one row at a time, and everything
+else (the error array, the last cursor...) is decoded whole. Only the undecoded tail of the
+body is kept in memory, so memory use does not depend on the size of the response.
+"""
+
+import codecs
+import collections
+import json
+
+from .exceptions import ApiError
+
+_WHITESPACE = ' \t\n\r'
+_decoder = json.JSONDecoder()
+
+Row = collections.namedtuple('Row', ('pair', 'side', 'data'))
+
+
+class _Buffer(object):
+    """Undecoded tail of the body, refilled from the chunks on demand."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        if self.eof:
+            return False
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            self.eof = True
+            chunk = b''
+        if isinstance(chunk, bytes):
+            chunk = self._utf8.decode(chunk, final=self.eof)
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def drain(self):
+        """Reads the chunks left, so that the body is read to its end."""
+        while self.fill():
+            pass
+
+    def peek(self):
+        while True:
+            text, pos = self.text, self.pos
+            while pos < len(text) and text[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(text):
+                return text[pos]
+            if not self.fill():
+                raise ValueError('unexpected end of JSON body')
+
+    def expect(self, chars):
+        char = self.peek()
+        if char not in chars:
+            raise ValueError('expected {!r} at {!r}'.format(
+                chars, self.text[self.pos:self.pos + 20]))
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                # a number at the very end of the buffer may still be cut in two
+                if end < len(self.text) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def _walk(buf, path):
+    char = buf.peek()
+    if char == '{' and path[0] == 'result':
+        buf.pos += 1
+        if buf.peek() == '}':
+            buf.pos += 1
+            return
+        while True:
+            key = buf.value()
+            buf.expect(':')
+            for event in _walk(buf, path + (key,)):
+                yield event
+            if buf.expect(',}') == '}':
+                return
+    elif char == '[' and path[0] == 'result' and len(path) >= 2:
+        buf.pos += 1
+        if buf.peek() == ']':
+            buf.pos += 1
+            return
+        while True:
+            yield 'row', path, buf.value()
+            if buf.expect(',]') == ']':
+                return
+    else:
+        yield 'value', path, buf.value()
+
+
+def iter_events(chunks):
+    """
+    Parses a response body incrementally
+    :param chunks: iterable of bytes (or text) chunks of the body
+    :return: generator of ('row', path, row) and ('value', path, value) tuples, path being the
+        tuple of keys leading to the row or value, e.g. ('result', 'XETHXXBT', 'asks')
+    """
+    buf = _Buffer(chunks)
+    buf.expect('{')
+    if buf.peek() == '}':
+        buf.pos += 1
+    else:
+        while True:
+            key = buf.value()
+            buf.expect(':')
+            for event in _walk(buf, (key,)):
+                yield event
+            if buf.expect(',}') == '}':
+                break
+    # the connection only goes back to the pool once the body was read to its end
+    buf.drain()
+
+
+class StreamingResult(object):
+    """
+    Iterates over the rows of a response as they are decoded, yielding Row(pair, side, data)
+    tuples, side being 'asks' or 'bids' for depth and None otherwise.
+
+    The API errors raise ApiError as soon as they are decoded. The other values of the result
+    are available once iterated over, e.g. last, the cursor of trades.
+
+    on_done, when set, is called once: with the exception when reading or decoding the body
+    failed, with None otherwise, whether the body was read to its end, the result closed
+    (close() or the end of a with block) or dropped without being consumed.
+    """
+
+    def __init__(self, chunks, row_parser=None, status=200):
+        """
+        :param chunks: iterable of bytes chunks of the body
+        :param row_parser: callable applied to each row, e.g. to build typed records
+        :param status: HTTP status reported by ApiError
+        """
+        self._events = iter_events(chunks)
+        self._row_parser = row_parser
+        self._status = status
+        self.values = {}
+        self.on_done = None
+
+    @property
+    def last(self):
+        """Cursor to be used as since when polling for new data, once the rows are consumed."""
+        return self.values.get(('result', 'last'))
+
+    def _done(self, error):
+        on_done, self.on_done = self.on_done, None
+        if on_done is not None:
+            on_done(error)
+
+    def close(self):
+        """Stops reading the body, whose rows that are left are not decoded."""
+        self._events.close()
+        self._done(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __del__(self):
+        if self.on_done is not None:
+            self._done(None)
+
+    def __iter__(self):
+        parse = self._row_parser
+        try:
+            for kind, path, value in self._events:
+                if kind == 'row':
+                    yield Row(path[1], path[2] if len(path) > 2 else None,
+                              parse(value) if parse else value)
+                elif path == ('error',):
+                    if value:
+                        raise ApiError(self._status, message=value)
+                else:
+                    self.values[path] = value
+        except GeneratorExit:
+            self._done(None)
+            raise
+        except Exception as e:
+            self._done(e)
+            raise
+        self._done(None)
+
+    def rows(self):
+        """Yields only the row data, for single pair results."""
+        for row in self:
+            yield row.data
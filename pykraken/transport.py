@@ -0,0 +1,66 @@
+"""
+HTTP transports performing the requests of a Client.
+
+RequestsTransport keeps a pool of HTTP/1.1 connections through a requests session: each
+in-flight request holds a socket (and a TLS session) of its own. Http2Transport multiplexes
+concurrent requests as streams of a single HTTP/2 connection instead; it requires Python 3
+and httpx with its http2 extra (pip install httpx[http2]).
+
+A transport's post() returns a response with status_code, headers, json(),
+iter_content(chunk_size) and close(), and raises pykraken.exceptions.Timeout when the
+request timed out. Its iter_raw(response, chunk_size) yields the body of a streamed
+response as received, still compressed.
+"""
+
+import requests
+
+from .exceptions import Timeout
+
+try:
+    from ._http2 import Http2Transport, httpx
+except (ImportError, SyntaxError):  # Python 2: no asyncio, nor async def
+    httpx = None
+
+    class Http2Transport(object):
+
+        def __init__(self, *args, **kwargs):
+            raise NotImplementedError('the HTTP/2 transport requires Python 3 and httpx[http2]')
+
+
+class RequestsTransport(object):
+    """Sends the requests through a requests session pooling HTTP/1.1 connections."""
+
+    def __init__(self, session=None):
+        """
+        :param session: session to send the requests with, a new one by default
+        :type session: requests.Session
+        """
+        self.session = session or requests.Session()
+
+    def post(self, url, data, headers, timeout=None, stream=False, **kwargs):
+        """
+        :param timeout: None, seconds or a (connect, read) tuple of seconds
+        :param kwargs: extra keyword arguments of requests, e.g. proxies or verify
+        :rtype: requests.Response
+        """
+        try:
+            return self.session.post(url, data=data, headers=headers, timeout=timeout,
+                                     stream=stream, **kwargs)
+        except requests.exceptions.Timeout:
+            raise Timeout()
+
+    def iter_raw(self, response, chunk_size):
+        consumed = False
+        try:
+            for chunk in response.raw.stream(chunk_size, decode_content=False):
+                yield chunk
+            consumed = True
+        except requests.packages.urllib3.exceptions.ReadTimeoutError:
+            raise Timeout()
+        finally:
+            # a connection with unread data cannot go back to the pool
+            if not consumed:
+                response.close()
+
+    def close(self):
+        self.session.close()
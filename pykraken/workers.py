@@ -0,0 +1,238 @@
+"""
+Process pool parsing large response bodies off the I/O threads.
+
+Parsing the JSON of a large kpublic_trades, kpublic_depth or ledgers page and converting
+its strings to numbers holds the GIL for as long as it takes, stalling every thread sending
+requests. A DecodePool fetches the body in the calling thread (Client._post_raw: the body
+is read and decompressed, API errors raised, but not parsed) and hands the bytes to a
+worker process, which returns compact results: packed records, arrays or history columns
+rather than nested lists of strings. Throughput then grows with the number of cores.
+
+Large packed records can come back through shared memory instead of the result pipe,
+as a SharedBuffer the caller closes once read.
+"""
+
+import array
+import concurrent.futures
+import json
+
+try:  # Python >= 3.8
+    from multiprocessing import resource_tracker, shared_memory
+except ImportError:
+    shared_memory = None
+
+from .analytics import LedgerHistory, TradeHistory
+from .endpoints import DEPTH, LEDGERS, OHLC, SPREAD, TRADES, TRADES_HISTORY
+from .pagination import split_pair_result
+from .records import FORMATS, OHLC as OHLC_RECORD, SPREAD as SPREAD_RECORD, TRADE
+from .resample import bars_from_trades
+
+
+class SharedBuffer(object):
+    """Bytes left in a shared memory block by a worker, pickled as the block's name."""
+
+    def __init__(self, name, size):
+        self.name = name
+        self.size = size
+        self._shm = None
+
+    def __getstate__(self):
+        return {'name': self.name, 'size': self.size}
+
+    def __setstate__(self, state):
+        self.__init__(state['name'], state['size'])
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def buf(self):
+        """memoryview of the bytes, attaching the block on first use"""
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(name=self.name)
+        return self._shm.buf[:self.size]
+
+    def tobytes(self):
+        return bytes(self.buf)
+
+    def close(self):
+        """Releases and removes the block."""
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(name=self.name)
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _share(data):
+    if not data:
+        return data
+    try:  # Python >= 3.13
+        shm = shared_memory.SharedMemory(create=True, size=len(data), track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(create=True, size=len(data))
+        # the block outlives this worker: it is the caller's to unlink
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    shm.buf[:len(data)] = data
+    name = shm.name
+    shm.close()
+    return SharedBuffer(name, len(data))
+
+
+def _result(body):
+    return json.loads(body.decode('utf-8'))['result']
+
+
+def parse_result(body):
+    """Parses a body into its result, as the kpublic_* and kprivate_* functions return it."""
+    return _result(body)
+
+
+def decode_records(body, kind, price_decimals, volume_decimals, shared=False):
+    """
+    Encodes the rows of a single pair trades, OHLC or spread body as packed records
+    :param kind: record kind, TRADE.kind, OHLC.kind or SPREAD.kind
+    :param shared: return the records in shared memory rather than through the result pipe
+    :return: (records, rows, last): bytes (or SharedBuffer) for RecordWriter.append_packed,
+        number of records, and the cursor to resume from
+    """
+    encode = FORMATS[kind].encode
+    rows, last = split_pair_result(_result(body))
+    data = b''.join(encode(row, price_decimals, volume_decimals) for row in rows)
+    if shared and shared_memory is not None:
+        data = _share(data)
+    return data, len(rows), last
+
+
+def decode_bars(body, interval):
+    """
+    Aggregates the trades of a single pair trades body into bars
+    :param interval: bar interval in seconds
+    :return: (bars, last), bars being a list of pykraken.resample.Bar
+    """
+    rows, last = split_pair_result(_result(body))
+    return bars_from_trades(rows, interval), last
+
+
+def decode_depth(body):
+    """
+    :return: dict of pair -> dict of side -> (prices, volumes) arrays of float
+    """
+    books = {}
+    for pair, depth in _result(body).items():
+        books[pair] = dict((side, (array.array('d', [float(e[0]) for e in entries]),
+                                   array.array('d', [float(e[1]) for e in entries])))
+                           for side, entries in depth.items())
+    return books
+
+
+def decode_ledgers(body):
+    """
+    :return: (LedgerHistory of the page, total number of entries)
+    """
+    result = _result(body)
+    history = LedgerHistory()
+    history.add(result['ledger'])
+    return history, int(result['count'])
+
+
+def decode_tradeshistory(body):
+    """
+    :return: (TradeHistory of the page, total number of fills)
+    """
+    result = _result(body)
+    history = TradeHistory()
+    history.add(result['trades'])
+    return history, int(result['count'])
+
+
+class DecodePool(object):
+    """Fetches in the calling thread, parses in worker processes."""
+
+    def __init__(self, processes=None, shared_min_bytes=1 << 20):
+        """
+        :param processes: number of worker processes, the number of cores by default
+        :param shared_min_bytes: packed records of this size or more are returned through
+            shared memory (Python >= 3.8), None to always use the result pipe
+        """
+        self.executor = concurrent.futures.ProcessPoolExecutor(processes)
+        self.shared_min_bytes = shared_min_bytes
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def fetch_then_submit(self, client, url, params, task, *args):
+        """
+        Fetches url in the calling thread, blocking until the body is read, then hands it to a
+        worker to parse. The request stays on the thread that owns the client, its nonces and
+        rate limiter: only the parsing is asynchronous
+        :param task: module level function(body, *args) run by the worker, e.g. decode_depth
+        :rtype: concurrent.futures.Future
+        """
+        return self.executor.submit(task, client._post_raw(url, params), *args)
+
+    def _records(self, client, endpoint, kind, pair, since, price_decimals, volume_decimals,
+                 extra=None):
+        params = endpoint.encode(pair=[pair], since=since, **(extra or {}))
+        body = client._post_raw(endpoint.path, params)
+        shared = self.shared_min_bytes is not None and len(body) >= self.shared_min_bytes
+        return self.executor.submit(decode_records, body, kind, price_decimals, volume_decimals,
+                                    shared)
+
+    def trades(self, client, pair, since=None, price_decimals=8, volume_decimals=8):
+        """
+        Fetches one page of trades, packed as TRADE records by a worker
+        :return: Future of (records, rows, last), see decode_records
+        """
+        return self._records(client, TRADES, TRADE.kind, pair, since, price_decimals,
+                             volume_decimals)
+
+    def ohlc(self, client, pair, interval=1, since=None, price_decimals=8, volume_decimals=8):
+        """
+        Fetches the OHLC bars of a pair, packed as OHLC records by a worker
+        :return: Future of (records, rows, last), see decode_records
+        """
+        return self._records(client, OHLC, OHLC_RECORD.kind, pair, since, price_decimals,
+                             volume_decimals, {'interval': interval})
+
+    def spread(self, client, pair, since=None, price_decimals=8):
+        """
+        Fetches the spread points of a pair, packed as SPREAD records by a worker
+        :return: Future of (records, rows, last), see decode_records
+        """
+        return self._records(client, SPREAD, SPREAD_RECORD.kind, pair, since, price_decimals, 0)
+
+    def bars(self, client, pair, interval, since=None):
+        """
+        Fetches one page of trades and aggregates them into bars in a worker
+        :return: Future of (bars, last)
+        """
+        params = TRADES.encode(pair=[pair], since=since)
+        return self.fetch_then_submit(client, TRADES.path, params, decode_bars, interval)
+
+    def depth(self, client, pair, count=None):
+        """:return: Future of the books as arrays, see decode_depth"""
+        params = DEPTH.encode(pair=pair, count=count)
+        return self.fetch_then_submit(client, DEPTH.path, params, decode_depth)
+
+    def ledgers(self, client, asset='all', start=None, end=None, ofs=None):
+        """:return: Future of (LedgerHistory, count), see decode_ledgers"""
+        params = LEDGERS.encode(aclass='currency', asset=asset, typet='all', start=start, end=end,
+                                ofs=ofs)
+        return self.fetch_then_submit(client, LEDGERS.path, params, decode_ledgers)
+
+    def tradeshistory(self, client, start=None, end=None, ofs=None):
+        """:return: Future of (TradeHistory, count), see decode_tradeshistory"""
+        params = TRADES_HISTORY.encode(start=start, end=end, ofs=ofs)
+        return self.fetch_then_submit(client, TRADES_HISTORY.path, params, decode_tradeshistory)
@@ -36,7 +36,15 @@ setup(
     package_dir={'pykraken':
                  'pykraken'},
     include_package_data=True,
+    entry_points={
+        'console_scripts': [
+            'pykraken=pykraken.cli:main',
+        ],
+    },
     install_requires=requirements,
+    extras_require={
+        'http2': ['httpx[http2]'],
+    },
     license="ISCL",
     zip_safe=False,
     keywords='pykraken',
@@ -0,0 +1,145 @@
+import random
+
+import pytest
+
+from pykraken.analytics import TradeHistory, LedgerHistory, FIFO, AVERAGE
+
+
+def _fill(t, pair, kind, price, vol, fee=0.0):
+    return {'time': t, 'pair': pair, 'type': kind, 'ordertype': 'limit',
+            'price': '{:.5f}'.format(price), 'vol': '{:.8f}'.format(vol),
+            'cost': '{:.5f}'.format(price * vol), 'fee': '{:.5f}'.format(fee)}
+
+
+FILLS = {
+    'T1': _fill(100.0, 'XETHZEUR', 'buy', 10.0, 1.0, 0.1),
+    'T2': _fill(200.0, 'XETHZEUR', 'buy', 20.0, 1.0, 0.1),
+    'T3': _fill(300.0, 'XETHZEUR', 'sell', 30.0, 1.5, 0.2),
+    'T4': _fill(150.0, 'XXBTZEUR', 'sell', 1000.0, 0.5),
+}
+
+
+class FakeClient(object):
+    """Serves trades history pages newest first, 50 per page, the way kraken does."""
+
+    def __init__(self, fills):
+        self.fills = fills
+        self.starts = []
+
+    def kprivate_tradeshistory(self, typet=None, trades=False, start=None, end=None, ofs=None):
+        self.starts.append(start)
+        entries = sorted(((k, v) for k, v in self.fills.items()
+                          if v['time'] > float(start or 0)), key=lambda kv: -kv[1]['time'])
+        ofs = ofs or 0
+        return {'trades': dict(entries[ofs:ofs + 50]), 'count': len(entries)}
+
+
+def test_fifo_and_average_pnl():
+    history = TradeHistory()
+    assert history.add(FILLS) == 4
+    assert list(history.time) == [100.0, 150.0, 200.0, 300.0]
+
+    fifo = history.pnl(FIFO)['XETHZEUR']
+    # sells 1 bought at 10 and 0.5 bought at 20
+    assert fifo.realized == pytest.approx(20.0 + 5.0)
+    assert fifo.volume == pytest.approx(0.5)
+    assert fifo.average_price == pytest.approx(20.0)
+    assert fifo.fees == pytest.approx(0.4)
+
+    average = history.pnl(AVERAGE)['XETHZEUR']
+    assert average.realized == pytest.approx(1.5 * (30.0 - 15.0))
+    assert average.average_price == pytest.approx(15.0)
+
+    short = history.pnl()['XXBTZEUR']
+    assert short.volume == pytest.approx(-0.5)
+    assert short.realized == 0.0
+    with pytest.raises(ValueError):
+        history.pnl('lifo')
+
+
+def test_closed_position_leaves_no_lot():
+    # 0.1 + 0.2 - 0.3 is 5.55e-17 in floats
+    history = TradeHistory()
+    history.add({'T1': _fill(1.0, 'XETHZEUR', 'buy', 10.0, 0.1),
+                 'T2': _fill(2.0, 'XETHZEUR', 'buy', 10.0, 0.2),
+                 'T3': _fill(3.0, 'XETHZEUR', 'sell', 12.0, 0.3)})
+    for method in (FIFO, AVERAGE):
+        position = history.pnl(method)['XETHZEUR']
+        assert (position.volume, position.average_price) == (0.0, 0.0)
+        assert position.realized == pytest.approx(0.6)
+    history.add({'T4': _fill(4.0, 'XETHZEUR', 'sell', 11.0, 1.0)})
+    for method in (FIFO, AVERAGE):
+        position = history.pnl(method)['XETHZEUR']
+        assert (position.volume, position.average_price) == (-1.0, 11.0)
+        assert position.realized == pytest.approx(0.6)
+
+
+def test_incremental_matches_batch():
+    rng = random.Random(5)
+    fills = dict(('T{}'.format(i), _fill(float(i), rng.choice(['XETHZEUR', 'XXBTZEUR']),
+                                         rng.choice(['buy', 'sell']), rng.uniform(10, 20),
+                                         rng.uniform(0.1, 2), 0.01))
+                 for i in range(400))
+    batch = TradeHistory()
+    batch.add(fills)
+
+    live = TradeHistory()
+    keys = sorted(fills, key=lambda k: fills[k]['time'])
+    for chunk in range(0, 400, 37):
+        live.add(dict((k, fills[k]) for k in keys[chunk:chunk + 37]))
+        live.pnl(FIFO)
+        live.pnl(AVERAGE)
+    # a late page, older than the fills known: the books are replayed
+    late = {'L1': _fill(0.5, 'XETHZEUR', 'buy', 15.0, 1.0)}
+    live.add(late)
+    batch.add(late)
+    for method in (FIFO, AVERAGE):
+        expected = batch.pnl(method)
+        for pair, position in live.pnl(method).items():
+            assert position.realized == pytest.approx(expected[pair].realized)
+            assert position.volume == pytest.approx(expected[pair].volume)
+    assert live.add(late) == 0
+
+
+def test_vwap_and_fees():
+    history = TradeHistory()
+    history.add(FILLS)
+    periods = history.vwap(period=250)
+    assert [p.start for p in periods['XETHZEUR']] == [0.0, 250.0]
+    first = periods['XETHZEUR'][0]
+    assert first.vwap == pytest.approx(15.0)
+    assert first.volume == pytest.approx(2.0)
+    assert history.vwap(period=250, pair='XXBTZEUR', start=120)['XXBTZEUR'][0].vwap == 1000.0
+    assert history.vwap(pair='XLTCZEUR') == {}
+    assert history.fees() == pytest.approx({'XETHZEUR': 0.4, 'XXBTZEUR': 0.0})
+
+
+def test_sync_fetches_newer_fills():
+    fills = dict(('T{}'.format(i), _fill(float(i), 'XETHZEUR', 'buy', 10.0, 1.0))
+                 for i in range(1, 121))
+    client = FakeClient(fills)
+    history = TradeHistory()
+    sorts = []
+    history._sort = lambda: sorts.append(1)
+    assert history.sync(client) == 120
+    # three pages, newest first, but the columns are filled in one sorted pass
+    assert sorts == [] and list(history.time) == [float(i) for i in range(1, 121)]
+    fills['T121'] = _fill(121.0, 'XETHZEUR', 'sell', 12.0, 1.0)
+    assert history.sync(client) == 1
+    assert client.starts[-1] == 119
+    assert history.pnl()['XETHZEUR'].realized == pytest.approx(2.0)
+
+
+def test_ledger_history():
+    ledger = LedgerHistory()
+    ledger.add({
+        'L1': {'time': 1.0, 'asset': 'ZEUR', 'type': 'deposit', 'amount': '100.0', 'fee': '0.5',
+               'balance': '99.5'},
+        'L2': {'time': 2.0, 'asset': 'ZEUR', 'type': 'trade', 'amount': '-10.0', 'fee': '0.1',
+               'balance': '89.4'},
+        'L3': {'time': 2.0, 'asset': 'XETH', 'type': 'trade', 'amount': '1.0', 'fee': '0',
+               'balance': '1.0'},
+    })
+    assert ledger.fees() == pytest.approx({'ZEUR': 0.6, 'XETH': 0.0})
+    assert ledger.flows()[('ZEUR', 'deposit')] == 100.0
+    assert ledger.balances() == {'ZEUR': 89.4, 'XETH': 1.0}
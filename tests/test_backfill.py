@@ -0,0 +1,94 @@
+import json
+import time
+
+import pytest
+
+import pykraken.backfill
+from pykraken.backfill import Backfill, plan_shards
+from pykraken.records import RecordReader
+
+try:  # Python 3
+    from urllib.parse import parse_qsl
+except ImportError:  # Python 2
+    from urlparse import parse_qsl
+
+# one trade every 10 seconds over [0, 5000)
+TRADES = [['1.0', '1.0', float(t), 'b', 'l', ''] for t in range(0, 5000, 10)]
+
+
+class FakeClient(object):
+
+    def __init__(self, rate_limiter=None, **kwargs):
+        self.rate_limiter = rate_limiter
+
+    def kpublic_trades(self, pair=None, since=None):
+        since = int(since) / 1e9
+        rows = [t for t in TRADES if t[2] > since][:1000]
+        last = rows[-1][2] if rows else since
+        return {pair[0]: rows, 'last': str(int(last * 1e9))}
+
+
+class _Response(object):
+    status_code = 200
+    headers = {}
+
+    def __init__(self, body):
+        self.body = body
+
+    def close(self):
+        pass
+
+
+class TradesTransport(object):
+    """Serves TRADES to real clients; picklable, so that it reaches the worker processes."""
+
+    def post(self, url, data, headers, **kwargs):
+        params = dict(parse_qsl(data))
+        result = FakeClient().kpublic_trades(pair=[params['pair']], since=params['since'])
+        return _Response(json.dumps({'error': [], 'result': result}).encode())
+
+    def iter_raw(self, response, chunk_size):
+        yield response.body
+
+
+def test_plan_shards():
+    assert plan_shards(0, 10, 3) == [(0, 3), (3, 7), (7, 10)]
+
+
+def test_backfill_threads(tmpdir, monkeypatch):
+    monkeypatch.setattr(pykraken.backfill, 'Client', FakeClient)
+    path = str(tmpdir.join('trades.bin'))
+    total = Backfill({}, 'XETHXXBT', 1000, 4000, path, shards=7, workers=3, processes=False,
+                     queries_per_second=1000).run()
+    assert total == 300
+    with RecordReader(path) as reader:
+        times = [r.time // 10 ** 6 for r in reader]
+    assert times == list(range(1000, 4000, 10))
+    assert tmpdir.listdir() == [tmpdir.join('trades.bin')]
+
+
+def test_backfill_processes_share_the_budget(tmpdir):
+    path = str(tmpdir.join('trades.bin'))
+    client_kwargs = {'key': 'key', 'private_key': 'c2VjcmV0', 'transport': TradesTransport()}
+    backfill = Backfill(client_kwargs, 'XETHXXBT', 1000, 4000, path,
+                        shards=4, workers=2, queries_per_second=2)
+    started = time.time()
+    assert backfill.run() == 300
+    # 4 requests, one per shard, with a burst of 2 then 2 per second across both processes
+    assert time.time() - started >= 0.9
+    assert backfill.limiter.available() < 2
+    with RecordReader(path) as reader:
+        assert [r.time // 10 ** 6 for r in reader] == list(range(1000, 4000, 10))
+
+
+def test_resume_needs_the_same_plan(tmpdir):
+    path = str(tmpdir.join('trades.bin'))
+    Backfill({}, 'XETHXXBT', 1000, 4000, path, shards=4, processes=False)
+    with pytest.raises(ValueError):
+        Backfill({}, 'XETHXXBT', 1000, 5000, path, shards=4, processes=False)
+    with pytest.raises(ValueError):
+        Backfill({}, 'XETHXXBT', 1000, 4000, path, shards=3, processes=False)
+    with pytest.raises(ValueError):
+        Backfill({}, 'XXBTZUSD', 1000, 4000, path, shards=4, processes=False)
+    assert Backfill({}, 'XETHXXBT', 1000, 4000, path, shards=4).shards == [
+        (1000, 1750), (1750, 2500), (2500, 3250), (3250, 4000)]
@@ -0,0 +1,184 @@
+import pytest
+
+from pykraken.breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN, is_service_error
+from pykraken.client import Client
+from pykraken.endpoints import PRIORITY_CANCEL, PRIORITY_TRADE, PRIORITY_MARKET_DATA
+from pykraken.exceptions import ApiError, CircuitOpenError, LoadShedError
+
+
+class FakeTime(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeTime()
+
+
+def test_opens_fails_fast_and_recovers(clock):
+    breaker = CircuitBreaker(window=10, min_calls=4, failure_rate=0.5, open_seconds=30,
+                             shed_rate=None, local_time=clock)
+    for ok in (True, False, True, False):
+        breaker.allow('public', PRIORITY_MARKET_DATA)
+        breaker.record('public', ok, 0.1)
+    assert breaker.state('public') == OPEN
+    with pytest.raises(CircuitOpenError) as e:
+        breaker.allow('public', PRIORITY_MARKET_DATA)
+    assert e.value.retry_after == 30
+    # other groups are not affected
+    breaker.allow('private', PRIORITY_MARKET_DATA)
+
+    clock.now += 30
+    assert breaker.state('public') == HALF_OPEN
+    breaker.allow('public', PRIORITY_MARKET_DATA)
+    # a single probe at a time
+    with pytest.raises(CircuitOpenError):
+        breaker.allow('public', PRIORITY_MARKET_DATA)
+    breaker.record('public', True, 0.1)
+    assert breaker.state('public') == CLOSED
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(min_calls=1, failure_rate=1, open_seconds=10, local_time=clock)
+    breaker.allow('public', PRIORITY_MARKET_DATA)
+    breaker.record('public', False, 0.1)
+    clock.now += 10
+    breaker.allow('public', PRIORITY_MARKET_DATA)
+    breaker.record('public', False, 0.1)
+    assert breaker.state('public') == OPEN
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = CircuitBreaker(min_calls=2, failure_rate=1, slow_seconds=5, local_time=clock)
+    breaker.record('private', True, 6)
+    breaker.record('private', True, 7)
+    assert breaker.state('private') == OPEN
+
+
+def test_cancels_bypass_and_market_data_is_shed(clock):
+    breaker = CircuitBreaker(window=10, min_calls=4, failure_rate=0.75, shed_rate=0.25,
+                             local_time=clock)
+    for ok in (True, True, True, False):
+        breaker.record('trading', ok, 0.1)
+    assert breaker.state('trading') == CLOSED
+    with pytest.raises(LoadShedError):
+        breaker.allow('trading', PRIORITY_MARKET_DATA)
+    breaker.allow('trading', PRIORITY_TRADE)
+    for _ in range(8):
+        breaker.record('trading', False, 0.1)
+    with pytest.raises(CircuitOpenError):
+        breaker.allow('trading', PRIORITY_TRADE)
+    breaker.allow('trading', PRIORITY_CANCEL)
+
+
+def test_service_errors():
+    assert is_service_error(ApiError(200, ['EService:Unavailable']))
+    assert not is_service_error(ApiError(200, ['EOrder:Insufficient funds']))
+
+
+class _Response(object):
+
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+    def close(self):
+        pass
+
+
+class FailingTransport(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def post(self, *args, **kwargs):
+        self.calls += 1
+        return _Response(503)
+
+
+def test_client_stops_retrying_when_open():
+    transport = FailingTransport()
+    breaker = CircuitBreaker(min_calls=2, failure_rate=1)
+    client = Client(key='key', private_key='c2VjcmV0', transport=transport, circuit_breaker=breaker)
+    with pytest.raises(CircuitOpenError):
+        client.kpublic_time()
+    assert transport.calls == 2
+    with pytest.raises(CircuitOpenError):
+        client.kpublic_time()
+    assert transport.calls == 2
+
+
+class StreamTransport(object):
+
+    def __init__(self, *bodies):
+        self.bodies = list(bodies)
+
+    def post(self, *args, **kwargs):
+        return _Response(200)
+
+    def iter_raw(self, response, chunk_size):
+        body = self.bodies.pop(0)
+        yield body[:len(body) // 2]
+        yield body[len(body) // 2:]
+
+
+def test_streamed_outcome_recorded_once_consumed():
+    ok = b'{"error": [], "result": {"XETHXXBT": [["1", "1", 1, "b", "l", ""]], "last": "1"}}'
+    failing = b'{"error": ["EService:Unavailable"], "result": {}}'
+    breaker = CircuitBreaker(min_calls=10)
+    client = Client(key='key', private_key='c2VjcmV0', transport=StreamTransport(ok, failing),
+                    circuit_breaker=breaker)
+
+    result = client.kpublic_trades_stream(pair=['XETHXXBT'])
+    assert breaker.report()['public']['requests'] == 0 and not client.sent_times
+    assert len(list(result.rows())) == 1
+    assert breaker.report()['public'] == {'state': CLOSED, 'requests': 1, 'failure_rate': 0.0}
+    assert len(client.sent_times) == 1
+
+    result = client.kpublic_trades_stream(pair=['XETHXXBT'])
+    with pytest.raises(ApiError):
+        list(result)
+    assert breaker.report()['public']['failure_rate'] == 0.5
+    assert len(client.sent_times) == 1
+
+
+def test_streamed_outcome_recorded_when_dropped_or_closed():
+    ok = b'{"error": [], "result": {"XETHXXBT": [["1", "1", 1, "b", "l", ""]], "last": "1"}}'
+    breaker = CircuitBreaker(min_calls=10)
+    client = Client(key='key', private_key='c2VjcmV0', transport=StreamTransport(ok, ok, ok),
+                    circuit_breaker=breaker)
+
+    client.kpublic_trades_stream(pair=['XETHXXBT'])
+    assert breaker.report()['public']['requests'] == 1
+
+    with client.kpublic_trades_stream(pair=['XETHXXBT']) as result:
+        pass
+    assert breaker.report()['public']['requests'] == 2
+
+    result = client.kpublic_trades_stream(pair=['XETHXXBT'])
+    next(iter(result))
+    result.close()
+    result.close()
+    assert breaker.report()['public'] == {'state': CLOSED, 'requests': 3, 'failure_rate': 0.0}
+    assert len(client.sent_times) == 3
+
+
+def test_probe_given_back_when_signing_fails(clock):
+    breaker = CircuitBreaker(min_calls=1, failure_rate=1, open_seconds=10, local_time=clock)
+    # the secret is not base64: signing raises after the breaker let the request through
+    client = Client(key='key', private_key='not base64', transport=FailingTransport(),
+                    circuit_breaker=breaker)
+    breaker.allow('private', PRIORITY_MARKET_DATA)
+    breaker.record('private', False, 0.1)
+    clock.now += 10
+    for _ in range(3):
+        with pytest.raises(Exception) as e:
+            client.kprivate_balance()
+        assert not isinstance(e.value, CircuitOpenError)
+    assert breaker.state('private') == HALF_OPEN
+    assert client.transport.calls == 0
@@ -0,0 +1,114 @@
+import csv
+import json
+
+import pytest
+
+from pykraken import cli
+
+
+class FakeClient(object):
+    """Serves a ledger newest first, in pages of 3 entries, and a ticker."""
+
+    def __init__(self, *args, **kwargs):
+        self.entries = sorted(((('L{:02d}'.format(i), {'time': 1000.0 + i, 'asset': 'ZEUR',
+                                                       'amount': '1', 'fee': '0', 'balance': i})
+                                for i in range(8))), key=lambda kv: -kv[1]['time'])
+        self.offsets = []
+
+    def kprivate_ledgers(self, aclass=None, asset=None, typet=None, start=None, end=None,
+                         ofs=0):
+        self.offsets.append(ofs)
+        return {'ledger': dict(self.entries[ofs:ofs + 3]), 'count': len(self.entries)}
+
+    def kpublic_ticker(self, pair=None):
+        t = {'a': ['2', '1', '1'], 'b': ['1', '1', '1'], 'c': ['1.5', '1'], 'v': ['1', '10'],
+             'p': ['1', '1.2'], 't': [1, 5], 'l': ['1', '0.9'], 'h': ['2', '2.1'], 'o': '1.1'}
+        return dict((p, t) for p in pair)
+
+
+def test_parser():
+    args = cli.build_parser().parse_args(['--format', 'jsonl', '--rate', '0.5', 'ohlc',
+                                          'XXBTZUSD', 'XETHZEUR', '--interval', '60'])
+    assert (args.command, args.pairs, args.interval) == ('ohlc', ['XXBTZUSD', 'XETHZEUR'], 60)
+    assert (args.format, args.rate, args.resume) == ('jsonl', 0.5, False)
+    with pytest.raises(SystemExit):
+        cli.build_parser().parse_args(['ledgers', '--format', 'xml'])
+
+
+def test_main_exit_status(tmpdir, monkeypatch, capsys):
+    monkeypatch.setattr(cli, 'Client', FakeClient)
+    status = cli.main(['--key', 'key', '--output', str(tmpdir), '--quiet', 'ticker', 'XXBTZUSD',
+                       'XETHZEUR'])
+    assert status == 0
+    assert capsys.readouterr().out == '2\n'
+    with open(str(tmpdir.join('ticker.csv'))) as f:
+        assert [r[0] for r in csv.reader(f)] == ['pair', 'XETHZEUR', 'XXBTZUSD']
+
+
+def test_main_needs_credentials(tmpdir, monkeypatch, capsys):
+    monkeypatch.delenv('K_API_KEY', raising=False)
+    monkeypatch.delenv('K_PRIVATE_KEY', raising=False)
+    with pytest.raises(SystemExit) as exit:
+        cli.main(['--output', str(tmpdir), 'ticker', 'XXBTZUSD'])
+    assert exit.value.code == 2 and 'K_API_KEY' in capsys.readouterr().err
+    with pytest.raises(SystemExit) as exit:
+        cli.main(['--key', 'key', '--output', str(tmpdir), 'ledgers'])
+    assert exit.value.code == 2 and 'K_PRIVATE_KEY' in capsys.readouterr().err
+
+
+def _ledger_times(path):
+    with open(path) as f:
+        return [float(json.loads(line)['time']) for line in f]
+
+
+def test_history_exported_oldest_first(tmpdir):
+    client = FakeClient()
+    args = cli.build_parser().parse_args(['--output', str(tmpdir), '--format', 'jsonl',
+                                          'ledgers', '--until', '2000'])
+    assert cli.export_history(client, args, cli.Progress(interval=1e9)) == 8
+    assert client.offsets == [0, 6, 3]
+    times = _ledger_times(str(tmpdir.join('ledgers.jsonl')))
+    assert times == sorted(times) and len(times) == 8
+
+
+def test_history_resumes_before_last_page(tmpdir):
+    path = str(tmpdir.join('ledgers.jsonl'))
+    args = cli.build_parser().parse_args(['--output', str(tmpdir), '--format', 'jsonl',
+                                          '--resume', 'ledgers'])
+
+    class Interrupted(Exception):
+        pass
+
+    class Progress(object):
+        def update(self, name, rows, fraction=None):
+            if rows and fraction < 0.5:
+                raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        cli.export_history(FakeClient(), args, Progress())
+    client = FakeClient()
+    assert cli.export_history(client, args, cli.Progress(interval=1e9)) == 6
+    assert client.offsets == [0, 3]
+    times = _ledger_times(path)
+    assert times == sorted(times) and len(times) == 8
+
+
+def test_resume_drops_rows_written_after_the_cursor(tmpdir, monkeypatch):
+    path = str(tmpdir.join('ledgers.csv'))
+    args = cli.build_parser().parse_args(['--output', str(tmpdir), '--resume', 'ledgers'])
+    save_cursor, saved = cli._save_cursor, []
+
+    def crash_on_second_save(path, cursor):
+        if saved:
+            raise KeyboardInterrupt()
+        saved.append(cursor)
+        save_cursor(path, cursor)
+
+    monkeypatch.setattr(cli, '_save_cursor', crash_on_second_save)
+    with pytest.raises(KeyboardInterrupt):
+        cli.export_history(FakeClient(), args, cli.Progress(interval=1e9))
+    monkeypatch.setattr(cli, '_save_cursor', save_cursor)
+    assert cli.export_history(FakeClient(), args, cli.Progress(interval=1e9)) == 6
+    with open(path) as f:
+        ids = [row[0] for row in csv.reader(f)][1:]
+    assert ids == ['L{:02d}'.format(i) for i in range(8)]
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from pykraken.client import Client
+from pykraken.clock import ClockSync
+
+try:  # Python 3
+    from urllib.parse import parse_qsl
+except ImportError:  # Python 2
+    from urlparse import parse_qsl
+
+
+class FakeTime(object):
+    """Local clock advancing by the round trip of each kpublic_time sample."""
+
+    def __init__(self, now, offset, rtts):
+        self.now = now
+        self.offset = offset
+        self.rtts = list(rtts)
+
+    def __call__(self):
+        return self.now
+
+    def kpublic_time(self):
+        rtt = self.rtts.pop(0)
+        self.now += rtt / 2.0
+        server = self.now + self.offset
+        self.now += rtt / 2.0
+        return int(server), 'x'
+
+
+def test_offset_estimated_from_short_round_trips():
+    fake = FakeTime(1000.25, 30.0, [0.02, 0.02, 2.0, 0.02])
+    clock = ClockSync(fake, samples=4, local_time=fake)
+    assert clock.sync() == pytest.approx(30.0, abs=0.5)
+    assert clock.offset() == pytest.approx(30.0, abs=0.5)
+    assert clock.timestamp(10) == int(fake.now + clock.offset() + 10)
+
+
+def test_drift_fitted_across_syncs():
+    fake = FakeTime(1000.5, 10.0, [0.0] * 8)
+    clock = ClockSync(fake, samples=2, smoothing=1.0, local_time=fake)
+    clock.sync()
+    fake.now += 1000
+    fake.offset += 1.0
+    clock.sync()
+    assert clock.drift == pytest.approx(0.001, rel=0.01)
+
+
+class _Response(object):
+    status_code = 200
+    headers = {}
+
+    def __init__(self, result):
+        self.body = json.dumps({'error': [], 'result': result}).encode()
+
+    def close(self):
+        pass
+
+
+class RecordingTransport(object):
+
+    def __init__(self, unixtime):
+        self.unixtime = unixtime
+        self.sent = []
+
+    def post(self, url, data, headers, **kwargs):
+        self.sent.append((url, dict(parse_qsl(data))))
+        if url.endswith('/Time'):
+            return _Response({'unixtime': self.unixtime, 'rfc1123': 'x'})
+        return _Response({'descr': {}, 'txid': ['OA']})
+
+    def iter_raw(self, response, chunk_size):
+        yield response.body
+
+
+def test_clock_sampling_through_the_client_it_clocks():
+    transport = RecordingTransport(unixtime=2000000000)
+    client = Client(key='key', private_key='c2VjcmV0', transport=transport)
+    client.clock = ClockSync(client, samples=2)
+    client.kprivate_addorder(pair='XXBTZUSD', typeo='buy', ordertype='limit', price='1',
+                             volume='1', starttm='+60', expiretm='0')
+    urls = [url.rsplit('/', 1)[1] for url, _ in transport.sent]
+    assert urls == ['Time', 'Time', 'AddOrder']
+    assert 'nonce' not in transport.sent[0][1]
+    params = transport.sent[-1][1]
+    # the nonce and starttm follow the server clock, 2000000000, not the local one
+    assert abs(int(params['nonce']) / 1000.0 - 2000000000) < 5
+    assert abs(int(params['starttm']) - 2000000060) < 5
+    assert params['expiretm'] == '0'
@@ -0,0 +1,98 @@
+import gzip
+import json
+import threading
+import zlib
+
+import pytest
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from pykraken.client import Client
+from pykraken.compression import accept_encoding, iter_decoded, ByteCounters
+from pykraken.streaming import StreamingResult
+
+TRADES = {'error': [], 'result': {'XETHXXBT': [['0.05', '1.5', 1499999999.5, 'b', 'l', '']] * 500,
+                                  'last': '1500000000000000000'}}
+BODY = json.dumps(TRADES).encode()
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('encoding,compress', [
+    ('gzip', gzip.compress),
+    ('deflate', zlib.compress),
+    ('deflate', lambda d: zlib.compress(d)[2:-4]),  # raw deflate, without the zlib wrapper
+    ('identity', lambda d: d),
+])
+def test_iter_decoded_streams_into_parser(encoding, compress):
+    counters = ByteCounters()
+    compressed = compress(BODY)
+    chunks = iter_decoded(_chunks(compressed, 100), encoding, counters, 'Trades')
+    result = StreamingResult(chunks)
+    assert len(list(result.rows())) == 500
+    assert result.last == '1500000000000000000'
+    report = counters.report()['Trades']
+    assert (report['requests'], report['compressed'], report['decompressed']) == \
+        (1, len(compressed), len(BODY))
+
+
+def test_accept_encoding():
+    assert accept_encoding(False) == 'identity'
+    assert accept_encoding(['gzip']) == 'gzip'
+    assert accept_encoding(True).endswith('gzip, deflate')
+    with pytest.raises(ValueError):
+        accept_encoding(['lzma'])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        self.server.accepted.append(self.headers.get('Accept-Encoding'))
+        data = BODY
+        self.send_response(200)
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzip.compress(BODY)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = HTTPServer(('127.0.0.1', 0), _Handler)
+    srv.accepted = []
+    thread = threading.Thread(target=srv.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.mark.parametrize('compression', [True, False])
+def test_client_counts_bytes_per_endpoint(server, compression):
+    client = Client(key='key', private_key='c2VjcmV0', compression=compression,
+                    base_url='http://127.0.0.1:{}'.format(server.server_port))
+    result = client.kpublic_trades(pair=['XETHXXBT'])
+    assert len(result['XETHXXBT']) == 500
+    rows = list(client.kpublic_trades_stream(pair=['XETHXXBT']).rows())
+    assert len(rows) == 500
+    report = client.byte_counters.report()['Trades']
+    assert report['requests'] == 2 and report['decompressed'] == 2 * len(BODY)
+    if compression:
+        assert server.accepted[0].endswith('gzip, deflate')
+        assert report['compressed'] == 2 * len(gzip.compress(BODY)) and report['ratio'] > 5
+    else:
+        assert server.accepted == ['identity', 'identity']
+        assert report['saved'] == 0
@@ -0,0 +1,42 @@
+import random
+
+from pykraken.depthdiff import (DepthDiffer, Delta, apply_deltas, compact, expand, INSERT, UPDATE,
+                                REMOVE)
+
+
+def _book(rng, levels=20):
+    prices = sorted(rng.sample(range(900, 1100), levels))
+    asks = [['{:.1f}'.format(p / 10.0), '{:.3f}'.format(rng.randint(1, 5)), 1500000000]
+            for p in prices if p >= 1000]
+    bids = [['{:.1f}'.format(p / 10.0), '{:.3f}'.format(rng.randint(1, 5)), 1500000000]
+            for p in reversed(prices) if p < 1000]
+    return {'asks': asks, 'bids': bids}
+
+
+def test_minimal_deltas():
+    differ = DepthDiffer()
+    first = {'asks': [['10.1', '1', 1], ['10.2', '2', 1]], 'bids': [['9.9', '1', 1], ['9.8', '3', 1]]}
+    assert len(differ.update('XETHZEUR', first)) == 4
+    second = {'asks': [['10.0', '1', 2], ['10.2', '5', 2]], 'bids': [['9.9', '1', 1], ['9.8', '3', 1]]}
+    assert differ.update('XETHZEUR', second) == [
+        Delta('asks', INSERT, ['10.0', '1', 2]),
+        Delta('asks', REMOVE, ['10.1', '1', 1]),
+        Delta('asks', UPDATE, ['10.2', '5', 2]),
+    ]
+    assert differ.update('XETHZEUR', second) == []
+
+
+def test_replay_rebuilds_books():
+    rng = random.Random(7)
+    differ = DepthDiffer()
+    replayed = {'asks': [], 'bids': []}
+    published = {'asks': [], 'bids': []}
+    for _ in range(50):
+        book = _book(rng)
+        deltas = differ.update('XXBTZUSD', book)
+        records = compact(deltas)
+        published = apply_deltas(published, expand(published, records))
+        replayed = apply_deltas(replayed, deltas)
+        assert replayed == book
+        assert [e[:2] for e in published['asks']] == [e[:2] for e in book['asks']]
+        assert [e[:2] for e in published['bids']] == [e[:2] for e in book['bids']]
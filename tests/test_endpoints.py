@@ -0,0 +1,37 @@
+import pytest
+
+from pykraken.endpoints import ENDPOINTS, ADD_ORDER, OHLC, QUERY_TRADES, TRADES_HISTORY
+from pykraken.exceptions import BadParamterError, RequiredParameterError
+
+
+def test_encode_joins_and_converts():
+    assert OHLC.encode(pair=['XETHXXBT', 'XXBTZEUR'], interval=60) == {'pair': 'XETHXXBT,XXBTZEUR',
+                                                                       'interval': '60'}
+    assert TRADES_HISTORY.encode(typet='all', trades=True, ofs=0) == {'type': 'all', 'trades': 'true',
+                                                                       'ofs': '0'}
+
+
+def test_encode_validates():
+    with pytest.raises(BadParamterError):
+        OHLC.encode(pair=['XETHXXBT'], interval=2)
+    with pytest.raises(RequiredParameterError):
+        OHLC.encode(interval=60)
+    with pytest.raises(BadParamterError):
+        QUERY_TRADES.encode(txid=['T{}'.format(i) for i in range(21)])
+
+
+def test_addorder_keeps_order_times():
+    params = ADD_ORDER.encode(pair='XETHZEUR', typeo='buy', ordertype='limit', price='+5.0', volume=0.01,
+                              oflags=['post', 'viqc'], starttm='+60', expiretm=1500000000)
+    assert params['starttm'] == '+60'
+    assert params['expiretm'] == '1500000000'
+    assert params['oflags'] == 'post,viqc'
+    with pytest.raises(RequiredParameterError):
+        ADD_ORDER.encode(pair='XETHZEUR', typeo='buy', ordertype='stop-loss-limit', price='1', volume=1)
+    with pytest.raises(BadParamterError):
+        ADD_ORDER.encode(pair='XETHZEUR', typeo='buy', ordertype='market', volume=1, starttm='soon')
+
+
+def test_paths():
+    assert ENDPOINTS['Ledgers'].path == '/0/private/Ledgers'
+    assert ENDPOINTS['Ticker'].path == '/0/public/Ticker'
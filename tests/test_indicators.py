@@ -0,0 +1,80 @@
+import math
+import random
+
+import pytest
+
+from pykraken import indicators
+
+
+def _rows(n, seed=3):
+    rng = random.Random(seed)
+    rows, close = [], 100.0
+    for i in range(n):
+        open_ = close
+        close = max(1.0, open_ + rng.uniform(-2, 2))
+        high, low = max(open_, close) + rng.uniform(0, 1), min(open_, close) - rng.uniform(0, 1)
+        rows.append([1500000000 + 60 * i, '{:.5f}'.format(open_), '{:.5f}'.format(high),
+                     '{:.5f}'.format(low), '{:.5f}'.format(close), '{:.5f}'.format((high + low) / 2),
+                     '{:.8f}'.format(rng.uniform(0.1, 10)), rng.randint(1, 50)])
+    return rows
+
+
+def _same(batch, incremental):
+    assert len(batch) == len(incremental)
+    for b, i in zip(batch, incremental):
+        if i is None:
+            assert math.isnan(b)
+        else:
+            assert b == pytest.approx(i, rel=1e-9, abs=1e-9)
+
+
+@pytest.fixture
+def cols():
+    return indicators.columns(_rows(300))
+
+
+def test_sma_matches_naive(cols):
+    out = indicators.sma(cols.close, 10)
+    for i in range(9, len(cols.close)):
+        assert out[i] == pytest.approx(sum(cols.close[i - 9:i + 1]) / 10)
+    assert math.isnan(out[8])
+
+
+@pytest.mark.parametrize('name,args', [('sma', (10,)), ('ema', (10,)), ('rsi', (14,))])
+def test_single_column_incremental_forms(cols, name, args):
+    batch = getattr(indicators, name)(cols.close, *args)
+    live = getattr(indicators, name.upper())(*args)
+    _same(batch, [live.update(v) for v in cols.close])
+
+
+def test_atr_vwap_bollinger_incremental_forms(cols):
+    live = indicators.ATR(14)
+    _same(indicators.atr(cols.high, cols.low, cols.close, 14),
+          [live.update(h, l, c) for h, l, c in zip(cols.high, cols.low, cols.close)])
+    live = indicators.VWAP(20)
+    _same(indicators.vwap(cols.vwap, cols.volume, 20),
+          [live.update(p, v) for p, v in zip(cols.vwap, cols.volume)])
+    live = indicators.VWAP()
+    _same(indicators.vwap(cols.vwap, cols.volume),
+          [live.update(p, v) for p, v in zip(cols.vwap, cols.volume)])
+    middle, upper, lower = indicators.bollinger(cols.close, 20, 2)
+    live = indicators.Bollinger(20, 2)
+    values = [live.update(v) for v in cols.close]
+    _same(middle, [v and v[0] for v in values])
+    _same(upper, [v and v[1] for v in values])
+    _same(lower, [v and v[2] for v in values])
+
+
+def test_rsi_bounds(cols):
+    values = [v for v in indicators.rsi(cols.close, 14) if not math.isnan(v)]
+    assert len(values) == len(cols.close) - 14
+    assert all(0 <= v <= 100 for v in values)
+
+
+@pytest.mark.parametrize('values,expected', [([5.0] * 20, 50.0), (range(20), 100.0),
+                                             (range(20, 0, -1), 0.0)])
+def test_rsi_without_losses(values, expected):
+    values = [float(v) for v in values]
+    assert list(indicators.rsi(values, 14)[14:]) == [expected] * 6
+    live = indicators.RSI(14)
+    assert [live.update(v) for v in values][14:] == [expected] * 6
@@ -0,0 +1,149 @@
+import json
+import threading
+
+import pytest
+
+from pykraken import journal
+from pykraken.exceptions import ApiError, CircuitOpenError, TransportError
+
+
+class FakeClient(object):
+    """Places orders in memory; fail makes the next request raise after taking effect."""
+
+    def __init__(self):
+        self.orders = {}
+        self.calls = []
+        self.fail = None
+
+    def _raise(self):
+        error, self.fail = self.fail, None
+        if error is not None:
+            raise error
+
+    def kprivate_addorder(self, userref=None, validate=None, **kwargs):
+        self.calls.append(('addorder', userref))
+        if isinstance(self.fail, (ApiError, CircuitOpenError)):
+            self._raise()
+        txid = 'O{}'.format(len(self.orders))
+        self.orders[txid] = {'userref': userref, 'status': 'open', 'opentm': 0}
+        self._raise()
+        return {'descr': {}, 'txid': [txid]}
+
+    def kprivate_cancelorder(self, txid=None):
+        self.calls.append(('cancelorder', txid))
+        self.orders[txid]['status'] = 'canceled'
+        self._raise()
+        return {'count': 1}
+
+    def kprivate_openorders(self, userref=None):
+        self.calls.append(('openorders', userref))
+        return {'open': dict((t, o) for t, o in self.orders.items()
+                             if o['userref'] == userref and o['status'] == 'open')}
+
+    def kprivate_closedorders(self, userref=None, start=None):
+        self.calls.append(('closedorders', userref))
+        return {'closed': dict((t, o) for t, o in self.orders.items()
+                               if o['userref'] == userref and o['status'] != 'open'),
+                'count': 0}
+
+    def kprivate_queryorders_bulk(self, txid):
+        self.calls.append(('queryorders', tuple(txid)))
+        return dict((t, self.orders[t]) for t in txid if t in self.orders)
+
+
+ORDER = dict(pair='XXBTZUSD', typeo='buy', ordertype='limit', price='1', volume='1')
+
+
+@pytest.fixture
+def path(tmpdir):
+    return str(tmpdir.join('orders.journal'))
+
+
+def test_outcomes_journaled_and_replayed(path):
+    client = FakeClient()
+    with journal.OrderJournal(path) as j:
+        j.add_order(client, userref=1, **ORDER)
+        j.cancel_order(client, 1)
+        client.fail = ApiError(200, ['EOrder:Insufficient funds'])
+        with pytest.raises(ApiError):
+            j.add_order(client, userref=2, **ORDER)
+        client.fail = CircuitOpenError('trading')
+        with pytest.raises(CircuitOpenError):
+            j.add_order(client, userref=3, **ORDER)
+        assert j.in_doubt() == []
+        with pytest.raises(ValueError):
+            j.add_order(client, userref=1, **ORDER)
+    with journal.OrderJournal(path) as j:
+        assert [(e.userref, e.state, e.cancel) for e in j.entries.values()] == [
+            (1, journal.PLACED, journal.CANCELED), (2, journal.REJECTED, None),
+            (3, journal.REJECTED, None)]
+        assert j.entries[1].txid == ['O0']
+        assert j.next_userref() > 3
+
+
+def test_recover_only_looks_up_orders_in_doubt(path):
+    client = FakeClient()
+    with journal.OrderJournal(path) as j:
+        j.add_order(client, userref=10, **ORDER)
+        j.add_order(client, userref=11, **ORDER)
+        j.cancel_order(client, 10)
+        j.add_order(client, userref=12, **ORDER)
+        # the process dies before the outcomes: order placed, cancel applied, order lost
+        for userref, op in ((11, 'cancel'), (20, 'add'), (12, 'cancel')):
+            record = {'op': op, 'userref': userref}
+            if op == 'add':
+                record.update(time=0, params=ORDER)
+            j._append(record, True)
+        client.fail = TransportError()
+        with pytest.raises(TransportError):
+            j.add_order(client, userref=21, **ORDER)
+        client.fail = TransportError()
+        with pytest.raises(TransportError):
+            j.cancel_order(client, 11)
+    with open(path, 'a') as f:
+        f.write('{"op": "add", "userref": 2')  # torn by the crash
+
+    client.calls = []
+    with journal.OrderJournal(path) as j:
+        assert sorted(e.userref for e in j.in_doubt()) == [11, 12, 20, 21]
+        recovered = j.recover(client)
+        assert sorted(recovered) == [11, 12, 20, 21]
+        assert (recovered[20].state, recovered[20].error) == (journal.REJECTED, 'not found')
+        assert (recovered[21].state, recovered[21].txid) == (journal.PLACED, ['O3'])
+        assert recovered[11].cancel == journal.CANCELED
+        assert (recovered[12].cancel, recovered[12].status) == (journal.CANCEL_FAILED, 'open')
+        assert j.in_doubt() == []
+    assert client.calls == [('openorders', 20), ('closedorders', 20), ('openorders', 21),
+                            ('queryorders', ('O1', 'O2'))]
+    with open(path) as f:
+        assert all(json.loads(line) for line in f)
+
+
+def test_compact_keeps_unsettled_orders(path):
+    client = FakeClient()
+    with journal.OrderJournal(path) as j:
+        for userref in (1, 2, 3):
+            j.add_order(client, userref=userref, **ORDER)
+        j.cancel_order(client, 1)
+        assert j.compact() == 2
+        j.add_order(client, userref=4, **ORDER)
+    with journal.OrderJournal(path) as j:
+        assert list(j.entries) == [2, 3, 4]
+        assert j.entries[2].txid == ['O1']
+
+
+def test_concurrent_intents_share_fsyncs(path, monkeypatch):
+    fsyncs = []
+    monkeypatch.setattr(journal.os, 'fsync', fsyncs.append)
+    j = journal.OrderJournal(path, batch_seconds=0.01)
+    threads = [threading.Thread(target=j._append,
+                                args=({'op': 'add', 'userref': i, 'time': 0, 'params': {}}, True))
+               for i in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    j.close()
+    assert 1 <= len(fsyncs) < 20
+    with journal.OrderJournal(path) as j:
+        assert len(j.entries) == 20
@@ -0,0 +1,144 @@
+import itertools
+import json
+import time
+
+import pytest
+
+from pykraken import lifecycle
+from pykraken.client import Client
+from pykraken.exceptions import TransportError
+
+
+class _Response(object):
+    headers = {}
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def close(self):
+        pass
+
+
+class ScriptedTransport(object):
+    """Answers with the (status, result) given in turn, or raises the exceptions given."""
+
+    def __init__(self, *answers):
+        self.answers = list(answers)
+
+    def post(self, url, data, headers, **kwargs):
+        status, result = self.answers.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return _Response(status, json.dumps({'error': [], 'result': result}).encode())
+
+    def iter_raw(self, response, chunk_size):
+        yield response.body
+
+
+def _tracker(**kwargs):
+    # every reading of the timer is one second after the previous
+    ticks = itertools.count(100)
+    return lifecycle.LifecycleTracker(timer=lambda: float(next(ticks)), **kwargs)
+
+
+def _client(tracker, *answers):
+    return Client(key='key', private_key='c2VjcmV0', transport=ScriptedTransport(*answers),
+                  lifecycle=tracker, queries_per_second=1000)
+
+
+def _ack(*txids):
+    return 200, {'descr': {'order': 'buy'}, 'txid': list(txids)}
+
+
+def test_stages_and_visibility():
+    tracker = _tracker()
+    client = _client(tracker, _ack('OA'), (200, {'open': {'OX': {}, 'OA': {'userref': 0}}}),
+                     (200, {'open': {'OA': {}}}))
+    client.kprivate_addorder(pair='XXBTZUSD', typeo='buy', ordertype='limit', price='1',
+                             volume='1', tick=98.0)
+    stats = tracker.stats()['limit']
+    for stage in (lifecycle.VALIDATE, lifecycle.LIMITER, lifecycle.SIGN, lifecycle.NETWORK,
+                  lifecycle.RESPONSE):
+        assert stats[stage] == {'count': 1, 'p50': 1.0, 'p99': 1.0, 'p999': 1.0}
+    assert stats[lifecycle.ACK]['p50'] == 5.0
+    assert stats[lifecycle.TICK_TO_ACK]['p50'] == 7.0
+    assert tracker.pending() == 1
+
+    client.kprivate_openorders()
+    assert tracker.stats('limit')['limit'][lifecycle.VISIBLE]['p50'] == 1.0
+    assert tracker.pending() == 0
+    client.kprivate_openorders()
+    assert tracker.stats()['limit'][lifecycle.VISIBLE]['count'] == 1
+
+
+def test_retries_add_up_and_prepared_orders():
+    tracker = _tracker()
+    client = _client(tracker, (503, {}), _ack('OB'), _ack('OC'))
+    client.kprivate_addorder(pair='XXBTZUSD', typeo='sell', ordertype='market', volume='1')
+    stats = tracker.stats()['market']
+    assert stats[lifecycle.NETWORK]['p50'] == 2.0
+    assert stats[lifecycle.SIGN]['p50'] == 2.0
+    assert stats[lifecycle.RESPONSE]['p50'] == 1.0
+    assert lifecycle.TICK_TO_ACK not in stats
+
+    order = client.prepare_addorder(pair='XXBTZUSD', typeo='sell', ordertype='market')
+    order.send(volume='1')
+    assert tracker.stats()['market'][lifecycle.ACK]['count'] == 2
+    assert tracker.pending() == 2
+
+
+def test_throttle_is_a_limiter_wait(monkeypatch):
+    events = []
+
+    class Transport(ScriptedTransport):
+        def post(self, *args, **kwargs):
+            events.append('post')
+            return super(Transport, self).post(*args, **kwargs)
+
+    tracker = _tracker()
+    client = Client(key='key', private_key='c2VjcmV0', lifecycle=tracker, queries_per_second=1,
+                    transport=Transport(_ack('OE'), _ack('OF')))
+    monkeypatch.setattr('pykraken.client.time.sleep', lambda seconds: events.append('sleep'))
+    for _ in range(2):
+        client.kprivate_addorder(pair='XXBTZUSD', typeo='buy', ordertype='market', volume='1')
+    # the throttle holds the second order back before it is sent, not after
+    assert events == ['post', 'sleep', 'post']
+    stats = tracker.stats()['market']
+    assert stats[lifecycle.LIMITER] == {'count': 2, 'p50': 1.0, 'p99': 1.0, 'p999': 1.0}
+    assert stats[lifecycle.NETWORK]['p50'] == 1.0
+
+
+def test_failed_order_correlated_by_userref():
+    tracker = _tracker()
+    client = _client(tracker, (200, IOError('reset')),
+                     (200, {'closed': {'OOLD': {'userref': 7, 'opentm': 1.0},
+                                       'OD': {'userref': 7, 'opentm': time.time()}},
+                            'count': 2}))
+    with pytest.raises(TransportError):
+        client.kprivate_addorder(pair='XXBTZUSD', typeo='buy', ordertype='limit', price='1',
+                                 volume='1', userref=7)
+    assert tracker.errors == {'limit': 1}
+    assert lifecycle.ACK not in tracker.stats().get('limit', {})
+    assert tracker.pending() == 1
+    client.kprivate_closedorders()
+    assert tracker.pending() == 0
+    assert tracker.stats()['limit'][lifecycle.VISIBLE]['count'] == 1
+
+
+def test_pending_bounded():
+    tracker = _tracker(max_pending=2, pending_seconds=1000)
+    for i in range(4):
+        timing = tracker.begin('limit')
+        tracker.acknowledged(timing, {'txid': ['O{}'.format(i)]})
+    assert tracker.pending() == 2
+    assert tracker.observe({'O0': {}, 'O3': {}}) == 1
+
+
+def test_rolling_quantiles():
+    series = lifecycle.RollingQuantiles(window=1000)
+    assert series.quantiles()['p50'] is None
+    for value in range(2000):
+        series.add(float(value))
+    assert series.count == 2000
+    assert series.quantiles() == {'p50': 1500.0, 'p99': 1990.0, 'p999': 1999.0}
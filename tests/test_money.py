@@ -0,0 +1,82 @@
+from decimal import Decimal
+
+import pytest
+
+from pykraken.convert import format_number, format_scaled, parse_scaled
+from pykraken.endpoints import ADD_ORDER
+from pykraken.money import Fixed, PairScales, ROUND_UP, ROUND_HALF_EVEN
+
+PAIRS = {
+    'XXBTZUSD': {'altname': 'XBTUSD', 'pair_decimals': 1, 'lot_decimals': 8},
+    'XETHZEUR': {'altname': 'ETHEUR', 'pair_decimals': 2, 'lot_decimals': 8},
+}
+
+
+def test_parse_and_format_scaled():
+    assert parse_scaled('3741.00000', 5) == 374100000
+    assert parse_scaled('-0.50', 2) == -50
+    assert parse_scaled('-.5', 2) == -50
+    assert parse_scaled('1.5e-5', 8) == 1500
+    assert parse_scaled('1.239', 2) == 123
+    assert parse_scaled('12', 3) == 12000
+    assert format_scaled(374100000, 5) == '3741.00000'
+    assert format_scaled(-50, 2) == '-0.50'
+    assert format_scaled(7, 0) == '7'
+    for text in ('0.00000001', '-12.30000000', '99999.99999999'):
+        assert format_scaled(parse_scaled(text, 8), 8) == text
+
+
+def test_fixed_arithmetic():
+    price = Fixed.parse('9990.1', 1)
+    volume = Fixed.parse('0.25000000', 8)
+    cost = price * volume
+    assert cost.decimals == 9
+    assert str(cost) == '2497.525000000'
+    assert cost.to_decimal() == Decimal('2497.525')
+    assert str(price + Fixed.parse('0.05', 2)) == '9990.15'
+    assert str(price - 10000) == '-9.9'
+    assert str(-volume * 3) == '-0.75000000'
+    assert sum([volume] * 4, Fixed(0, 8)) == 1
+    assert Fixed.parse('1.10', 2) == Fixed.parse('1.1', 1)
+    assert hash(Fixed.parse('1.10', 2)) == hash(Fixed.parse('1.1', 1))
+    assert hash(Fixed(5, 0)) == hash(Fixed(500, 2)) == hash(5)
+    assert {Fixed(-300, 2): 'a'}[-3] == 'a'
+    assert Fixed.parse('1.1', 1) < Fixed.parse('1.11', 2)
+    assert not Fixed(0, 8)
+    assert float(volume) == 0.25
+    with pytest.raises(TypeError):
+        price < 1.5
+
+
+def test_quantize():
+    value = Fixed.parse('-1.25', 2)
+    assert str(value.quantize(1)) == '-1.2'
+    assert str(value.quantize(1, ROUND_UP)) == '-1.3'
+    assert str(value.quantize(1, ROUND_HALF_EVEN)) == '-1.2'
+    assert str(Fixed.parse('1.35', 2).quantize(1, ROUND_HALF_EVEN)) == '1.4'
+    assert str(value.quantize(4)) == '-1.2500'
+
+
+def test_pair_scales():
+    scales = PairScales(PAIRS)
+    assert scales.decimals('XBTUSD') == (1, 8)
+    assert str(scales.price('XETHZEUR', 250.129)) == '250.12'
+    assert str(scales.price('XETHZEUR', '250.125', ROUND_HALF_EVEN)) == '250.12'
+    assert str(scales.volume('XXBTZUSD', 1e-5)) == '0.00001000'
+    assert str(scales.volume('XXBTZUSD', Fixed.parse('0.123456789', 9), ROUND_UP)) == '0.12345679'
+    with pytest.raises(KeyError):
+        scales.decimals('XLTCZUSD')
+    row = scales.trades_parser('XBTUSD')(['9990.1', '0.01000000', 1500000000.1234, 'b', 'l', ''])
+    assert row[:2] == (Fixed(99901, 1), Fixed(1000000, 8))
+    assert row[2:] == (1500000000.1234, 'b', 'l', '')
+
+
+def test_order_numbers():
+    assert format_number(1e-05) == '0.00001'
+    assert format_number(0.1) == '0.1'
+    assert format_number(Decimal('1E+3')) == '1000'
+    assert format_number('+5.0') == '+5.0'
+    params = ADD_ORDER.encode(pair='XBTUSD', typeo='buy', ordertype='limit',
+                              price=Fixed.parse('9990.1', 1), volume=0.00001)
+    assert params['price'] == '9990.1'
+    assert params['volume'] == '0.00001'
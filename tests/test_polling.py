@@ -0,0 +1,115 @@
+import pytest
+
+from pykraken.polling import AdaptivePoller, TICKER, TRADES
+
+
+class FakeMarket(object):
+    """Trades arriving at a fixed rate per pair, on a fake clock."""
+
+    def __init__(self, rates):
+        self.rates = rates
+        self.now = 0.0
+        self.requests = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def _count(self, pair):
+        return int(self.now * self.rates[pair])
+
+    def kpublic_trades(self, pair=None, since=None):
+        self.requests.append(pair[0])
+        count = self._count(pair[0])
+        rows = [['1.0', '1.0', float(i)] for i in range(int(since or 0), count)]
+        return {pair[0]: rows, 'last': str(count)}
+
+    def kpublic_ticker(self, pair=None):
+        self.requests.append(pair[0])
+        count = self._count(pair[0])
+        return {pair[0]: {'t': [count, count], 'b': ['1.0', '1', '1'], 'a': ['1.1', '1', '1']}}
+
+
+def _run(poller, market, seconds):
+    while market.now < seconds:
+        poller.poll_next()
+
+
+@pytest.mark.parametrize('kind', [TRADES, TICKER])
+def test_budget_follows_change_rates(kind):
+    market = FakeMarket({'HOT': 5.0, 'WARM': 0.2, 'QUIET': 0.0})
+    poller = AdaptivePoller(market, sorted(market.rates), kind=kind, budget=1.0, min_interval=1.5,
+                            max_interval=60, half_life=60, local_time=market.time,
+                            sleep=market.sleep)
+    _run(poller, market, 1800)
+    allocation = poller.allocation()
+    assert allocation['QUIET']['interval'] == pytest.approx(60)
+    assert allocation['HOT']['interval'] < allocation['WARM']['interval'] < 60
+    assert sum(a['polls_per_second'] for a in allocation.values()) == pytest.approx(1.0)
+    assert allocation['HOT']['rate'] == pytest.approx(5.0, rel=0.2)
+    # the requests sent stay within the budget
+    assert len(market.requests) <= 1800 * 1.0 + 3
+
+
+def test_clamps_to_min_interval():
+    market = FakeMarket({'A': 10.0, 'B': 10.0})
+    poller = AdaptivePoller(market, ['A', 'B'], budget=5.0, min_interval=1.0,
+                            local_time=market.time, sleep=market.sleep)
+    _run(poller, market, 300)
+    for a in poller.allocation().values():
+        assert a['interval'] == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize('budget,rates', [
+    (2.0, (100.0, 1e-6, 1e-6)),
+    (3.0, (1000.0, 50.0, 1e-6, 0.0, 0.0)),
+    (0.05, (5.0, 0.0, 0.0, 0.0)),
+    (1.0, (1.0, 1.0, 1.0)),
+])
+def test_allocations_sum_to_budget(budget, rates):
+    names = ['P{}'.format(i) for i in range(len(rates))]
+    poller = AdaptivePoller(FakeMarket({}), names, budget=budget, min_interval=1.0,
+                            max_interval=60.0)
+    for name, rate in zip(names, rates):
+        poller._pairs[name].rate = rate
+    poller._allocate()
+    allocation = poller.allocation()
+    assert sum(a['polls_per_second'] for a in allocation.values()) == pytest.approx(budget)
+    for a in allocation.values():
+        assert 1.0 - 1e-9 <= a['interval'] <= max(60.0, len(rates) / budget) + 1e-9
+
+
+def test_budget_must_be_positive():
+    for budget in (0, -1):
+        with pytest.raises(ValueError):
+            AdaptivePoller(FakeMarket({}), ['A'], budget=budget)
+
+
+def test_small_budget_is_shared_evenly():
+    market = FakeMarket(dict(('P{}'.format(i), 0.0) for i in range(10)))
+    poller = AdaptivePoller(market, sorted(market.rates), budget=0.1, max_interval=60,
+                            local_time=market.time, sleep=market.sleep)
+    assert set(round(a['interval']) for a in poller.allocation().values()) == set([100])
+
+
+def test_callback_and_errors():
+    market = FakeMarket({'A': 1.0})
+    seen = []
+    poller = AdaptivePoller(market, ['A'], callback=lambda *args: seen.append(args),
+                            local_time=market.time, sleep=market.sleep)
+    market.now = 10
+    poller.poll_next()
+    market.now = 20
+    assert poller.poll_next() == ('A', 10)
+    assert seen[-1][0] == 'A' and len(seen[-1][1]) == 10
+
+    def failing(pair=None, since=None):
+        raise ValueError('down')
+    market.kpublic_trades = failing
+    with pytest.raises(ValueError):
+        poller.poll_next()
+    assert poller.allocation()['A']['polls'] == 2
+    with pytest.raises(ValueError):
+        AdaptivePoller(market, ['A'], kind='ohlc')
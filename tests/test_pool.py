@@ -0,0 +1,114 @@
+import json
+import threading
+
+import pytest
+
+from pykraken.pool import ClientPool
+
+try:  # Python 3
+    from urllib.parse import parse_qsl
+except ImportError:  # Python 2
+    from urlparse import parse_qsl
+
+CREDENTIALS = [('key0', 'c2VjcmV0'), ('key1', 'c2VjcmV0'), ('key2', 'c2VjcmV0')]
+
+
+class _Response(object):
+    status_code = 200
+    headers = {}
+
+    def __init__(self, body):
+        self.body = body
+
+    def close(self):
+        pass
+
+
+class KeyRecordingTransport(object):
+    """Records the key of each request and answers QueryOrders with the txids asked for."""
+
+    def __init__(self):
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def post(self, url, data, headers, **kwargs):
+        params = dict(parse_qsl(data))
+        with self._lock:
+            self.sent.append((url.rsplit('/', 1)[-1], headers['API-Key'], params))
+        if url.endswith('QueryOrders'):
+            result = dict((txid, {'status': 'open'}) for txid in params['txid'].split(','))
+        elif url.endswith('AddOrder'):
+            result = {'descr': {}, 'txid': ['O{}'.format(len(self.sent))]}
+        else:
+            result = {}
+        return _Response(json.dumps({'error': [], 'result': result}).encode())
+
+    def iter_raw(self, response, chunk_size):
+        yield response.body
+
+    def keys(self, method):
+        return [key for name, key, params in self.sent if name == method]
+
+
+@pytest.fixture
+def transport():
+    return KeyRecordingTransport()
+
+
+@pytest.fixture
+def pool(transport):
+    return ClientPool(CREDENTIALS, queries_per_second=1, burst=5, trading_key=1,
+                      transport=transport)
+
+
+def test_reads_go_to_the_key_with_most_budget(pool, transport):
+    for _ in range(6):
+        pool.kprivate_balance()
+    assert sorted(transport.keys('Balance')) == ['key0', 'key0', 'key1', 'key1', 'key2', 'key2']
+    pool.kprivate_balance(key=2)
+    assert transport.keys('Balance')[-1] == 'key2'
+
+
+def test_orders_pinned_to_their_key(pool, transport):
+    order = dict(pair='XXBTZUSD', typeo='buy', ordertype='limit', price='1', volume='1')
+    first = pool.kprivate_addorder(**order)['txid'][0]
+    second = pool.kprivate_addorder(key=2, **order)['txid'][0]
+    pool.kprivate_cancelorder(txid=second)
+    pool.kprivate_cancelorder(txid=first)
+    pool.kprivate_cancelorder(txid='placed elsewhere')
+    pool.kprivate_cancelorder(txid=first, key=0)
+    assert transport.keys('AddOrder') == ['key1', 'key2']
+    assert transport.keys('CancelOrder') == ['key2', 'key1', 'key1', 'key0']
+
+
+def test_order_keys_forgotten_once_cancelled_or_beyond_max_orders(transport):
+    pool = ClientPool(CREDENTIALS, queries_per_second=100, burst=100, trading_key=1,
+                      max_orders=2, transport=transport)
+    order = dict(pair='XXBTZUSD', typeo='buy', ordertype='limit', price='1', volume='1')
+    txids = [pool.kprivate_addorder(key=2, **order)['txid'][0] for _ in range(3)]
+    assert list(pool._order_keys) == txids[1:]
+    pool.kprivate_cancelorder(txid=txids[2])
+    assert list(pool._order_keys) == txids[1:2]
+    # the oldest order was forgotten: cancelled with the trading key
+    pool.kprivate_cancelorder(txid=txids[0])
+    assert transport.keys('CancelOrder') == ['key2', 'key1']
+
+
+def test_utilisation(pool):
+    pool.kprivate_balance(key=0)
+    pool.kprivate_balance(key=0)
+    pool.kprivate_tradebalance(key=1)
+    usage = pool.utilisation()
+    assert [u['key'] for u in usage] == ['key0', 'key1', 'key2']
+    assert [u['calls'] for u in usage] == [2, 1, 0]
+    assert [u['share'] for u in usage] == pytest.approx([2 / 3.0, 1 / 3.0, 0])
+    assert [u['acquired'] for u in usage] == [2, 1, 0]
+    assert usage[2]['available'] == pytest.approx(5)
+
+
+def test_bulk_chunks_spread_across_keys(pool, transport):
+    txids = ['O{:02d}'.format(i) for i in range(60)]
+    result = pool.kprivate_queryorders_bulk(txids)
+    assert sorted(result) == txids
+    assert sorted(transport.keys('QueryOrders')) == ['key0', 'key1', 'key2']
+    assert [u['calls'] for u in pool.utilisation()] == [1, 1, 1]
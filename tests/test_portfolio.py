@@ -0,0 +1,84 @@
+import pytest
+
+from pykraken.portfolio import ConversionGraph, Portfolio, Hop, SELL, BUY
+
+PAIRS = {
+    'XXBTZUSD': {'base': 'XXBT', 'quote': 'ZUSD'},
+    'XXBTZEUR': {'base': 'XXBT', 'quote': 'ZEUR'},
+    'XETHXXBT': {'base': 'XETH', 'quote': 'XXBT'},
+    'XETHZEUR': {'base': 'XETH', 'quote': 'ZEUR'},
+    'ZEURZUSD': {'base': 'ZEUR', 'quote': 'ZUSD'},
+    'XXBTZUSD.d': {'base': 'XXBT', 'quote': 'ZUSD'},
+}
+
+
+def _ticker(bid, ask):
+    return {'b': [str(bid), '1', '1.0'], 'a': [str(ask), '1', '1.0']}
+
+
+TICKERS = {
+    'XXBTZUSD': _ticker(9990, 10010),
+    'XXBTZEUR': _ticker(8000, 8100),
+    'XETHXXBT': _ticker(0.0299, 0.0301),
+    'XETHZEUR': _ticker(250, 260),
+    'ZEURZUSD': _ticker(1.199, 1.201),
+}
+
+
+class FakeClient(object):
+
+    def __init__(self):
+        self.ticker_calls = []
+
+    def kpublic_assetpairs(self):
+        return PAIRS
+
+    def kpublic_ticker(self, pair):
+        self.ticker_calls.append(list(pair))
+        return dict((p, TICKERS[p]) for p in pair)
+
+    def kprivate_balance(self):
+        return {'XXBT': '2.0', 'XETH': '10', 'ZUSD': '100.5', 'KFEE': '1000'}
+
+
+def test_shortest_paths():
+    graph = ConversionGraph(PAIRS)
+    assert graph.shortest('XXBT', 'ZUSD') == [Hop('XXBTZUSD', SELL)]
+    assert graph.shortest('ZUSD', 'XETH') in ([Hop('XXBTZUSD', BUY), Hop('XETHXXBT', BUY)],
+                                               [Hop('ZEURZUSD', BUY), Hop('XETHZEUR', BUY)])
+    assert graph.shortest('KFEE', 'ZUSD') is None
+
+
+def test_refresh_uses_one_ticker_request():
+    client = FakeClient()
+    portfolio = Portfolio(client, quote='ZUSD')
+    total = portfolio.refresh()
+    assert len(client.ticker_calls) == 1
+    assert portfolio.values['XXBT'] == pytest.approx(20000)
+    assert portfolio.values['ZUSD'] == pytest.approx(100.5)
+    assert portfolio.unpriced == ['KFEE']
+    assert total == pytest.approx(sum(portfolio.values.values()))
+
+
+def test_cheapest_route_and_incremental_updates():
+    client = FakeClient()
+    portfolio = Portfolio(client, quote='ZUSD', route='cheapest', max_hops=2)
+    portfolio.refresh()
+    # XETH/XXBT then XXBT/ZUSD has tighter spreads than XETH/ZEUR then ZEUR/ZUSD
+    assert portfolio.paths['XETH'] == [Hop('XETHXXBT', SELL), Hop('XXBTZUSD', SELL)]
+    assert len(client.ticker_calls) == 1
+    assert portfolio.values['XETH'] == pytest.approx(10 * 0.03 * 10000)
+
+    revalued = portfolio.update_prices({'XXBTZUSD': _ticker(19990, 20010), 'ZEURZUSD': TICKERS['ZEURZUSD']})
+    assert revalued == set(['XXBT', 'XETH'])
+    assert portfolio.values['XXBT'] == pytest.approx(40000)
+    assert portfolio.total == pytest.approx(40000 + 6000 + 100.5)
+
+    portfolio.update_balance('XXBT', '1')
+    assert portfolio.total == pytest.approx(20000 + 6000 + 100.5)
+
+
+def test_liquidation_prices():
+    portfolio = Portfolio(FakeClient(), quote='ZUSD', price='bid')
+    portfolio.refresh({'XXBT': '1', 'ZEUR': '100'})
+    assert portfolio.values == {'XXBT': 9990.0, 'ZEUR': pytest.approx(119.9)}
@@ -0,0 +1,106 @@
+import base64
+import hashlib
+import hmac
+
+import pytest
+
+from pykraken.client import Client
+from pykraken.endpoints import ADD_ORDER
+from pykraken.exceptions import BadParamterError, RequiredParameterError
+
+try:  # Python 3
+    from urllib.parse import parse_qsl
+except ImportError:  # Python 2
+    from urlparse import parse_qsl
+
+SECRET = base64.b64encode(b'prepared secret').decode()
+BODY = b'{"error": [], "result": {"descr": {"order": "buy"}, "txid": ["OABCDE-FGHIJ-KLMNOP"]}}'
+
+
+class _Response(object):
+    status_code = 200
+    headers = {}
+
+    def close(self):
+        pass
+
+
+class RecordingTransport(object):
+
+    def __init__(self):
+        self.sent = []
+
+    def post(self, url, data, headers, **kwargs):
+        self.sent.append((url, data, headers, kwargs))
+        return _Response()
+
+    def iter_raw(self, response, chunk_size):
+        yield BODY
+
+
+def _expected_signature(path, postdata):
+    nonce = dict(parse_qsl(postdata))['nonce']
+    message = path.encode() + hashlib.sha256((nonce + postdata).encode()).digest()
+    return base64.b64encode(hmac.new(base64.b64decode(SECRET), message,
+                                     hashlib.sha512).digest()).decode()
+
+
+@pytest.fixture
+def client():
+    return Client(key='key', private_key=SECRET, transport=RecordingTransport())
+
+
+def test_prepared_matches_regular_request(client):
+    client.kprivate_addorder(pair='XXBTZUSD', typeo='buy', ordertype='limit', price='9990.1',
+                             volume='0.01', oflags=['post'])
+    order = client.prepare_addorder(pair='XXBTZUSD', typeo='buy', ordertype='limit',
+                                    oflags=['post'])
+    assert order.variables == ('price', 'volume')
+    result = order.send(price='9990.1', volume=0.01)
+    assert result['txid'] == ['OABCDE-FGHIJ-KLMNOP']
+
+    (url1, data1, headers1, kwargs1), (url2, data2, headers2, kwargs2) = client.transport.sent
+    assert url1 == url2 == client.base_url + ADD_ORDER.path
+    params1, params2 = dict(parse_qsl(data1)), dict(parse_qsl(data2))
+    assert int(params2.pop('nonce')) > int(params1.pop('nonce'))
+    assert params1 == params2
+    assert headers2['API-Sign'] == _expected_signature(ADD_ORDER.path, data2)
+    del headers1['API-Sign'], headers2['API-Sign']
+    assert headers1 == headers2
+    assert kwargs1 == kwargs2
+
+
+def test_prepared_cancel_and_userref(client):
+    cancel = client.prepare_cancelorder()
+    cancel.send(txid='OABCDE-FGHIJ-KLMNOP')
+    assert dict(parse_qsl(client.transport.sent[-1][1]))['txid'] == 'OABCDE-FGHIJ-KLMNOP'
+
+    order = client.prepare_addorder(pair='XXBTZUSD', typeo='sell', ordertype='market',
+                                    variables=('volume', 'userref'))
+    order.send(volume='1', userref=7)
+    params = dict(parse_qsl(client.transport.sent[-1][1]))
+    assert params['userref'] == '7' and params['ordertype'] == 'market'
+    with pytest.raises(RequiredParameterError):
+        order.send(volume='1')
+
+    limit = client.prepare_addorder(pair='XXBTZUSD', typeo='buy', ordertype='limit')
+    sent = len(client.transport.sent)
+    with pytest.raises(ValueError):
+        limit.encode(price='100', volume='1', userref=5)
+    with pytest.raises(ValueError):
+        limit.send(price='100', volume='1', userref=5)
+    assert len(client.transport.sent) == sent
+
+
+def test_prepare_validates_once(client):
+    with pytest.raises(BadParamterError):
+        client.prepare_addorder(pair='XXBTZUSD', typeo='hold', ordertype='limit')
+    with pytest.raises(BadParamterError):
+        # market orders take no price
+        client.prepare_addorder(pair='XXBTZUSD', typeo='buy', ordertype='market',
+                                variables=('price', 'volume'))
+    with pytest.raises(RequiredParameterError):
+        client.prepare_addorder(pair='XXBTZUSD', typeo='buy', ordertype='limit',
+                                variables=('price',))
+    with pytest.raises(ValueError):
+        client.prepare_addorder(pair='XXBTZUSD', typeo='buy', ordertype='limit', colour='red')
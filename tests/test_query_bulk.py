@@ -0,0 +1,82 @@
+import threading
+
+import pytest
+
+from pykraken import kprivate
+from pykraken.endpoints import QUERY_ORDERS, QUERY_TRADES, QUERY_LEDGERS
+from pykraken.exceptions import ApiError
+
+
+class FakeClient(object):
+    """Answers the Query* endpoints from a dict of known entries."""
+
+    def __init__(self, entries, fail=None):
+        self.entries = entries
+        self.fail = fail
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def _post(self, url, params):
+        ids = (params.get('txid') or params.get('id')).split(',')
+        assert len(ids) <= 20
+        with self._lock:
+            self.requests.append((url, ids))
+        if self.fail in ids:
+            raise ApiError(['EGeneral:Internal error'])
+        return {'error': [], 'result': dict((i, self.entries[i]) for i in ids if i in self.entries)}
+
+
+def _orders(n, status='closed'):
+    return dict(('O{}'.format(i), {'status': status, 'vol': '1'}) for i in range(n))
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_chunks_and_merges(workers):
+    client = FakeClient(_orders(95))
+    ids = ['O{}'.format(i) for i in range(95)] + ['O3']
+    result = kprivate.kprivate_queryorders_bulk(client, ids, workers=workers)
+    assert sorted(result) == sorted(set(ids))
+    assert sorted(len(chunk) for _, chunk in client.requests) == [15, 20, 20, 20, 20]
+    assert set(url for url, _ in client.requests) == set([QUERY_ORDERS.path])
+
+
+def test_cache_serves_known_ids():
+    entries = _orders(30)
+    entries.update(('P{}'.format(i), {'status': 'open', 'vol': '1'}) for i in range(5))
+    client = FakeClient(entries)
+    cache = {}
+    ids = sorted(entries)
+    kprivate.kprivate_queryorders_bulk(client, ids, cache=cache)
+    # open orders still change, they are not cached
+    assert sorted(cache) == sorted(_orders(30))
+    client.requests = []
+    assert kprivate.kprivate_queryorders_bulk(client, ids, cache=cache) == entries
+    assert [chunk for _, chunk in client.requests] == [['P{}'.format(i) for i in range(5)]]
+
+
+def test_trades_and_ledgers():
+    trades = dict(('T{}'.format(i), {'price': '1'}) for i in range(45))
+    client = FakeClient(trades)
+    assert kprivate.kprivate_querytrades_bulk(client, ','.join(sorted(trades))) == trades
+    assert len(client.requests) == 3
+    assert client.requests[0][0] == QUERY_TRADES.path
+
+    ledger = dict(('L{}'.format(i), {'amount': '1'}) for i in range(21))
+    client = FakeClient(ledger)
+    cache = {}
+    assert kprivate.kprivate_queryledgers_bulk(client, sorted(ledger), cache=cache) == ledger
+    assert cache == ledger
+    assert client.requests[0][0] == QUERY_LEDGERS.path
+
+
+def test_failed_chunk_keeps_fetched_ones():
+    trades = dict(('T{:02d}'.format(i), {'price': '1'}) for i in range(60))
+    client = FakeClient(trades, fail='T45')
+    cache = {}
+    with pytest.raises(ApiError):
+        kprivate.kprivate_querytrades_bulk(client, sorted(trades), cache=cache)
+    assert len(cache) == 40
+    client.fail = None
+    client.requests = []
+    kprivate.kprivate_querytrades_bulk(client, sorted(trades), cache=cache)
+    assert len(client.requests) == 1
@@ -0,0 +1,46 @@
+import pytest
+
+from pykraken.records import RecordWriter, RecordReader, TRADE, OHLC, FLAG_SELL, FLAG_MARKET
+
+
+TRADES = [
+    ['3741.00000', '0.01000000', 1499999999.1234, 'b', 'l', ''],
+    ['3742.10000', '1.50000000', 1500000000.5, 's', 'm', ''],
+    ['3740.00000', '0.20000000', 1500000003.0, 'b', 'm', ''],
+]
+
+
+def test_trades_roundtrip(tmpdir):
+    path = str(tmpdir.join('trades.bin'))
+    with RecordWriter(path, TRADE, price_decimals=5) as w:
+        assert w.append(TRADES) == 3
+
+    with RecordReader(path) as r:
+        assert len(r) == 3
+        assert r[0] == (1499999999123400, 374100000, 1000000, 0)
+        assert r[-2].flags == FLAG_SELL | FLAG_MARKET
+        prices = r.column('price')
+        assert list(prices) == [374100000, 374210000, 374000000]
+        prices.release()
+        assert r.search(1500000000) == 1
+        assert [t.volume for t in r.between(1500000000, 1500000003)] == [150000000]
+
+
+def test_append_and_refresh(tmpdir):
+    path = str(tmpdir.join('trades.bin'))
+    with RecordWriter(path, TRADE) as w:
+        w.append(TRADES[:1])
+    r = RecordReader(path)
+    assert len(r) == 1
+    with RecordWriter(path, TRADE) as w:
+        w.append(TRADES[1:])
+    r.refresh()
+    assert [t.time for t in r] == [1499999999123400, 1500000000500000, 1500000003000000]
+    r.close()
+
+
+def test_kind_mismatch(tmpdir):
+    path = str(tmpdir.join('trades.bin'))
+    RecordWriter(path, TRADE).close()
+    with pytest.raises(ValueError):
+        RecordWriter(path, OHLC)
@@ -0,0 +1,38 @@
+from pykraken.resample import BarBuilder, Bar, bars_from_trades, resample_bars
+
+
+def test_bars_from_trades():
+    trades = [['10', '1', 0.5, 'b', 'l', ''], ['12', '3', 100, 's', 'l', ''],
+              ['9', '1', 179.9, 'b', 'm', ''], ['11', '2', 185, 'b', 'l', '']]
+    assert bars_from_trades(trades, 180) == [
+        Bar(0, 10.0, 12.0, 9.0, 9.0, 11.0, 5.0, 3),
+        Bar(180, 11.0, 11.0, 11.0, 11.0, 11.0, 2.0, 1),
+    ]
+
+
+def test_builder_is_incremental():
+    builder = BarBuilder(60)
+    assert builder.add_trades([['10', '1', 1, 'b', 'l', '']]) == []
+    assert builder.current.close == 10.0
+    closed = builder.add_trades([['11', '1', 30, 'b', 'l', ''], ['12', '1', 61, 'b', 'l', '']])
+    assert closed == [Bar(0, 10.0, 11.0, 10.0, 11.0, 10.5, 2.0, 2)]
+    # late trades never reopen a closed bar
+    assert builder.add_trades([['1', '1', 59, 'b', 'l', '']]) == []
+    assert builder.current == Bar(60, 12.0, 12.0, 12.0, 12.0, 12.0, 1.0, 1)
+    assert builder.close_until(120) == [Bar(60, 12.0, 12.0, 12.0, 12.0, 12.0, 1.0, 1)]
+    # nor after close_until, which leaves no bar in progress
+    assert builder.add_trades([['2', '1', 90, 'b', 'l', '']]) == []
+    assert builder.add_bars([[60, '2', '2', '2', '2', '2', '1', 1]]) == []
+    assert builder.current is None
+    assert builder.add_trades([['13', '1', 120, 'b', 'l', '']]) == []
+    assert builder.current == Bar(120, 13.0, 13.0, 13.0, 13.0, 13.0, 1.0, 1)
+
+
+def test_resample_bars_replaces_uncommitted_bar():
+    builder = BarBuilder(120)
+    builder.add_bars([[0, '10', '12', '9', '11', '10', '2', 4], [60, '11', '11', '11', '11', '11', '1', 1]])
+    # kraken resends its last bar once more trades happened in it
+    builder.add_bars([[60, '11', '13', '11', '13', '12', '2', 3]])
+    assert builder.current == Bar(0, 10.0, 13.0, 9.0, 13.0, 11.0, 4.0, 7)
+    assert resample_bars([[0, '1', '2', '1', '2', '1.5', '1', 1], [120, '2', '2', '2', '2', '2', '1', 1]],
+                         120, include_current=False) == [Bar(0, 1.0, 2.0, 1.0, 2.0, 1.5, 1.0, 1)]
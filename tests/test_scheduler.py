@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+from pykraken.endpoints import PRIORITY_CANCEL, PRIORITY_TRADE, PRIORITY_MARKET_DATA, PRIORITY_HISTORY
+from pykraken.exceptions import DeadlineExceeded, Timeout
+from pykraken.ratelimit import RateLimiter
+from pykraken.scheduler import PriorityScheduler
+
+
+def _start(scheduler, priority, order, cost=1):
+    def run():
+        try:
+            scheduler.acquire(cost, priority)
+            order.append(priority)
+        except DeadlineExceeded:
+            order.append(('dropped', priority))
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def _wait_queued(scheduler, count):
+    while scheduler.queued() < count:
+        time.sleep(0.001)
+
+
+def test_urgent_requests_overtake_backlog():
+    scheduler = PriorityScheduler(RateLimiter(5, burst=1))
+    scheduler.acquire(1, PRIORITY_HISTORY)
+    order = []
+    threads = [_start(scheduler, PRIORITY_HISTORY, order) for _ in range(3)]
+    _wait_queued(scheduler, 3)
+    threads.append(_start(scheduler, PRIORITY_MARKET_DATA, order))
+    threads.append(_start(scheduler, PRIORITY_TRADE, order))
+    threads.append(_start(scheduler, PRIORITY_CANCEL, order))
+    for thread in threads:
+        thread.join()
+    assert order == [PRIORITY_CANCEL, PRIORITY_TRADE, PRIORITY_MARKET_DATA] + [PRIORITY_HISTORY] * 3
+    assert scheduler.dispatched[PRIORITY_HISTORY] == 4
+
+
+def test_expired_requests_are_dropped_unsent():
+    limiter = RateLimiter(2, burst=1)
+    scheduler = PriorityScheduler(limiter, deadlines={PRIORITY_MARKET_DATA: 0.1})
+    scheduler.acquire(1, PRIORITY_CANCEL)
+    with pytest.raises(DeadlineExceeded):
+        scheduler.acquire(1, PRIORITY_MARKET_DATA)
+    assert scheduler.dropped == {PRIORITY_MARKET_DATA: 1}
+    # no token was taken for the dropped request
+    assert limiter.acquired == 1
+    # a deadline is also a Timeout for callers
+    with pytest.raises(Timeout):
+        with scheduler.deadline(0.05):
+            scheduler.acquire(1, PRIORITY_CANCEL)
+    scheduler.acquire(1, PRIORITY_CANCEL)
+    assert scheduler.queued() == 0
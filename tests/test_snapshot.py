@@ -0,0 +1,115 @@
+import subprocess
+import sys
+import uuid
+
+import pytest
+
+from pykraken import snapshot
+
+pytestmark = pytest.mark.skipif(snapshot.shared_memory is None, reason='requires shared_memory')
+
+TICKER = {'a': ['10.5', '1', '1.000'], 'b': ['10.4', '2', '2.000'], 'c': ['10.45', '0.1'],
+          'v': ['1', '100'], 'p': ['10', '10.2'], 't': [1, 2], 'l': ['9', '9.5'],
+          'h': ['11', '11.5'], 'o': '10.1'}
+DEPTH = {'asks': [['10.5', '1', 1]], 'bids': [['10.4', '2', 1], ['10.3', '5', 1]]}
+
+
+class FakeClient(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def kpublic_ticker(self, pair):
+        self.calls.append(('ticker', list(pair)))
+        return dict((p, TICKER) for p in pair)
+
+    def kpublic_depth(self, pair, count):
+        self.calls.append(('depth', list(pair)))
+        return {pair[0]: DEPTH}
+
+
+def test_refresh_and_read_from_another_process():
+    name = 'pk_{}'.format(uuid.uuid4().hex[:12])
+    client = FakeClient()
+    service = snapshot.SnapshotService(client, ['XXBTZUSD', 'XETHZUSD'], name, depth_levels=3)
+    try:
+        service.refresh()
+        # one ticker request for all pairs
+        assert client.calls == [('ticker', ['XXBTZUSD', 'XETHZUSD']), ('depth', ['XXBTZUSD']),
+                                ('depth', ['XETHZUSD'])]
+        code = ("from pykraken.snapshot import SnapshotReader\n"
+                "r = SnapshotReader({!r})\n"
+                "t = r.top_of_book('XETHZUSD')\n"
+                "d = r.depth('XXBTZUSD')\n"
+                "print(t.bid, t.ask, d.asks, d.bids)\n"
+                "r.close()\n").format(name)
+        out = subprocess.check_output([sys.executable, '-c', code]).decode().strip()
+        assert out == '10.4 10.5 [(10.5, 1.0)] [(10.4, 2.0), (10.3, 5.0)]'
+    finally:
+        service.stop()
+
+
+def test_unwritten_pair_reads_none():
+    name = 'pk_{}'.format(uuid.uuid4().hex[:12])
+    writer = snapshot.SnapshotWriter(name, ['XXBTZUSD'], depth_levels=2)
+    try:
+        code = ("from pykraken.snapshot import SnapshotReader\n"
+                "r = SnapshotReader({!r})\n"
+                "print(r.ticker('XXBTZUSD'), r.depth('XXBTZUSD'))\n"
+                "r.close()\n").format(name)
+        assert subprocess.check_output([sys.executable, '-c', code]).decode().strip() == 'None None'
+    finally:
+        writer.close()
+
+
+def test_depth_only_pair_has_no_ticker():
+    name = 'pk_{}'.format(uuid.uuid4().hex[:12])
+    writer = snapshot.SnapshotWriter(name, ['XXBTZUSD', 'XETHZUSD'], depth_levels=2)
+    code = ("from pykraken.snapshot import SnapshotReader\n"
+            "r = SnapshotReader({!r})\n"
+            "print(r.ticker('XXBTZUSD'), r.top_of_book('XXBTZUSD'), r.depth('XXBTZUSD').asks,\n"
+            "      all(slot % 8 == 0 for slot in r.slots.values()))\n"
+            "r.close()\n").format(name)
+    try:
+        writer.write_depth('XXBTZUSD', DEPTH)
+        out = subprocess.check_output([sys.executable, '-c', code]).decode().strip()
+        # the sequence numbers are 8-byte aligned
+        assert out == 'None None [(10.5, 1.0)] True'
+        writer.write_ticker('XXBTZUSD', TICKER)
+        out = subprocess.check_output([sys.executable, '-c', code]).decode().strip()
+        assert out.startswith('Ticker(ask=10.5')
+    finally:
+        writer.close()
+
+
+
+class FailingClient(FakeClient):
+    """Fails the first tickers requests, then stops the service on the first success."""
+
+    def __init__(self, failures):
+        super(FailingClient, self).__init__()
+        self.failures = failures
+        self.service = None
+        self.failed_before_success = None
+
+    def kpublic_ticker(self, pair):
+        if self.failures:
+            self.failures -= 1
+            raise IOError('connection reset')
+        self.failed_before_success = self.service.failures
+        self.service._stop.set()
+        return super(FailingClient, self).kpublic_ticker(pair)
+
+
+def test_run_keeps_the_last_error():
+    name = 'pk_{}'.format(uuid.uuid4().hex[:12])
+    client = FailingClient(2)
+    service = snapshot.SnapshotService(client, ['XXBTZUSD'], name, interval=0)
+    client.service = service
+    try:
+        service.run()
+        assert client.failed_before_success == 2
+        assert service.failures == 0
+        assert str(service.last_error) == 'connection reset'
+    finally:
+        service.stop()
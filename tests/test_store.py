@@ -0,0 +1,77 @@
+from pykraken.store import HistoryStore
+
+
+class FakeClient(object):
+    """Serves a fixed list of trades and ledger entries the way kraken paginates them."""
+
+    def __init__(self, trades, ledger):
+        self.trades = trades
+        self.ledger = ledger
+        self.calls = 0
+
+    def kpublic_trades(self, pair=None, since=None):
+        self.calls += 1
+        since = int(since or 0)
+        rows = [t for t in self.trades if int(t[2]) > since][:1000]
+        last = str(int(rows[-1][2])) if rows else str(since)
+        return {pair[0]: rows, 'last': last}
+
+    def kprivate_ledgers(self, aclass=None, asset=None, typet=None, start=None, end=None, ofs=None):
+        self.calls += 1
+        entries = sorted(((k, v) for k, v in self.ledger.items() if v['time'] > float(start or 0)),
+                         key=lambda kv: -kv[1]['time'])
+        ofs = ofs or 0
+        return {'ledger': dict(entries[ofs:ofs + 50]), 'count': len(entries)}
+
+
+def _trade(t):
+    return ['100.0', '1.0', t, 'b', 'l', '']
+
+
+def test_sync_trades_incremental(tmpdir):
+    client = FakeClient([_trade(t) for t in range(1, 2501)], {})
+    store = HistoryStore(str(tmpdir))
+    assert store.sync_trades(client, 'XETHXXBT') == 2500
+    assert client.calls == 3
+    assert store.get_cursor('trades', 'XETHXXBT') == '2500'
+
+    client.trades.append(_trade(2501))
+    assert store.sync_trades(client, 'XETHXXBT') == 1
+    assert [r[2] for r in store.trades('XETHXXBT', start=2499, end=2502)] == [2499, 2500, 2501]
+
+
+def test_sync_ledgers_resumes_and_dedupes(tmpdir):
+    ledger = dict(('L{}'.format(i), {'time': float(i), 'amount': '1'}) for i in range(1, 121))
+    client = FakeClient([], ledger)
+    store = HistoryStore(str(tmpdir))
+    assert store.sync_ledgers(client) == 120
+    assert list(store.ledgers(start=119)) == ['L119', 'L120']
+
+    ledger['L121'] = {'time': 121.0, 'amount': '1'}
+    calls = client.calls
+    assert store.sync_ledgers(client) == 1
+    assert client.calls == calls + 1
+    assert len(store.ledgers()) == 121
+
+
+class SpreadClient(object):
+    """Serves spread points, several per second, from an inclusive since."""
+
+    def __init__(self, points):
+        self.points = points
+
+    def kpublic_spread(self, pair=None, since=None):
+        rows = [p for p in self.points if p[0] >= int(since or 0)]
+        return {pair[0]: rows, 'last': rows[-1][0] if rows else since}
+
+
+def test_sync_spread_keeps_points_of_the_same_second(tmpdir):
+    client = SpreadClient([[1, '1.0', '1.1'], [1, '1.0', '1.2'], [2, '1.1', '1.2']])
+    store = HistoryStore(str(tmpdir))
+    assert store.sync_spread(client, 'XETHXXBT') == 3
+    assert len(store.spread('XETHXXBT')) == 3
+    # the last second is served again, with a new point
+    client.points += [[2, '1.1', '1.3'], [3, '1.2', '1.3']]
+    store.sync_spread(client, 'XETHXXBT')
+    assert store.spread('XETHXXBT') == [[1, '1.0', '1.1'], [1, '1.0', '1.2'], [2, '1.1', '1.2'],
+                                        [2, '1.1', '1.3'], [3, '1.2', '1.3']]
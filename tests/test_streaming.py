@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from pykraken.exceptions import ApiError
+from pykraken.streaming import StreamingResult, Row
+
+
+def _chunks(body, size):
+    data = json.dumps(body).encode()
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 7, 4096])
+def test_trades_rows_and_last(size):
+    trades = [['3741.1', '0.5', 1499999999.1234, 'b', 'l', ''] for _ in range(50)]
+    result = StreamingResult(_chunks({'error': [], 'result': {'XETHXXBT': trades, 'last': 1500000000123}},
+                                     size))
+    rows = list(result.rows())
+    assert rows == trades
+    assert result.last == 1500000000123
+
+
+def test_depth_sides():
+    body = {'error': [], 'result': {'XETHXXBT': {'asks': [['10.1', '1', 1]], 'bids': [['9.9', '2', 2], ['9.8', '3', 3]]}}}
+    result = StreamingResult(_chunks(body, 5), row_parser=lambda r: float(r[0]))
+    assert list(result) == [Row('XETHXXBT', 'asks', 10.1), Row('XETHXXBT', 'bids', 9.9),
+                            Row('XETHXXBT', 'bids', 9.8)]
+
+
+def test_errors_raise():
+    with pytest.raises(ApiError):
+        list(StreamingResult(_chunks({'error': ['EQuery:Unknown asset pair'], 'result': {}}, 3)))
@@ -0,0 +1,110 @@
+import json
+import threading
+
+import pytest
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import pykraken.exceptions
+from pykraken.client import Client
+from pykraken import transport
+
+SECRET = 'c2VjcmV0'
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        self.server.requests.append((self.path, dict(self.headers), body))
+        data = json.dumps({'error': [], 'result': {'unixtime': 1500000000, 'rfc1123': 'x'}}).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    # one thread per connection, kept alive by the pooling transports
+    daemon_threads = True
+
+
+@pytest.fixture
+def server():
+    srv = _Server(('127.0.0.1', 0), _Handler)
+    srv.requests = []
+    thread = threading.Thread(target=srv.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_requests_transport_sends_signed_form(server):
+    client = Client(key='key', private_key=SECRET, base_url='http://127.0.0.1:{}'.format(server.server_port),
+                    connect_timeout=5, read_timeout=5)
+    assert client.kpublic_time() == (1500000000, 'x')
+    assert client.kpublic_time() == (1500000000, 'x')
+    assert [r[0] for r in server.requests] == ['/0/public/Time'] * 2
+    path, headers, body = server.requests[0]
+    assert 'API-Sign' not in headers and body == ''
+    client.kprivate_balance()
+    path, headers, body = server.requests[2]
+    assert headers['API-Key'] == 'key' and 'API-Sign' in headers
+    assert body.startswith('nonce=')
+
+
+@pytest.mark.skipif(transport.httpx is None, reason='requires httpx')
+def test_http2_timeouts_follow_connect_read():
+    from pykraken import _http2
+    timeout = _http2._timeout((2, 7))
+    assert (timeout.connect, timeout.read, timeout.write, timeout.pool) == (2, 7, 7, 2)
+    timeout = _http2._timeout(None)
+    assert timeout.read is None and timeout.connect is None
+
+
+@pytest.mark.skipif(transport.httpx is None, reason='requires httpx')
+def test_http2_transport_posts(server):
+    # the stand-in speaks HTTP/1.1, which the transport falls back to without ALPN
+    http2 = transport.Http2Transport()
+    try:
+        client = Client(key='key', private_key=SECRET, transport=http2, timeout=5,
+                        base_url='http://127.0.0.1:{}'.format(server.server_port))
+        threads = [threading.Thread(target=client.kpublic_time) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert client.kpublic_time() == (1500000000, 'x')
+        client.kprivate_balance()
+        response = http2.post('http://127.0.0.1:{}/0/public/Time'.format(server.server_port),
+                              '', {}, timeout=5)
+        assert response.status_code == 200 and response.json()['result']['rfc1123'] == 'x'
+        response.close()
+    finally:
+        http2.close()
+    assert [r[0] for r in server.requests] == ['/0/public/Time'] * 5 + [
+        '/0/private/Balance', '/0/public/Time']
+    path, headers, body = server.requests[5]
+    assert headers['API-Key'] == 'key' and 'API-Sign' in headers
+    assert body.startswith('nonce=')
+
+
+def test_transport_timeout_is_raised():
+    class SlowTransport(object):
+        def post(self, *args, **kwargs):
+            raise pykraken.exceptions.Timeout()
+
+    client = Client(key='key', private_key=SECRET, transport=SlowTransport())
+    with pytest.raises(pykraken.exceptions.Timeout):
+        client.kpublic_time()
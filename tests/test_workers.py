@@ -0,0 +1,136 @@
+import json
+import struct
+
+import pytest
+
+from pykraken import workers
+from pykraken.analytics import LedgerHistory
+from pykraken.client import Client
+from pykraken.exceptions import ApiError
+from pykraken.endpoints import DEPTH, LEDGERS, TRADES
+from pykraken.records import RecordReader, RecordWriter, TRADE
+
+
+def _trades(n, start=1500000000):
+    return [['{:.1f}'.format(9000 + i % 100), '0.01000000', '{:.4f}'.format(start + i * 0.5),
+             'b' if i % 2 else 's', 'l', ''] for i in range(n)]
+
+
+class FakeClient(object):
+    """Serves canned bodies, as Client._post_raw returns them."""
+
+    def __init__(self, results):
+        self.results = results
+        self.requests = []
+
+    def _post_raw(self, url, params):
+        self.requests.append((url, params))
+        return json.dumps({'error': [], 'result': self.results[url]}).encode()
+
+
+@pytest.fixture(scope='module')
+def pool():
+    with workers.DecodePool(processes=2) as pool:
+        yield pool
+
+
+def test_trades_packed_records(pool, tmpdir):
+    rows = _trades(500)
+    client = FakeClient({TRADES.path: {'XXBTZUSD': rows, 'last': '1500000250000000000'}})
+    data, count, last = pool.trades(client, 'XXBTZUSD', since='0', price_decimals=1).result()
+    assert client.requests == [(TRADES.path, {'pair': 'XXBTZUSD', 'since': '0'})]
+    assert (count, last) == (500, '1500000250000000000')
+    assert data == b''.join(TRADE.encode(r, 1, 8) for r in rows)
+
+    path = str(tmpdir.join('trades.pkr'))
+    with RecordWriter(path, TRADE, 1, 8) as writer:
+        assert writer.append_packed(data) == 500
+        with pytest.raises(ValueError):
+            writer.append_packed(data[:-1])
+    with RecordReader(path) as reader:
+        assert len(reader) == 500
+        assert reader[1].price == 90010
+
+
+def test_shared_memory_records():
+    rows = _trades(2000)
+    client = FakeClient({TRADES.path: {'XXBTZUSD': rows, 'last': '1'}})
+    with workers.DecodePool(processes=1, shared_min_bytes=0) as pool:
+        shared, count, _ = pool.trades(client, 'XXBTZUSD').result()
+    if workers.shared_memory is None:
+        pytest.skip('shared memory requires Python 3.8')
+    with shared:
+        assert isinstance(shared, workers.SharedBuffer)
+        assert len(shared) == count * TRADE.struct.size
+        assert struct.unpack_from('<4q', shared.buf, 0) == TRADE.struct.unpack(
+            TRADE.encode(rows[0], 8, 8))
+
+
+def test_bars_and_depth(pool):
+    client = FakeClient({
+        TRADES.path: {'XXBTZUSD': _trades(240), 'last': '1'},
+        DEPTH.path: {'XXBTZUSD': {'asks': [['9001.0', '1.5', 1], ['9002.0', '2', 1]],
+                                  'bids': [['8999.0', '0.5', 1]]}},
+    })
+    bars, _ = pool.bars(client, 'XXBTZUSD', 60).result()
+    assert len(bars) == 2
+    assert sum(b.count for b in bars) == 240
+    books = pool.depth(client, ['XXBTZUSD']).result()
+    prices, volumes = books['XXBTZUSD']['asks']
+    assert list(prices) == [9001.0, 9002.0]
+    assert list(volumes) == [1.5, 2.0]
+
+
+def test_fetch_then_submit_fetches_before_returning(pool):
+    client = FakeClient({DEPTH.path: {'XXBTZUSD': {'asks': [], 'bids': []}}})
+    future = pool.fetch_then_submit(client, DEPTH.path, {'pair': 'XXBTZUSD'},
+                                    workers.decode_depth)
+    assert client.requests == [(DEPTH.path, {'pair': 'XXBTZUSD'})]
+    prices, volumes = future.result()['XXBTZUSD']['asks']
+    assert (list(prices), list(volumes)) == ([], [])
+
+
+def test_ledger_pages_merge(pool):
+    page = dict(('L{}'.format(i), {'time': float(i), 'asset': 'ZEUR', 'type': 'trade',
+                                   'amount': '-1', 'fee': '0.1', 'balance': str(100 - i)})
+                for i in range(50))
+    client = FakeClient({LEDGERS.path: {'ledger': page, 'count': 50}})
+    history, count = pool.ledgers(client).result()
+    assert count == 50
+    merged = LedgerHistory()
+    assert merged.merge(history) == 50
+    assert merged.merge(history) == 0
+    assert merged.fees() == pytest.approx({'ZEUR': 5.0})
+    assert merged.balances() == {'ZEUR': 51.0}
+
+
+class _Response(object):
+
+    def __init__(self, body):
+        self.status_code = 200
+        self.headers = {}
+        self.body = body
+
+    def close(self):
+        pass
+
+
+class CannedTransport(object):
+
+    def __init__(self, body):
+        self.body = body
+
+    def post(self, *args, **kwargs):
+        return _Response(self.body)
+
+    def iter_raw(self, response, chunk_size):
+        yield response.body
+
+
+def test_client_post_raw():
+    body = b'{"error": [], "result": {"unixtime": 1}}'
+    client = Client(key='key', private_key='c2VjcmV0', transport=CannedTransport(body))
+    assert client._post_raw('/0/public/Time', {}) == body
+    client.transport.body = b'{"error": ["EQuery:Unknown asset pair"]}'
+    with pytest.raises(ApiError):
+        client._post_raw('/0/public/Trades', {'pair': 'XXX'})